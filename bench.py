@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# Dump throughput benchmark.  Runs the SnesCart flow (header probe, ripROM
+# with the same 64 page HiROM split dumpCart uses, ripSRAM) against
+# snesflash.simbus carts of every layout we see, and saves the numbers as
+# JSON so one transport/caching/batching change can be judged against the
+# last.  Host only, nothing in here goes to the Pycom.
+#
+# Per case:
+#   bytesPerSecond     ROM+SRAM bytes over (modelled bus time + Python time)
+#   busSeconds         time on the bus from the simbus latency model
+#   pythonSeconds      measured wall time of the flow on this machine
+#   transactionsPerByte, wireBytesPerByte   I2C traffic per byte dumped
+#   pythonSecondsPerByte
+#   peakMemory         tracemalloc peak over a second pass (-m skips it)
+#   ok                 the dump matched the image
+#
+# Usage: bench.py [-o results.json] [-c compare.json] [-t machine|smbus|smbus2|gpio]
+#                 [-b baudrate] [-l overhead seconds] [-k case substring] [-m]
+import sys
+import os
+import io
+import json
+import getopt
+import hashlib
+import platform
+import random
+import time
+import tracemalloc
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lib'))
+from snesflash import mapper, simbus, transport
+from snesflash.cart import SnesCart
+from snesflash.ledger import Ledger
+from snesflash.gpio import GpioBus
+
+MBIT = 131072
+KBIT = 128
+
+#name, mapping, ROM Mbits, SRAM Kbits, dump the ROM
+CASES = (
+    ('lorom-4m', simbus.LOROM, 4, 0, True),
+    ('lorom-8m', simbus.LOROM, 8, 0, True),
+    ('lorom-12m', simbus.LOROM, 12, 0, True),
+    ('lorom-16m', simbus.LOROM, 16, 0, True),
+    ('hirom-16m', simbus.HIROM, 16, 0, True),
+    ('hirom-24m', simbus.HIROM, 24, 0, True),
+    ('hirom-32m', simbus.HIROM, 32, 0, True),
+    ('exhirom-48m', simbus.EXHIROM, 48, 0, True),
+    ('sram-lorom-8k', simbus.LOROM, 4, 8, False),
+    ('sram-lorom-64k', simbus.LOROM, 4, 64, False),
+    ('sram-lorom-256k', simbus.LOROM, 4, 256, False),
+    ('sram-hirom-16k', simbus.HIROM, 16, 16, False),
+    ('sram-hirom-64k', simbus.HIROM, 16, 64, False),
+    ('sram-hirom-256k', simbus.HIROM, 16, 256, False),
+)
+
+LAYOUTS = {'machine': 'pycom', 'smbus': 'waterbury', 'smbus2': 'waterbury', 'gpio': None}
+
+
+class _Sink:
+    #stands in for the output file, keeps nothing but a hash of the first
+    #limit bytes.  Past the end of a 12/48 Mbit ROM the dumper reads
+    #mirrors (or for ExHiROM banks 0x7e/0x7f, WRAM), not cart data.
+    def __init__(self, limit):
+        self.sha1 = hashlib.sha1()
+        self.limit = limit
+        self.size = 0
+
+    def write(self, data):
+        if self.size < self.limit:
+            self.sha1.update(data[:self.limit - self.size])
+        self.size += len(data)
+
+
+def _bus(board, kind):
+    if kind == 'smbus':
+        return transport.SMBusTransport(board.i2c)
+    if kind == 'smbus2':
+        return transport.SMBus2Transport(board.i2c)
+    return board.i2c
+
+
+def runCase(case, config, trace=False):
+    name, mapping, mbits, kbits, readROM = case
+    rom = simbus.makeROM(mbits * MBIT, mapping, name.upper(), kbits * KBIT)
+    sim = simbus.SimCart(rom, mapping, kbits * KBIT)
+    rng = random.Random(kbits)
+    sim.sram[:] = bytes(rng.getrandbits(8) for _ in range(kbits * KBIT))
+    if config['transport'] == 'gpio':
+        #lines straight on GPIO, overhead is per ioctl; counts like the bus
+        bus = simbus.SimGpio(sim, config['overhead'])
+        cart = SnesCart(i2c=GpioBus(opener=bus.request), board='gpio')
+    else:
+        board = simbus.SimBoard(sim, LAYOUTS[config['transport']],
+                                simbus.Latency(config['overhead'], config['baudrate']))
+        cart = SnesCart(i2c=_bus(board, config['transport']), pins=board.pins,
+                        baudrate=config['baudrate'], **board.addresses)
+        bus = board.i2c
+    cart.mapper = mapper.byName(mapping)
+    bus.resetCounters()
+    cart.resetCounters()
+    romOut = _Sink(len(rom))
+    sramOut = _Sink(len(sim.sram))
+
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        cart.readRom()
+        header = cart.readHeader()
+        if readROM:
+            pages = cart.getNumOfPages(header.romMbits)
+            ledger = Ledger()
+            if cart.isLowROM:
+                cart.ripROM(0x00, pages, out=romOut, ledger=ledger)
+            else:
+                cart.ripROM(0xc0, min(pages, 64), out=romOut, ledger=ledger)
+                if pages > 64:
+                    cart.ripROM(0x40, pages - 64, out=romOut, ledger=ledger)
+        if kbits:
+            cart.ripSRAM(kbits, header.romMbits, out=sramOut)
+    pythonSeconds = time.perf_counter() - start
+    peak = None
+    if trace:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    ok = header.checksumsMatch
+    if readROM:
+        ok = ok and romOut.sha1.digest() == hashlib.sha1(rom).digest()
+    if kbits:
+        ok = ok and sramOut.sha1.digest() == hashlib.sha1(bytes(sim.sram)).digest()
+    total = romOut.size + sramOut.size
+    return {
+        'name': name, 'mapping': mapping, 'romMbits': mbits if readROM else 0,
+        'sramKbits': kbits, 'romBytes': romOut.size, 'sramBytes': sramOut.size,
+        'ok': bool(ok),
+        'transactions': bus.transactions,
+        'wireBytes': bus.bytes,
+        'busSeconds': round(bus.elapsed, 6),
+        'pythonSeconds': round(pythonSeconds, 6),
+        'bytesPerSecond': round(total / (bus.elapsed + pythonSeconds), 1),
+        'transactionsPerByte': round(bus.transactions / float(total), 4),
+        'wireBytesPerByte': round(bus.bytes / float(total), 4),
+        'pythonSecondsPerByte': pythonSeconds / total,
+        'peakMemory': peak,
+    }
+
+
+def runSuite(config, names=None, memory=True):
+    results = []
+    for case in CASES:
+        if names and not any(part in case[0] for part in names):
+            continue
+        result = runCase(case, config)
+        if memory:
+            result['peakMemory'] = runCase(case, config, trace=True)['peakMemory']
+        print("%-18s %s %10.1f B/s %7.3f tx/B %9.2f us/B py %10s peak" % (
+            result['name'], 'ok ' if result['ok'] else 'BAD', result['bytesPerSecond'],
+            result['transactionsPerByte'], result['pythonSecondsPerByte'] * 1e6,
+            result['peakMemory']))
+        results.append(result)
+    return {
+        'config': config,
+        'environment': {'python': platform.python_version(),
+                        'implementation': platform.python_implementation(),
+                        'machine': platform.machine(), 'system': platform.system()},
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cases': results,
+    }
+
+
+def compare(old, new):
+    #change in throughput and bus traffic per case against an earlier run
+    before = dict((case['name'], case) for case in old['cases'])
+    for case in new['cases']:
+        prev = before.get(case['name'])
+        if prev is None:
+            continue
+        print("%-18s %+7.1f%% B/s %+7.1f%% tx/B %+7.1f%% py/B" % (
+            case['name'],
+            100.0 * (case['bytesPerSecond'] / prev['bytesPerSecond'] - 1),
+            100.0 * (case['transactionsPerByte'] / prev['transactionsPerByte'] - 1),
+            100.0 * (case['pythonSecondsPerByte'] / prev['pythonSecondsPerByte'] - 1)))
+
+
+def usage():
+    print("Usage: bench.py -o <results.json> -c <earlier results to compare> "
+          "-t <machine|smbus|smbus2|gpio> -b <baudrate> -l <per transaction overhead s> "
+          "-k <only cases containing this, repeatable> -m (skip peak memory pass)")
+
+
+def main(argv):
+    output = "bench.json"
+    previous = None
+    names = []
+    memory = True
+    config = {'transport': 'machine', 'baudrate': 100000, 'overhead': 0.0001}
+    try:
+        opts, args = getopt.getopt(argv, "ho:c:t:b:l:k:m")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == "-h":
+            usage()
+            sys.exit(0)
+        elif opt == "-o":
+            output = arg
+        elif opt == "-c":
+            previous = arg
+        elif opt == "-t":
+            if arg not in LAYOUTS:
+                usage()
+                sys.exit(2)
+            config['transport'] = arg
+        elif opt == "-b":
+            config['baudrate'] = int(arg)
+        elif opt == "-l":
+            config['overhead'] = float(arg)
+        elif opt == "-k":
+            names.append(arg)
+        elif opt == "-m":
+            memory = False
+
+    results = runSuite(config, names, memory)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print("results in " + output)
+    if previous:
+        with open(previous) as f:
+            compare(json.load(f), results)
+    if not all(case['ok'] for case in results['cases']):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -29,10 +29,19 @@ Modified for use with the Pycom family of MCU Chips
 * Author: Charles Coulton
 """
 #import digitalio
-from machine import I2C, Pin
+try:
+    from machine import Pin
+except ImportError:
+    # Off-board (desktop/Pi with snesflash.simbus or smbus); DigitalInOut is
+    # the only user of Pin and is not available there.
+    Pin = None
 #import adafruit_bus_device.i2c_device as i2c_device
 
-from micropython import const
+try:
+    from micropython import const
+except ImportError:
+    def const(val):
+        return val
 
 
 __version__ = "0.0.0-auto.0"
@@ -95,6 +104,7 @@ def _clear_bit(val, bit):
 # shared between both the MCP23008 and MCP23017 class to reduce memory allocations.
 # However this is explicitly not thread safe or re-entrant by design!
 _BUFFER = bytearray(3)
+_WBUFFER = bytearray(2)
 
 
 class DigitalInOut:
@@ -195,23 +205,35 @@ class MCP23008:
     """
 
     def __init__(self, i2c, address=_MCP23008_ADDRESS):
+        # i2c is a machine.I2C or anything with the same writeto_mem /
+        # readfrom_mem / readfrom_mem_into calls (see snesflash.transport).
         #self._device = i2c_device.I2CDevice(i2c, address)
         self._device = i2c
         self._address = address
+        # Register accesses since creation (or resetCounters), one I2C
+        # transaction each.
+        self.reads = 0
+        self.writes = 0
         # Reset device state to all pins as inputs (safest option).
         # Write to MCP23008_IODIR register 0xFF followed by 9 zeros
         # for defaults of other registers.
-        self._device.writeto_mem(address, _MCP23008_IODIR, '0xff')
+        self._write_u8(_MCP23008_IODIR, 0xFF)
         for i in range(1, 10):
-            self._device.writeto(address, 0x00)
+            self._write_u8(i, 0x00)
+
+    def resetCounters(self):
+        self.reads = 0
+        self.writes = 0
 
     def _read_u8(self, register):
         # Read an unsigned 8 bit value from the specified 8-bit register.
-        return self._device.readfrom_mem(self._address, register, 1)
+        self.reads += 1
+        return self._device.readfrom_mem(self._address, register, 1)[0]
 
 
     def _write_u8(self, register, val):
         # Write an 8 bit value to the specified 8-bit register.
+        self.writes += 1
         self._device.writeto_mem(self._address, register, val)
 
     @property
@@ -271,6 +293,26 @@ class MCP23008:
     def intcon(self, val):
         self._write_u8(_MCP23008_INTCON, val)
 
+    @property
+    def iocon(self):
+        #The raw IOCON configuration register.
+        return self._read_u8(_MCP23008_IOCON)
+
+    @iocon.setter
+    def iocon(self, val):
+        self._write_u8(_MCP23008_IOCON, val)
+
+    @property
+    def intf(self):
+        #Interrupt flags, which pins caused the pending interrupt.
+        return self._read_u8(_MCP23008_INTF)
+
+    @property
+    def intcap(self):
+        #Pin levels captured when the interrupt fired.  Reading it (or gpio)
+        #clears the interrupt.
+        return self._read_u8(_MCP23008_INTCAP)
+
     def get_pin(self, pin):
         #Convenience function to create an instance of the DigitalInOut class
         #pointing at the specified pin of this MCP23008 device.
@@ -286,31 +328,45 @@ class MCP23017:
         #self._device = i2c_device.I2CDevice(i2c, address)
         self._device = i2c
         self._address = address
+        # Register accesses since creation (or resetCounters), one I2C
+        # transaction each.
+        self.reads = 0
+        self.writes = 0
+        # Sequential mode so 16 bit registers are written A then B in one go.
+        self.iocon = 0x00
         # Reset to all inputs with no pull-ups and no inverted polarity.
         self.iodir = 0xFFFF
         self.gppu = 0x0000
         self._write_u16le(_MCP23017_IPOLA, 0x0000)
 
+    def resetCounters(self):
+        self.reads = 0
+        self.writes = 0
+
     def _read_u16le(self, register):
         # Read an unsigned 16 bit little endian value from the specified 8-bit
         # register.
+        self.reads += 1
         self._device.readfrom_mem_into(self._address, register, _BUFFER)
         return (_BUFFER[1] << 8) | _BUFFER[0]
 
     def _write_u16le(self, register, val):
         # Write an unsigned 16 bit little endian value to the specified 8-bit
-        # register.
-        buffer = bytearray(2)
-        buffer[0] = val & 0xFF
-        buffer[1] = (val >> 8) & 0xFF
-        self._device.writeto_mem(self._address, register, buffer)
+        # register.  Relies on sequential mode (IOCON.SEQOP clear) so both
+        # bytes go out in a single transaction.
+        _WBUFFER[0] = val & 0xFF
+        _WBUFFER[1] = (val >> 8) & 0xFF
+        self.writes += 1
+        self._device.writeto_mem(self._address, register, _WBUFFER)
 
     def _read_u8(self, register):
         # Read an unsigned 8 bit value from the specified 8-bit register.
-        return self._device.readfrom_mem(self._address, register, 1)
+        self.reads += 1
+        return self._device.readfrom_mem(self._address, register, 1)[0]
 
     def _write_u8(self, register, val):
         # Write an 8 bit value to the specified 8-bit register.
+        self.writes += 1
         return self._device.writeto_mem(self._address, register, val)
 
     @property
@@ -410,8 +466,96 @@ class MCP23017:
     def gppub(self, val):
         self._write_u8(_MCP23017_GPPUB, val)
 
+    @property
+    def iocon(self):
+        #The raw IOCON configuration register, shared by both ports.  Keep
+        #BANK and SEQOP clear so gpio/iodir/gppu 16 bit writes stay a burst.
+        return self._read_u8(_MCP23017_IOCONA)
+
+    @iocon.setter
+    def iocon(self, val):
+        self._write_u8(_MCP23017_IOCONA, val)
+
     def get_pin(self, pin):
         #Convenience function to create an instance of the DigitalInOut class
         #pointing at the specified pin of this MCP23017 device.
         assert 0 <= pin <= 15
         return DigitalInOut(pin, self)
+
+
+class MCP23017Port:
+    #One 8 bit half (port 0 = A, 1 = B) of an MCP23017 with the same register
+    #properties as an MCP23008, for boards that put two different buses on
+    #the two ports of one chip.  Relies on IOCON.BANK = 0 where the B
+    #register sits right after its A register.
+
+    def __init__(self, mcp23017, port):
+        assert 0 <= port <= 1
+        self._mcp = mcp23017
+        self._port = port
+
+    def _read_u8(self, register):
+        return self._mcp._read_u8(register + self._port)
+
+    def _write_u8(self, register, val):
+        self._mcp._write_u8(register + self._port, val)
+
+    @property
+    def gpio(self):
+        return self._read_u8(_MCP23017_GPIOA)
+
+    @gpio.setter
+    def gpio(self, val):
+        self._write_u8(_MCP23017_GPIOA, val)
+
+    @property
+    def iodir(self):
+        return self._read_u8(_MCP23017_IODIRA)
+
+    @iodir.setter
+    def iodir(self, val):
+        self._write_u8(_MCP23017_IODIRA, val)
+
+    @property
+    def gppu(self):
+        return self._read_u8(_MCP23017_GPPUA)
+
+    @gppu.setter
+    def gppu(self, val):
+        self._write_u8(_MCP23017_GPPUA, val)
+
+    @property
+    def defval(self):
+        return self._read_u8(_MCP23017_DEFVALA)
+
+    @defval.setter
+    def defval(self, val):
+        self._write_u8(_MCP23017_DEFVALA, val)
+
+    @property
+    def gpinten(self):
+        return self._read_u8(_MCP23017_GPINTENA)
+
+    @gpinten.setter
+    def gpinten(self, val):
+        self._write_u8(_MCP23017_GPINTENA, val)
+
+    @property
+    def intcon(self):
+        return self._read_u8(_MCP23017_INTCONA)
+
+    @intcon.setter
+    def intcon(self, val):
+        self._write_u8(_MCP23017_INTCONA, val)
+
+    @property
+    def intf(self):
+        return self._read_u8(_MCP23017_INTFA)
+
+    @property
+    def intcap(self):
+        return self._read_u8(_MCP23017_INTCAPA)
+
+    def get_pin(self, pin):
+        assert 0 <= pin <= 7
+        return self._mcp.get_pin(pin + 8 * self._port)
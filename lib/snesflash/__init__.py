@@ -0,0 +1,7 @@
+"""
+`snesflash`
+====================================================
+Shared pieces of the SNES cart dumper.  Everything in here is imported by
+both the Pycom build (main.py) and the Raspberry Pi ripper, so keep modules
+MicroPython friendly unless they are marked as host only.
+"""
@@ -0,0 +1,101 @@
+"""
+`snesflash.calibrate`
+====================================================
+I2C clock calibration.  The MCP230xx parts take 400kHz and 1.7MHz, but how
+fast a given board really runs depends on its wiring and pull-ups, so
+``calibrate`` steps the bus up through ``RATES``, re-reading the header
+block a few times at each rate, and settles on the fastest rate where every
+read came back identical to one taken at 100kHz.  The result is kept per
+board in a small JSON file so later runs start there; ``SnesCart.slowDown``
+drops back a step whenever a dump runs into bus errors.
+"""
+try:
+    import json
+except ImportError:
+    import ujson as json
+
+from snesflash.detect import detect
+from snesflash.header import Header
+
+RATES = (100000, 400000, 1000000, 1700000)
+FIXED = 0   #stored for a board calibrate could not run on, keep the clock as it is
+
+
+def loadClock(path, board):
+    #stored rate for this board, FIXED when calibrating it came to nothing,
+    #None when it was never calibrated
+    try:
+        with open(path) as f:
+            return json.loads(f.read()).get(board)
+    except (OSError, ValueError):
+        return None
+
+
+def saveClock(path, board, baudrate):
+    try:
+        with open(path) as f:
+            rates = json.loads(f.read())
+    except (OSError, ValueError):
+        rates = {}
+    rates[board] = baudrate
+    with open(path, 'w') as f:
+        f.write(json.dumps(rates))
+
+
+def _sample(cart, offset, length):
+    try:
+        return bytes(cart.readRange(offset, length))
+    except OSError:
+        cart.forgetBusState()
+        return None
+
+
+def calibrate(cart, rates=RATES, reads=4, offset=None, length=64):
+    """Fastest entry of ``rates`` the board reads ``offset`` (the header
+    block by default, wherever snesflash.detect finds the cart's mapping
+    puts it) reliably at.  Leaves the bus at that rate and returns it, or
+    None when the transport cannot change its clock or there is no cart to
+    measure with."""
+    cart.readRom()
+    if not cart.setClock(rates[0]):
+        print("I2C clock is fixed on this bus, not calibrating")
+        return None
+    if offset is None:
+        #the mapper is whatever the last cart (or the default) left, not this one's
+        if detect(cart) is None:
+            print("no valid header to calibrate against")
+            return None
+        offset = cart.mapper.header
+    #read errors are what we are looking for here, not something to recover from
+    fallback = cart.fallback
+    cart.fallback = False
+    try:
+        return _calibrate(cart, rates, reads, offset, length)
+    finally:
+        cart.fallback = fallback
+
+
+def _calibrate(cart, rates, reads, offset, length):
+    reference = _sample(cart, offset, length)
+    if reference is None or not Header(reference).checksumsMatch:
+        #an empty slot reads back the same at any clock, that proves nothing
+        print("no valid header to calibrate against")
+        return None
+    if _sample(cart, offset, length) != reference:
+        print("header does not read back the same at " + str(rates[0]) + "Hz")
+        return rates[0]
+    best = rates[0]
+    for baudrate in rates[1:]:
+        if not cart.setClock(baudrate):
+            break
+        stable = True
+        for _ in range(reads):
+            if _sample(cart, offset, length) != reference:
+                stable = False
+                break
+        print(str(baudrate) + "Hz " + ("ok" if stable else "read errors"))
+        if not stable:
+            break
+        best = baudrate
+    cart.setClock(best)
+    return best
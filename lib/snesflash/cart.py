@@ -0,0 +1,646 @@
+"""
+`snesflash.cart`
+====================================================
+SNES cartridge access through MCP230xx port expanders.  Lives outside of
+main.py so the Pycom build, the desktop tools and the simulator in
+snesflash.simbus can all share it.
+"""
+try:
+    from machine import I2C, Pin
+except ImportError:
+    # Not on the board: the caller has to hand in an i2c bus and pins.
+    I2C = Pin = None
+
+try:
+    from micropython import const
+except ImportError:
+    def const(val):
+        return val
+
+from pycom_mcp230xx import pycom_mcp230xx as mcp230xx
+from snesflash import calibrate, fastread, mapper, transport
+from snesflash.metrics import Metrics, now, since
+from snesflash.header import Header, HEADERSIZE
+
+HIROMPAGE  = const(65536)
+LOWROMPAGE = const(32768)
+_PWR = const(0x10)
+_CS  = const(0x08)
+_WR  = const(0x04)
+_RST = const(0x02)
+_RD  = const(0x01)
+
+_MCP23008_GPIO = const(0x09)
+_MCP23017_GPIOA = const(0x12)
+_MCP23017_GPIOB = const(0x13)
+
+
+def boardPins():
+    #pwr, /cs, /wr, /rst, /rd on the Pycom header
+    return (Pin('P12', mode=Pin.OUT), Pin('P8', mode=Pin.OUT),
+            Pin('P7', mode=Pin.OUT), Pin('P6', mode=Pin.OUT),
+            Pin('P5', mode=Pin.OUT))
+
+
+class SnesCart:
+    #board='pycom': MCP23017 address chip, MCP23008 bank and data chips,
+    #   control lines on the board pins.
+    #board='waterbury': MCP23017 address chip, bank on port A and data on
+    #   port B of the MCP23017 at bank/data, control lines on port A of the
+    #   MCP23017 at controls (the Raspberry Pi ripper board).
+    #board='gpio': every line on GPIO, i2c is a snesflash.gpio.GpioBus and
+    #   the chip addresses are not used.
+    #baudrate is the clock the bus is started at (or already runs at when
+    #i2c is handed in), see snesflash.calibrate for finding a faster one.
+    def __init__(self, address=0x20, bank=0x21, data=0x22, i2c=None, pins=None,
+                 board='pycom', controls=0x23, baudrate=100000):
+        if board == 'gpio':
+            self.bus = i2c
+        else:
+            if i2c is None:
+                i2c = I2C(0, I2C.MASTER)
+                i2c.init(I2C.MASTER, baudrate=baudrate)
+            self.bus = transport.wrap(i2c)
+        self.board = board
+        self.baudrate = baudrate
+        self.fallback = True    #drop the clock a step on bus errors
+        self.busErrors = 0
+        self._shutdown = False
+        self.ctrlport = None
+        if board == 'gpio':
+            ports = self.bus.ports
+            self.addrchip = ports['address']
+            self.bankchip = ports['bank']
+            self.datachip = ports['data']
+            self.ctrlport = ports['controls']
+            self._dataRead = None
+            self._dataCounter = self.datachip
+            self._byteWrites = None     #every set is its own ioctl, nothing to batch
+            self._chips = tuple((name, ports[name]) for name in
+                                ('address', 'bank', 'data', 'controls'))
+        elif board == 'waterbury':
+            self.addrchip = mcp230xx.MCP23017(self.bus, address)
+            bankdata = mcp230xx.MCP23017(self.bus, bank)
+            self.bankchip = mcp230xx.MCP23017Port(bankdata, 0)
+            self.datachip = mcp230xx.MCP23017Port(bankdata, 1)
+            ctrlchip = mcp230xx.MCP23017(self.bus, controls)
+            ctrlchip.iodir = 0x0080 #port A outputs except /IRQ on GPA7, port B outputs
+            self.ctrlport = mcp230xx.MCP23017Port(ctrlchip, 0)
+            self._dataRead = (bank, _MCP23017_GPIOB)
+            self._dataCounter = bankdata    #the port's reads count on its chip
+            self._byteWrites = ((bank, _MCP23017_GPIOA), (bank, _MCP23017_GPIOB),
+                                (controls, _MCP23017_GPIOA))   #bank, data, controls
+            self._chips = (('address', self.addrchip), ('bankdata', bankdata),
+                           ('controls', ctrlchip))
+        else:
+            self.addrchip = mcp230xx.MCP23017(self.bus, address)
+            if pins is None:
+                pins = boardPins()
+            self.pwr, self.cs, self.wr, self.rst, self.rd = pins
+            self.bankchip = mcp230xx.MCP23008(self.bus, bank)
+            self.datachip = mcp230xx.MCP23008(self.bus, data)
+            self._dataRead = (data, _MCP23008_GPIO)
+            self._dataCounter = self.datachip
+            self._byteWrites = None     #controls are board pins, nothing to batch
+            self._chips = (('address', self.addrchip), ('bank', self.bankchip),
+                           ('data', self.datachip))
+        self._addrWrite = address
+        #compiled read loop straight on machine.I2C where the port has the emitter
+        self._fast = None
+        if fastread.available and isinstance(self.bus, transport.MachineI2C):
+            self._fast = fastread.FastRead(self.bus.bus, self._dataRead[0],
+                                           self._dataRead[1], address)
+        self.addrchip.iodir = 0x0000 #set bankA and B as output on mcp23017
+
+        self.bankchip.iodir = 0x00 #set bankchip as OUTPUT set mcp23008 as output`
+        self.datachip.iodir = 0xFF #set datachip as input set mcp23008 as input`
+
+        self.datachip.gppu = 0xFF #enable pullups
+        self.datachip.defval = 0xff #expect snes data to defaul at 0xff`
+        self.datachip.gpinten = 0x89 #set up some of the pins to be interrupts?
+        self.datachip.intcon = 0xFF #compares irq to defval
+        self.mapper = mapper.HIROM
+        self.currentAddr = -1
+        self.currentUpByte = -1
+        self.currentLowByte= -1
+        self.currentBank = -1
+        self.currentOffset = 0
+        self.totalChecksum = 0
+        self._pageChecksum = 0
+        self.headerChecksum = 0
+        self.header = None      #last header read, for anything after the probe
+        self._headers = {}      #header offset -> Header for the cart in the slot
+        self.metrics = Metrics()
+        #writes the currentBank/currentUpByte/currentLowByte caches saved
+        self.bankSkips = 0
+        self.upSkips = 0
+        self.lowSkips = 0
+
+    @property
+    def isLowROM(self):
+        return self.mapper.isLowROM
+
+    @isLowROM.setter
+    def isLowROM(self, isLowROM):
+        self.mapper = mapper.forLowROM(isLowROM)
+
+    def _mapping(self, isLowROM):
+        return self.mapper if isLowROM is None else mapper.forLowROM(isLowROM)
+
+    def __del__(self):
+        if not self._shutdown:
+            self.shutdown()
+
+    def shutdown(self):
+        #park the bus, release the expanders and cut cart power
+        self._shutdown = True
+        self.gotoAddr(00, 0)
+        self.gotoBank(00)
+        self.datachip.gppu = 0x00
+        self.datachip.defval = 0x00
+        self.datachip.gpinten = 0x00
+        self.addrchip.iodir = 0xFFFF
+        self.bankchip.iodir = 0xFF
+        self.datachip.iodir = 0xFF
+        self._ioControls(0x00)
+
+    def setClock(self, baudrate):
+        #False when the transport cannot change the bus clock
+        if not self.bus.setClock(baudrate):
+            return False
+        self.baudrate = baudrate
+        return True
+
+    def slowDown(self):
+        #one step down calibrate.RATES, False when there is nowhere to go
+        slower = [rate for rate in calibrate.RATES if rate < self.baudrate]
+        if not slower or not self.setClock(slower[-1]):
+            return False
+        print("bus errors, I2C clock down to " + str(self.baudrate) + "Hz")
+        return True
+
+    def chips(self):
+        #(role, expander) for every chip on the bus, ports folded into theirs
+        return self._chips
+
+    def resetCounters(self):
+        self.bus.resetCounters()
+        for name, chip in self._chips:
+            chip.resetCounters()
+        self.metrics.reset()
+        self.bankSkips = self.upSkips = self.lowSkips = 0
+        self.busErrors = 0
+
+    def forgetBusState(self):
+        #after a failed transfer the expanders may not hold what we think
+        self.currentAddr = -1
+        self.currentUpByte = -1
+        self.currentLowByte = -1
+        self.currentBank = -1
+
+    def gotoAddr(self, addr, isLowROM=None):
+        isLowROM = self.isLowROM if isLowROM is None else isLowROM
+        if addr <= 0xffff:
+            upByte = addr >> 8
+            lowByte = addr & 0xff
+            self.currentAddr = addr
+            if isLowROM: #is not 0
+                upByte = upByte | 0x80 # or's 1 to a15 if LoRom
+            if self.currentUpByte != upByte:
+                if self.currentLowByte != lowByte:
+                    #both halves changed, gpioa then gpiob in one burst
+                    self.addrchip.gpio = (upByte << 8) | lowByte
+                    self.currentLowByte = lowByte
+                else:
+                    self.addrchip.gpiob = upByte
+                    self.lowSkips += 1
+                self.currentUpByte = upByte
+            elif self.currentLowByte != lowByte:
+                self.addrchip.gpioa = lowByte
+                self.currentLowByte = lowByte
+                self.upSkips += 1
+            else:
+                self.upSkips += 1
+                self.lowSkips += 1
+        else:
+            self.addrchip.gpio = 0x0000
+            self.currentAddr = 0
+            self.currentUpByte = 0
+            self.currentLowByte = 0
+
+    def gotoBank(self, bank):
+        if bank != self.currentBank:
+            self.bankchip.gpio = bank
+            self.currentBank = bank
+        else:
+            self.bankSkips += 1
+
+    def gotoBankAddr(self, bank, addr, isLowROM=None):
+        #the bank lives on its own expander on both boards, so this is at
+        #most one bank write plus one address burst
+        self.gotoBank(bank)
+        self.gotoAddr(addr, isLowROM)
+
+    def read2Byte(self, addr, isLowROM = None):
+        isLowROM = self.isLowROM if isLowROM is None else isLowROM
+        output = self.readAddr(addr, isLowROM)
+        output += self.readAddr(addr+1, isLowROM)*256
+        return output
+
+    def readAddr(self, addr, isLowROM=None):
+        isLowROM = self.isLowROM if isLowROM is None else isLowROM
+        self.gotoAddr(addr, isLowROM)
+        return self.datachip.gpio
+
+    def readAddrBank(self, addr, bank):
+        self.gotoBank(bank)
+        self.gotoAddr(addr, False)
+        return self.datachip.gpio
+
+    def gotoOffset(self, offset, isLowROM=None):
+        bank, addr = self._mapping(isLowROM).locate(offset)
+        self.gotoBank(bank)
+        self.gotoAddr(addr, False)
+        self.currentOffset = offset
+
+    def readOffset(self, offset, isLowROM=None):
+        isLowROM = self.isLowROM if isLowROM is None else isLowROM
+        self.gotoOffset(offset, isLowROM)
+        return self.datachip.gpio
+
+    def readHeader(self, offset=None, isLowROM=None, mapping=None):
+        #the 64 byte header block in one sweep, cached until the cart is
+        #swapped: snesflash.events calls forgetHeader on every insertion and
+        #removal, so a cart already read costs no bus traffic.
+        mapping = self._mapping(isLowROM) if mapping is None else mapping
+        offset = mapping.header if offset is None else offset
+        header = self._headers.get(offset)
+        if header is None:
+            header = Header(self.readRange(offset, HEADERSIZE, mapping), offset)
+            self._headers[offset] = header
+        self.header = header
+        return header
+
+    def forgetHeader(self):
+        #the cart was swapped, nothing cached is any good now
+        self._headers = {}
+        self.header = None
+
+    def compareROMChecksums(self, header, isLowROM=None):
+        self.readRom()
+        head = self.readHeader(header, isLowROM)
+        print("inverse checksum: ", hex(head.complement))
+        print("checksum: " , hex(head.checksum))
+        self.headerChecksum = head.checksum
+        return head.checksumsMatch
+
+    def getROMsize(self, offset, isLowROM=None):
+        isLowROM = self.isLowROM if isLowROM is None else isLowROM
+        ROMsizeReg = self.readOffset(offset, isLowROM)
+        ROMsizeReg -= 7
+        return pow(2, ROMsizeReg) if ROMsizeReg >=0 else -1
+
+    def getNumOfPages(self, actualROMSize, isLowROM=None):
+        isLowROM = self.isLowROM if isLowROM is None else isLowROM
+        actualROMSize *= 2
+        if isLowROM:
+            actualROMSize *= 2
+        return actualROMSize
+
+    def CX4setROMSize(self, ROMsize):
+        self.gotoOffset(0x007f52,False)
+        ROMSizeRegister = self.datachip.gpio
+        print("$007F52 offset reads  "+str(ROMSizeRegister))
+        self.datachip.iodir = 0x00
+        self._ioControls(0x13)
+        if ROMsize > 8:
+            if ROMSizeRegister == 1:
+                print("ROM is larger than 8 megs, writing 0x00 to cx4 reg")
+                self.datachip.gpio = 0x00
+            else:
+                print("CX4 register is at correct value, will not change")
+        else:
+            if ROMSizeRegister == 1:
+                print("CX4 Register is at Correct value, will not change")
+            else:
+                print("ROM is 8 megs, writing 0x01 to CX4 register")
+                self.datachip.gpio = 0x01
+        self.readRom()
+        self.datachip.iodir = 0xFF
+        print("$007F52 offset now reads "+str(self.datachip.gpio))
+
+    def ripROM(self, startBank, numberOfPages, isLowROM=None, out=None, ledger=None, slots=0):
+        mapping = self._mapping(isLowROM)
+        startOffset = mapping.offsetOf(startBank)
+        return self.ripRange(startOffset, numberOfPages * mapping.bankSize, mapping, out, ledger, slots)
+
+    def ripRange(self, startOffset, length, mapping=None, out=None, ledger=None, slots=0):
+        #checksums and writes each chunk to out as it comes off the bus,
+        #only collects the whole range in memory when there is no out.
+        #With a ledger every bank's sum and hash is recorded for repairBanks.
+        #slots > 0 hands hashing and writing to snesflash.pipeline threads
+        #with that many banks in flight
+        mapping = self.mapper if mapping is None else mapping
+        print("---Start Cart Read----\n")
+        self._pageChecksum = 0
+        if slots and out:
+            from snesflash.pipeline import ripPipelined
+            ripPipelined(self, startOffset, length, mapping, out, ledger, slots)
+            self.totalChecksum += self._pageChecksum
+            return None
+        ROMdata = None if out else bytearray()
+        errors = self.busErrors
+        metrics = self.metrics
+        start = now()
+        for chunk in self.streamROM(startOffset, length, mapping):
+            bank = self.currentBank
+            metrics.bank(bank, since(start))
+            entry = None
+            if ledger is not None:
+                entry = ledger.measure(self.currentOffset - len(chunk), chunk, bank)
+                entry.errors = self.busErrors - errors
+            errors = self.busErrors
+            self._keep(mapping, bank, self.currentOffset - len(chunk), chunk, out or ROMdata,
+                       ledger, entry)
+            start = now()
+        self.totalChecksum += self._pageChecksum
+        return ROMdata
+
+    def _keep(self, mapping, bank, offset, chunk, out, ledger=None, entry=None):
+        #write a ripped chunk and add it to the running checksum, the tail
+        #of ripRange that the pipeline's writer thread runs too.  An out with
+        #writeAt (snesflash.romfile) takes the chunk at its ROM offset.
+        #Banks are reported through metrics.bank, not printed
+        if isinstance(out, bytearray):
+            out.extend(chunk)
+        else:
+            written = now()
+            writeAt = getattr(out, 'writeAt', None)
+            if writeAt is not None:
+                writeAt(offset, chunk)
+            else:
+                out.write(chunk)
+            self.metrics.writeSeconds += since(written)
+        #recorded after the write, a journalled bank is already in out
+        if ledger is not None:
+            ledger.add(entry)
+        self._pageChecksum += sum(chunk) if entry is None else entry.sum
+
+        if not mapping.isLowROM or bank % 2 == 1:
+            print(" - Page checksum: " + str( self._pageChecksum))
+            self.totalChecksum += self._pageChecksum
+            self._pageChecksum = 0
+            print("\nCurrent checksum: "+str(self.totalChecksum)+" | Hex: "+str(hex(self.totalChecksum)))
+            print("Header checksum: "+str(hex(self.headerChecksum))+"\n")
+
+    def readRange(self, startOffset, length, mapping=None):
+        #a private copy of a (small) range, for re-reads and probes
+        data = bytearray()
+        for chunk in self.streamROM(startOffset, length, mapping):
+            data.extend(chunk)
+        return data
+
+    def streamROM(self, startOffset, length, mapping=None, chunkSize=None):
+        #generator of memoryviews over one reusable buffer, a bank at a time
+        #by default.  Each view is only valid until the next one is asked
+        #for, so write it out (or copy it) before moving on.
+        mapping = self.mapper if mapping is None else mapping
+        runs = mapping.runs(startOffset, length)
+        for chunk in self.readRuns(runs, chunkSize or mapping.bankSize):
+            self.currentOffset = startOffset = startOffset + len(chunk)
+            yield chunk
+
+    def readRuns(self, runs, chunkSize):
+        buf = bytearray(chunkSize)
+        view = memoryview(buf)
+        for bank, start, count in runs:
+            while count:
+                n = chunkSize if count > chunkSize else count
+                self._readRunRetry(bank, start, n, buf)
+                yield view[:n]
+                start += n
+                count -= n
+
+    def _readRunRetry(self, bank, start, count, buf):
+        #a bus error drops the clock a step and reads the run again; at the
+        #slowest rate it gets two more tries before the error goes up
+        tries = 0
+        while True:
+            try:
+                return self._readRun(bank, start, count, buf)
+            except OSError:
+                self.busErrors += 1
+                self.forgetBusState()
+                if not self.fallback:
+                    raise
+                if not self.slowDown():
+                    tries += 1
+                    if tries > 2:
+                        raise
+
+    def _readRun(self, bank, start, count, buf):
+        #fill buf[0:count] from bank:start walking the address with a plain
+        #counter, only the low byte moves except on page boundaries where
+        #both go out in one burst
+        self.gotoBank(bank)
+        self.gotoAddr(start, False)
+        if self.bus.batched:
+            self._readRunBatched(start, count, buf)
+            return
+        if self._fast is not None:
+            self._fast.readRun(start, count, buf)
+            fastread.account(self.bus, self._dataCounter, self.addrchip, start, count)
+            self.currentAddr = start + count - 1
+            self.currentUpByte = self.currentAddr >> 8
+            self.currentLowByte = self.currentAddr & 0xff
+            return
+        addrchip = self.addrchip
+        datachip = self.datachip
+        addr = start
+        end = start + count
+        index = 0
+        while True:
+            buf[index] = datachip.gpio
+            index += 1
+            addr += 1
+            if addr == end:
+                break
+            if addr & 0xff:
+                addrchip.gpioa = addr & 0xff
+            else:
+                addrchip.gpio = addr
+        self.currentAddr = end - 1
+        self.currentUpByte = self.currentAddr >> 8
+        self.currentLowByte = self.currentAddr & 0xff
+
+    def _readRunBatched(self, start, count, buf):
+        #same walk, but address writes and data reads are queued and sent
+        #through transport.transfer so a whole slice costs one bus call
+        addrWrite = self._addrWrite
+        dataChip, dataRegister = self._dataRead
+        read = (dataChip, dataRegister, 1)
+        end = start + count
+        index = 0
+        ops = [read]
+        for addr in range(start + 1, end + 1):
+            if len(ops) >= 512 or addr == end:
+                for data in self.bus.transfer(ops):
+                    buf[index] = data[0]
+                    index += 1
+                ops = []
+            if addr == end:
+                break
+            if addr & 0xff:
+                ops.append((addrWrite, _MCP23017_GPIOA, bytes((addr & 0xff,))))
+            else:
+                ops.append((addrWrite, _MCP23017_GPIOA, bytes((0, addr >> 8))))
+            ops.append(read)
+        self.currentAddr = end - 1
+        self.currentUpByte = self.currentAddr >> 8
+        self.currentLowByte = self.currentAddr & 0xff
+
+    def sramRuns(self, SRAMsize, isLowROM=None):
+        #SRAM windows: LoROM banks 0x70+ at 0x0000-0x7fff,
+        #HiROM banks 0x30+ at 0x6000-0x7fff
+        isLowROM = self.isLowROM if isLowROM is None else isLowROM
+        if isLowROM:
+            bank, startAddr = 0x70, 0x0000
+        else:
+            bank, startAddr = 0x30, 0x6000
+        window = 0x8000 - startAddr
+        remaining = SRAMsize * 128 #Kbits to bytes
+        runs = []
+        while remaining > 0:
+            count = window if remaining > window else remaining
+            runs.append((bank, startAddr, count))
+            remaining -= count
+            bank += 1
+        return runs
+
+    def streamSRAM(self, SRAMsize, isLowROM=None, runs=None, chunkSize=None):
+        #runs (part of sramRuns) to read only some of it
+        isLowROM = self.isLowROM if isLowROM is None else isLowROM
+        runs = self.sramRuns(SRAMsize, isLowROM) if runs is None else runs
+        if not isLowROM:
+            self._ioControls(0x1e) #reset + wr + cs + cart power 0x0e w/ pmosfet
+        try:
+            for chunk in self.readRuns(runs, chunkSize or (0x8000 if isLowROM else 0x2000)):
+                yield chunk
+        finally:
+            self._ioControls(0x16) # pwr, rst, and cs high, 0x06 for pmosfet
+
+    def ripSRAM(self, SRAMsize, ROMsize, isLowROM=None, out=None):
+        SRAMdata = None if out else bytearray()
+        currentByte = 0
+        for chunk in self.streamSRAM(SRAMsize, isLowROM):
+            currentByte += len(chunk)
+            if out:
+                out.write(chunk)
+            else:
+                SRAMdata.extend(chunk)
+        print(str(currentByte) + "SRAM bytes read")
+        return SRAMdata
+
+    #readRom = /rd /cs /reset low, /wr hi
+    def readRom(self):  #0x14\
+        self._ioControls(_PWR | _WR)
+
+    # readSram=
+    #     lowrom: /cs /rd low, /rst /wr high, a15 ba4 ba5 hi
+    #     higrom: /rd low, /rst /wr /cs high, a13 a14 ba5 hi
+    def readSRAM(self, isLowROM=None):
+        isLowROM = self.isLowROM if isLowROM is None else isLowROM
+        if isLowROM:        #0x16
+            self._ioControls(_PWR | _RST | _WR)
+        else:               #0x1e
+            self._ioControls(_PWR | _RST | _WR | _CS)
+
+    # writsram=
+    #    lowrom: /cs /wr low, /rst /rd high, a15 ba4 ba5 hi
+    #    higrom: /wr /low, /rst /rd cs high, a13 a14 ba5 hi
+    # Cart power stays on, as readRom and readSRAM have it; the levels
+    # before the simulator (0x03/0x0b) cut power in the middle of a write.
+    def writeSRAM(self,isLowROM=None):
+        isLowROM = self.isLowROM if isLowROM is None else isLowROM
+        if isLowROM:        #0x13
+            self._ioControls(_PWR | _RST | _RD)
+        else:               #0x1b
+            self._ioControls(_PWR | _RST | _RD | _CS)
+
+    def writeSRAMBytes(self, writes, isLowROM=None):
+        """Write (bank, addr, value) to cart SRAM in the order given.  The
+        data chip drives the bus for the whole list, so it costs one iodir
+        switch each way however many bytes there are; each byte is the
+        address moves with /WR high, the data (when it changed), then a /WR
+        pulse."""
+        isLowROM = self.isLowROM if isLowROM is None else isLowROM
+        #/rd high so the cart lets go of the bus, /cs as readSRAM has it
+        idle = _PWR | _RST | _WR | _RD | (0 if isLowROM else _CS)
+        strobe = idle & ~_WR
+        self._ioControls(idle)
+        self.datachip.iodir = 0x00
+        try:
+            if self.bus.batched and self._byteWrites is not None:
+                self._writeSRAMBatched(writes, idle ^ _PWR, strobe ^ _PWR)
+                return
+            last = None
+            for bank, addr, value in writes:
+                self.gotoBank(bank)
+                self.gotoAddr(addr, False)
+                if value != last:
+                    self.datachip.gpio = value
+                    last = value
+                self._ioControls(strobe)
+                self._ioControls(idle)
+        finally:
+            self.datachip.iodir = 0xFF
+            self.readRom()
+
+    def _writeSRAMBatched(self, writes, idle, strobe):
+        #the same cycles queued through transport.transfer; idle and strobe
+        #are already the control port levels (MOSFET bit inverted)
+        bankWrite, dataWrite, ctrlWrite = self._byteWrites
+        addrWrite = self._addrWrite
+        idle = (ctrlWrite[0], ctrlWrite[1], bytes((idle,)))
+        strobe = (ctrlWrite[0], ctrlWrite[1], bytes((strobe,)))
+        ops = []
+        last = None
+        for bank, addr, value in writes:
+            if bank != self.currentBank:
+                ops.append((bankWrite[0], bankWrite[1], bytes((bank,))))
+                self.currentBank = bank
+            upByte, lowByte = addr >> 8, addr & 0xff
+            if upByte != self.currentUpByte:
+                ops.append((addrWrite, _MCP23017_GPIOA, bytes((lowByte, upByte))))
+            elif lowByte != self.currentLowByte:
+                ops.append((addrWrite, _MCP23017_GPIOA, bytes((lowByte,))))
+            self.currentAddr = addr
+            self.currentUpByte, self.currentLowByte = upByte, lowByte
+            if value != last:
+                ops.append((dataWrite[0], dataWrite[1], bytes((value,))))
+                last = value
+            ops.append(strobe)
+            ops.append(idle)
+            if len(ops) >= 512:
+                self.bus.transfer(ops)
+                ops = []
+        if ops:
+            self.bus.transfer(ops)
+
+    #commands come in as hex, originally used pmosfet, so power was low active
+    # irq|x|x|pwr // cs|wr|rst|rd
+    #io7: /irq | io4: cart power | io3: /cs | io2: /wr | io1: /rst | io0 /rd
+    def _ioControls(self, inputs):
+        if self.ctrlport is not None:
+            #one write to the control expander, its MOSFET is active low
+            self.ctrlport.gpio = inputs ^ _PWR
+            return
+        bools = []
+        for index in range(8):
+            bools.append(inputs & 1)
+            inputs = inputs >> 1
+        self.pwr(bools[4])
+        self.cs(bools[3])
+        self.wr(bools[2])
+        self.rst(bools[1])
+        self.rd(bools[0])
@@ -0,0 +1,234 @@
+"""
+`snesflash.compress`
+====================================================
+Dumps and saves compressed on their way to the card, for when the SD card
+or a network share writes slower than the bus reads.  ``CompressedOut``
+takes the banks in order, as ripRange and the pipeline hand them over, and
+compresses each one as it comes, with a window of ``2**wbits`` bytes.  Only
+the compressor state is kept, never the image.  Filler runs of 0x00/0xff
+pack down to almost nothing.
+
+Two containers, both ones emulators and the usual tools open:
+
+    gzip   .gz    zlib on CPython, the ``deflate`` module on MicroPython
+                  1.21+ ports built with compression (not the Pycom's uzlib,
+                  which only inflates)
+    zstd   .zst   the ``zstandard`` package, Pi only (snesflash.zstdio)
+
+``openRead`` opens either one (or a plain file) for reading, so checksums,
+DAT lookups and save history read a compressed dump like a raw one.
+``rewrite`` streams a finished file through again with some banks replaced,
+for the few banks repairBanks re-reads.
+"""
+import os
+try:
+    import io
+except ImportError:
+    import uio as io
+try:
+    import zlib
+    zlib.compressobj
+except (ImportError, AttributeError):
+    zlib = None
+try:
+    import deflate
+except ImportError:
+    deflate = None
+try:
+    from snesflash import zstdio
+except ImportError:
+    zstdio = None
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+EXTENSIONS = {GZIP: '.gz', ZSTD: '.zst'}
+LEVEL = 6
+#a 1KB window is what the Pycom can spare next to a bank buffer
+WBITS = 15 if zlib is not None else 10
+
+#gzip member header: deflate, no flags, no mtime, unknown OS
+_GZIPHEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+
+
+def available(method):
+    if method == GZIP:
+        return zlib is not None or deflate is not None
+    if method == ZSTD:
+        return zstdio is not None
+    return False
+
+
+def methodOf(path):
+    #the container a file name says it is in, None for a raw one
+    for method in EXTENSIONS:
+        if path.endswith(EXTENSIONS[method]):
+            return method
+    return None
+
+
+class _Gzip:
+    #gzip around raw deflate, CRC and size kept here so nothing is buffered
+    def __init__(self, f, level, wbits):
+        self.f = f
+        self.crc = 0
+        self.size = 0
+        if zlib is not None:
+            self.z = zlib.compressobj(level, zlib.DEFLATED, -wbits)
+            f.write(_GZIPHEADER)
+        else:
+            self.z = None
+            self.stream = deflate.DeflateIO(f, deflate.GZIP, wbits)
+
+    def write(self, data):
+        if self.z is None:
+            self.stream.write(data)
+            return
+        self.crc = binascii.crc32(data, self.crc)
+        self.size += len(data)
+        self.f.write(self.z.compress(data))
+
+    def finish(self):
+        if self.z is None:
+            self.stream.close()     #DeflateIO writes the trailer, f stays open
+            return
+        self.f.write(self.z.flush())
+        self.f.write((self.crc & 0xffffffff).to_bytes(4, 'little') +
+                     (self.size & 0xffffffff).to_bytes(4, 'little'))
+
+
+class CompressedOut:
+    """An output file that compresses what is written to it.  ``writeAt``
+    is there for ripRange, but the offsets have to follow on from each
+    other: a compressed stream can not be written out of order."""
+
+    def __init__(self, path, method=GZIP, level=LEVEL, wbits=WBITS):
+        if not available(method):
+            raise ValueError("no " + str(method) + " compressor on this platform")
+        self.path = path
+        self.method = method
+        self.f = open(path, 'wb')
+        self.stream = (_Gzip if method == GZIP else zstdio.Writer)(self.f, level, wbits)
+        self.pos = 0
+
+    def write(self, data):
+        self.stream.write(data)
+        self.pos += len(data)
+        return len(data)
+
+    def writeAt(self, offset, data):
+        if offset != self.pos:
+            raise ValueError("compressed output is at " + hex(self.pos) + ", not " + hex(offset))
+        self.write(data)
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        if self.f is None:
+            return
+        self.stream.finish()
+        self.f.close()
+        self.f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def openRead(path):
+    """``path`` opened for reading, decompressed when its name says it is
+    .gz or .zst.  Has ``read`` and ``readinto`` either way."""
+    method = methodOf(path)
+    if method == GZIP:
+        if zlib is not None:
+            import gzip
+            return gzip.open(path, 'rb')
+        return deflate.DeflateIO(open(path, 'rb'), deflate.GZIP, 0, True)
+    if method == ZSTD:
+        return zstdio.openRead(path)
+    return open(path, 'rb')
+
+
+def _readFull(f, n):
+    #decompressors may hand back less than asked for before the end
+    data = b''
+    while len(data) < n:
+        more = f.read(n - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def rewrite(path, patches, step, level=LEVEL, wbits=WBITS):
+    """Stream a compressed ``path`` into a new copy of itself with the
+    ``patches`` ({offset: data}, each within one ``step`` sized block)
+    written over it, then put the copy in its place."""
+    tmp = path + '.tmp'
+    offset = 0
+    f = openRead(path)
+    try:
+        with CompressedOut(tmp, methodOf(path), level, wbits) as out:
+            while True:
+                block = _readFull(f, step)
+                if not block:
+                    break
+                for at in patches:
+                    if offset <= at < offset + len(block):
+                        block = bytearray(block)
+                        data = patches[at]
+                        block[at - offset:at - offset + len(data)] = data
+                out.write(block)
+                offset += len(block)
+    finally:
+        f.close()
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        #MicroPython's rename will not replace a file
+        os.remove(path)
+        os.rename(tmp, path)
+
+
+class Patches:
+    """Collects the banks repairBanks writes back (it takes anything with
+    ``writeAt``), for ``rewrite`` once the dump is closed."""
+
+    def __init__(self):
+        self.banks = {}
+
+    def writeAt(self, offset, data):
+        self.banks[offset] = bytes(data)
+
+
+def pack(data, method=GZIP, level=LEVEL, wbits=WBITS):
+    """``data`` as one compressed blob, for small things like save blocks."""
+    if method == GZIP and zlib is not None:
+        z = zlib.compressobj(level, zlib.DEFLATED, -wbits)
+        body = z.compress(data) + z.flush()
+        return (_GZIPHEADER + body + (binascii.crc32(data) & 0xffffffff).to_bytes(4, 'little') +
+                (len(data) & 0xffffffff).to_bytes(4, 'little'))
+    if method == ZSTD:
+        return zstdio.pack(data, level)
+    f = io.BytesIO()
+    stream = deflate.DeflateIO(f, deflate.GZIP, wbits)
+    stream.write(data)
+    stream.close()
+    return f.getvalue()
+
+
+def unpack(blob, method=GZIP):
+    if method == GZIP and zlib is not None:
+        return zlib.decompress(blob, 16 + 15)
+    if method == ZSTD:
+        return zstdio.unpack(blob)
+    return deflate.DeflateIO(io.BytesIO(blob), deflate.GZIP).read()
@@ -0,0 +1,396 @@
+"""
+`snesflash.datindex`
+====================================================
+Known-good dump lookup.  ``build`` turns a No-Intro style DAT (Logiqx XML or
+clrmamepro text) into a compact index file: the DAT's ROMs as fixed size
+records sorted by CRC32 and again by SHA-1, with the game names in a table
+after them.  ``DatIndex`` answers a lookup with a binary search straight
+over the file, through mmap where there is one and seeks where there is
+not, so nothing but the header is ever loaded.
+
+DATs say nothing about the SNES header, so the title+checksum side is
+built from our own dumps: ``KnownDumps`` keeps a sorted record of (title,
+checksum, complement) -> SHA-1 for every dump that matched the DAT, and
+dumpCart uses it to skip a cart it already has a verified dump of before
+reading a single ROM bank.
+
+Building needs CPython's ``re``; reading works on the board too::
+
+    python3 lib/snesflash/datindex.py "Nintendo - SNES (20240101).dat" snes.idx
+"""
+import os
+try:
+    import struct
+except ImportError:
+    import ustruct as struct
+try:
+    import hashlib
+except ImportError:
+    import uhashlib as hashlib
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+try:
+    import mmap
+except ImportError:
+    mmap = None
+try:
+    import utime
+except ImportError:
+    import time as utime
+
+MAGIC = b'SNDX'
+KNOWNMAGIC = b'SNKD'
+VERSION = 1
+_HEAD = '>4sHI'         #magic, version, rom count
+_HEADSIZE = 10
+_CRCRECORD = 8          #crc32, rom number
+_SHA1RECORD = 24        #sha1, rom number
+_KEYSIZE = 25           #title (21 bytes), checksum, complement
+_KNOWNRECORD = _KEYSIZE + 20
+
+
+def _unescape(text):
+    for escaped, char in (('&quot;', '"'), ('&apos;', "'"), ('&lt;', '<'),
+                          ('&gt;', '>'), ('&amp;', '&')):
+        text = text.replace(escaped, char)
+    return text
+
+
+def readDat(path):
+    """(game name, size, crc32, sha1 bytes) for every ROM in a DAT file."""
+    import re
+    xmlGame = re.compile(r'<(?:game|machine)\s[^>]*?name="([^"]*)"')
+    xmlRom = re.compile(r'<rom\s([^>]*)>')
+    xmlAttr = re.compile(r'(\w+)="([^"]*)"')
+    cmpName = re.compile(r'^\s*name\s+"(.*)"\s*$')
+    cmpRom = re.compile(r'^\s*rom\s*\((.*)\)\s*$')
+    cmpField = re.compile(r'(\w+)\s+("[^"]*"|\S+)')
+    game = None
+    inGame = False
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            found = xmlGame.search(line)
+            if found:
+                game = _unescape(found.group(1))
+            fields = None
+            found = xmlRom.search(line)
+            if found:
+                fields = dict(xmlAttr.findall(found.group(1)))
+            elif line.lstrip().startswith('game (') or line.lstrip().startswith('game('):
+                inGame = True
+            elif inGame:
+                found = cmpRom.match(line)
+                if found:
+                    fields = dict(cmpField.findall(found.group(1)))
+                else:
+                    found = cmpName.match(line)
+                    if found:
+                        game = found.group(1)
+                    elif line.strip() == ')':
+                        inGame = False
+            if fields is None or game is None:
+                continue
+            crc = fields.get('crc', '').strip('"')
+            sha1 = fields.get('sha1', '').strip('"')
+            if len(crc) != 8 or len(sha1) != 40:
+                continue
+            yield (game, int(fields.get('size', '0').strip('"')), int(crc, 16),
+                   binascii.unhexlify(sha1))
+
+
+def build(datPath, indexPath):
+    """Write the index for ``datPath`` to ``indexPath``, returns the
+    number of ROMs in it."""
+    roms = list(readDat(datPath))
+    names = bytearray()
+    offsets = []
+    for game, size, crc, sha1 in roms:
+        offsets.append(len(names))
+        name = game.encode('utf-8')
+        names += struct.pack('>IH', size, len(name)) + name
+    crcs = sorted((crc, number) for number, (game, size, crc, sha1) in enumerate(roms))
+    sha1s = sorted((sha1, number) for number, (game, size, crc, sha1) in enumerate(roms))
+    tmp = indexPath + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(struct.pack(_HEAD, MAGIC, VERSION, len(roms)))
+        for crc, number in crcs:
+            f.write(struct.pack('>II', crc, number))
+        for sha1, number in sha1s:
+            f.write(sha1 + struct.pack('>I', number))
+        for offset in offsets:
+            f.write(struct.pack('>I', offset))
+        f.write(names)
+    os.rename(tmp, indexPath)
+    return len(roms)
+
+
+class _Records:
+    #random access reads over an open file, mmap when the port has it
+    def __init__(self, f):
+        self.f = f
+        self.map = None
+        if mmap is not None:
+            try:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError, AttributeError):
+                self.map = None
+
+    def read(self, offset, length):
+        if self.map is not None:
+            return self.map[offset:offset + length]
+        self.f.seek(offset)
+        return self.f.read(length)
+
+    def bisect(self, base, count, size, key):
+        #first record in the sorted table at base whose key is >= key
+        lo, hi = 0, count
+        width = len(key)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.read(base + mid * size, width) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+        self.f.close()
+
+
+class DatIndex:
+    def __init__(self, path):
+        self._records = _Records(open(path, 'rb'))
+        magic, version, count = struct.unpack(_HEAD, self._records.read(0, _HEADSIZE))
+        if magic != MAGIC or version != VERSION:
+            self._records.close()
+            raise ValueError(path + ' is not a DAT index, rebuild it')
+        self.count = count
+        self._crcs = _HEADSIZE
+        self._sha1s = self._crcs + count * _CRCRECORD
+        self._offsets = self._sha1s + count * _SHA1RECORD
+        self._names = self._offsets + count * 4
+
+    def _rom(self, number):
+        offset = struct.unpack('>I', self._records.read(self._offsets + number * 4, 4))[0]
+        size, length = struct.unpack('>IH', self._records.read(self._names + offset, 6))
+        return self._records.read(self._names + offset + 6, length).decode('utf-8'), size
+
+    def _find(self, base, size, key):
+        records = self._records
+        found = []
+        index = records.bisect(base, self.count, size, key)
+        while index < self.count:
+            record = records.read(base + index * size, size)
+            if record[:len(key)] != key:
+                break
+            found.append(self._rom(struct.unpack('>I', record[len(key):])[0]))
+            index += 1
+        return found
+
+    def byCRC(self, crc):
+        """(game name, size) of every ROM with this CRC32."""
+        return self._find(self._crcs, _CRCRECORD, struct.pack('>I', crc & 0xFFFFFFFF))
+
+    def bySHA1(self, sha1):
+        """(game name, size) of the ROM with this SHA-1, hex or raw."""
+        if len(sha1) == 40:
+            sha1 = binascii.unhexlify(sha1)
+        found = self._find(self._sha1s, _SHA1RECORD, bytes(sha1))
+        return found[0] if found else None
+
+    def close(self):
+        self._records.close()
+
+
+def headerKey(header):
+    #title bytes as read from the cart, then checksum and complement
+    title = bytes(bytearray(ord(c) & 0xFF for c in header.title))
+    return title + struct.pack('>HH', header.checksum, header.complement)
+
+
+def _lock(path, wait=10.0):
+    #an O_EXCL lock file, as farm._claim takes, waited on for up to wait
+    #seconds.  None on MicroPython: no os.open there, and only the one dumper
+    if not hasattr(os, 'open'):
+        return None
+    lock = path + '.lock'
+    waited = 0.0
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except OSError:
+            if waited >= wait:
+                raise OSError(lock + ' held for ' + str(wait) +
+                              's, remove it if no dump is running')
+            utime.sleep(0.05)
+            waited += 0.05
+    os.write(fd, str(os.getpid()).encode())
+    os.close(fd)
+    return lock
+
+
+class KnownDumps:
+    """Verified dumps by header, sorted (key, sha1) records in one file.
+    Small enough that ``add`` just rewrites it, holding ``<path>.lock``
+    while it does.  The file is opened again whenever it changed on disk,
+    so farm workers sharing it see (and keep) each other's entries."""
+
+    def __init__(self, path):
+        self.path = path
+        self._records = None
+        self._stamp = None
+        self.count = 0
+        self._open()
+
+    def _open(self):
+        try:
+            info = os.stat(self.path)
+        except OSError:
+            info = None
+        #st_mtime_ns where there is one: two writes in the same second with
+        #the same count are the same size.  MicroPython's stat is a tuple
+        stamp = None if info is None else (info[6], getattr(info, 'st_mtime_ns', info[8]))
+        if stamp == self._stamp and (stamp is None or self._records is not None):
+            return
+        self.close()
+        self._stamp = stamp
+        self.count = 0
+        if stamp is None:
+            return
+        self._records = _Records(open(self.path, 'rb'))
+        head = self._records.read(0, 8)
+        if head[:4] != KNOWNMAGIC:
+            self.close()
+            raise ValueError(self.path + ' is not a known dumps file')
+        self.count = struct.unpack('>I', head[4:])[0]
+
+    def find(self, header):
+        """SHA-1 (hex) of our verified dump of this cart, or None."""
+        self._open()
+        if not self.count:
+            return None
+        key = headerKey(header)
+        index = self._records.bisect(8, self.count, _KNOWNRECORD, key)
+        if index < self.count:
+            record = self._records.read(8 + index * _KNOWNRECORD, _KNOWNRECORD)
+            if record[:_KEYSIZE] == key:
+                return binascii.hexlify(record[_KEYSIZE:]).decode()
+        return None
+
+    def add(self, header, sha1):
+        lock = _lock(self.path)
+        try:
+            self._add(header, sha1)
+        finally:
+            if lock is not None:
+                os.remove(lock)
+
+    def _add(self, header, sha1):
+        #read again under the lock, another worker may have just written it
+        self._stamp = None
+        self._open()
+        records = {}
+        if self.count:
+            data = self._records.read(8, self.count * _KNOWNRECORD)
+            for index in range(self.count):
+                record = data[index * _KNOWNRECORD:(index + 1) * _KNOWNRECORD]
+                records[bytes(record[:_KEYSIZE])] = bytes(record[_KEYSIZE:])
+        records[headerKey(header)] = binascii.unhexlify(sha1)
+        self.close()
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(KNOWNMAGIC + struct.pack('>I', len(records)))
+            for key in sorted(records):
+                f.write(key + records[key])
+        try:
+            os.rename(tmp, self.path)
+        except OSError:
+            #MicroPython's rename will not replace a file
+            os.remove(self.path)
+            os.rename(tmp, self.path)
+        self._stamp = None
+        self._open()
+
+    def close(self):
+        if self._records is not None:
+            self._records.close()
+            self._records = None
+
+
+def fileDigests(path, length=None, every=None, opener=None):
+    """(sha1 hex, crc32, {offset: crc32 so far}) of the first ``length``
+    bytes of a file, all of it by default.  The dict holds a CRC at every
+    multiple of ``every`` bytes.  ``opener(path)`` opens it for reading
+    (snesflash.compress.openRead for a compressed dump)."""
+    sha1 = hashlib.sha1()
+    crc = 0
+    marks = {}
+    step = every or 0x10000
+    buf = bytearray(step if step <= 0x10000 else 0x10000)
+    view = memoryview(buf)
+    done = 0
+    f = open(path, 'rb') if opener is None else opener(path)
+    try:
+        while length is None or done < length:
+            n = f.readinto(buf)
+            if not n:
+                break
+            if length is not None:
+                n = min(n, length - done)
+            sha1.update(view[:n])
+            crc = binascii.crc32(view[:n], crc)
+            done += n
+            if every and done % every == 0:
+                marks[done] = crc & 0xFFFFFFFF
+    finally:
+        f.close()
+    return binascii.hexlify(sha1.digest()).decode(), crc & 0xFFFFFFFF, marks
+
+
+def identify(dat, path, opener=None):
+    """(game name, size, sha1) of the DAT entry a dump file matches, or
+    None.  A dump that is the ROM plus mirrors past its end still matches:
+    the CRC of every 1Mbit prefix is looked up and a hit confirmed by its
+    SHA-1."""
+    sha1, crc, marks = fileDigests(path, every=0x20000, opener=opener)
+    found = dat.bySHA1(sha1)
+    if found is not None:
+        return found + (sha1,)
+    for length in sorted(marks, reverse=True):
+        for name, size in dat.byCRC(marks[length]):
+            if size != length:
+                continue
+            sha1 = fileDigests(path, length, opener=opener)[0]
+            if dat.bySHA1(sha1) == (name, size):
+                return name, size, sha1
+    return None
+
+
+def openIndexes(datPath, knownPath):
+    """(DatIndex, KnownDumps) for dumpCart, None for either one that is not
+    configured or whose file can not be read."""
+    dat = known = None
+    if datPath:
+        try:
+            dat = DatIndex(datPath)
+        except (OSError, ValueError) as e:
+            print("no DAT index: " + str(e))
+    if knownPath:
+        try:
+            known = KnownDumps(knownPath)
+        except ValueError as e:
+            print(str(e))
+    return dat, known
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) != 3:
+        print("Usage: datindex.py <No-Intro DAT> <index to write>")
+        sys.exit(2)
+    print(str(build(sys.argv[1], sys.argv[2])) + " ROMs indexed")
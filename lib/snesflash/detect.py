@@ -0,0 +1,165 @@
+"""
+`snesflash.detect`
+====================================================
+Which mapping a cart uses, from its header.  Every place a header can sit
+(LoROM 00:FFC0, HiROM C0:FFC0, ExHiROM 40:FFC0; ExLoROM shares LoROM's) is
+read once, and each mapping is scored on what its header there looks like:
+
+    checksum and complement       +8   the pair XORs to 0xffff
+    makeup byte                   +4   map mode nibble is this mapping's
+    ROM size                      +2   4MB or less, over 4MB for the Ex ones
+    RESET vector                  +2   points into ROM (0x8000 up)
+    title                         +2   all printable (ASCII or half width kana)
+    SRAM size, country            +1 each when in range
+
+A mirror of the LoROM header seen through the HiROM window has the same
+checksum but the wrong map mode, so the scores pull apart there.  ``detect``
+only picks a mapping that scores ``MINSCORE`` or better and beats the next
+best by ``MARGIN``; anything less is not worth a full dump.
+
+The header's ROM size is a power of two, and a 12/20/48 Mbit cart (or a
+homebrew with the size byte wrong) answers the rest of that space with
+mirrors.  ``probeSize`` reads ``_SAMPLE`` bytes at a few places in every
+bank, and finds the smallest size a real set of chips can have (one power
+of two, or one plus a smaller one: 12 = 8+4, 20 = 16+4, 48 = 32+16) whose
+mirroring explains all of them, so the dump only reads banks that hold
+something new.  Banks of one repeated byte prove nothing: the 0x00/0xff
+padding at the end of a ROM reads the same wherever it is.
+"""
+from snesflash import mapper
+
+MINSCORE = 12
+MARGIN = 3
+_MAPMODES = {'lorom': 0, 'hirom': 1, 'exlorom': 2, 'exhirom': 5}
+_CANDIDATES = (mapper.LOROM, mapper.HIROM, mapper.EXHIROM, mapper.EXLOROM)
+_SAMPLE = 8
+_WRAM = (0x7e, 0x7f)
+
+
+def _printable(c):
+    return 0x20 <= c <= 0x7e or 0xa1 <= c <= 0xdf
+
+
+def score(header, mapping):
+    """How much ``header`` looks like the header of a ``mapping`` cart."""
+    points = 0
+    if header.checksumsMatch:
+        points += 8
+    if header.mapMode == _MAPMODES[mapping.name]:
+        points += 4
+    large = mapping.header >= 0x400000
+    if (0x0d <= header.romSize <= 0x0e) if large else (0x08 <= header.romSize <= 0x0c):
+        points += 2
+    if header.resetVector >= 0x8000:
+        points += 2
+    if all(_printable(ord(c)) for c in header.title):
+        points += 2
+    if header.sramSize <= 0x08:
+        points += 1
+    if header.country <= 0x14:
+        points += 1
+    return points
+
+
+class Detection:
+    __slots__ = ('mapping', 'header', 'score', 'scores')
+
+    def __init__(self, mapping, header, score, scores):
+        self.mapping = mapping
+        self.header = header
+        self.score = score
+        self.scores = scores    #[(score, mapping name)], best first
+
+
+def detect(cart):
+    """Detection for the cart in the slot, or None when no mapping is
+    a clear winner.  Leaves ``cart.mapper`` set to the winner."""
+    cart.readRom()
+    headers = {}
+    scored = []
+    for mapping in _CANDIDATES:
+        where = mapping.locate(mapping.header)
+        header = headers.get(where)
+        if header is None:
+            header = headers[where] = cart.readHeader(mapping.header, mapping=mapping)
+        scored.append((score(header, mapping), mapping.name, header))
+    scored.sort(key=lambda entry: -entry[0])
+    best, name, header = scored[0]
+    scores = [(points, candidate) for points, candidate, unused in scored]
+    print("mapping scores: " + ", ".join(candidate + " " + str(points)
+                                         for points, candidate in scores))
+    if best < MINSCORE or best - scored[1][0] < MARGIN:
+        print("no mapping stands out, not dumping")
+        return None
+    cart.mapper = mapper.byName(name)
+    cart.header = header
+    return Detection(cart.mapper, header, best, scores)
+
+
+def _samples(cart, mapping, length):
+    #a few bytes from the start, middle and end of every bank, one list of
+    #runs for the lot.  None for a bank in 0x7e/0x7f, which a console
+    #would never let a cart answer.
+    step = mapping.bankSize
+    offsets = (0, 0x2468, 0x5555, step - _SAMPLE)
+    runs = []
+    wanted = []
+    for base in range(0, length, step):
+        bank, addr = mapping.locate(base)
+        wanted.append(bank not in _WRAM)
+        if wanted[-1]:
+            for at in offsets:
+                runs.append(mapping.locate(base + at) + (_SAMPLE,))
+    chunks = cart.readRuns(runs, _SAMPLE)
+    samples = []
+    for keep in wanted:
+        samples.append(b''.join(bytes(next(chunks)) for at in offsets) if keep else None)
+    return samples
+
+
+def _uniform(sample):
+    return sample == sample[:1] * len(sample)
+
+
+def _explains(samples, size, step):
+    #every bank past size reads the same as the one it would mirror, and
+    #at least one of them is more than filler
+    proof = False
+    for index in range(size // step, len(samples)):
+        sample = samples[index]
+        source = samples[mapper.mirror(index * step, size) // step]
+        if sample is None or source is None:
+            continue
+        if sample != source:
+            return False
+        if not _uniform(sample):
+            proof = True
+    return proof
+
+
+def _sizes(length, step, least):
+    #what the chips on a cart can add up to, smallest first: a power of
+    #two, or a power of two and a smaller one after it
+    sizes = [length]
+    big = step
+    while big < length:
+        sizes.append(big)
+        small = step
+        while small < big and big + small < length:
+            sizes.append(big + small)
+            small <<= 1
+        big <<= 1
+    return sorted(size for size in sizes if size >= least)
+
+
+def probeSize(cart, length, mapping=None):
+    """Bytes of ROM really behind the ``length`` the header claims, the
+    smallest chip layout that mirrors out to what was sampled."""
+    mapping = cart.mapper if mapping is None else mapping
+    step = mapping.bankSize
+    samples = _samples(cart, mapping, length)
+    least = (mapping.header // step + 1) * step    #the header has to be in it
+    for size in _sizes(length, step, least):
+        if size >= length or _explains(samples, size, step):
+            return min(size, length)
+    return length
@@ -0,0 +1,297 @@
+"""
+`snesflash.dump`
+====================================================
+The header probe and dump flow shared by the Pycom main.py and the Raspberry
+Pi ripper; both just build a SnesCart for their board and call dumpCart.
+"""
+import os
+try:
+    import utime
+except ImportError:
+    import time as utime
+
+from snesflash import compress
+from snesflash.datindex import identify
+from snesflash.detect import detect, probeSize
+from snesflash.journal import Journal
+from snesflash.library import ROM, SRAM, dumpName
+from snesflash.romfile import RomFile
+from snesflash.ledger import Ledger, repairBanks
+
+def _exists(path):
+    # os.path is not available on MicroPython
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+def getUpNibble(value):
+    return value >> 4
+
+def getLowNibble(value):
+    return value & 0x0F
+
+def splitByte(value):
+    return getUpNibble(value), getLowNibble(value)
+
+def dumpCart(cart, directory="", statusFile="/tmp/insertedCart", readCart=True,
+             readSRAM=True, convertedSRAMsize=0, reportFile=None, slots=0,
+             dat=None, known=None, library=None, snapshots=None, compression=None):
+    '''embedded cart info end of first page,
+    32704/7fc0:lowrom
+    65472/ffc0:highrom
+    convertedSRAMsize overrides the header SRAM size (Kbits) when not 0
+    reportFile gets the run's snesflash.metrics report as JSON
+    slots > 0 reads, hashes and writes the ROM in a pipeline with that many
+    banks in flight (snesflash.pipeline)
+    dat (snesflash.datindex.DatIndex) names every finished dump, and
+    known (KnownDumps) remembers the ones it matched so those carts are
+    skipped next time without reading the ROM
+    library (snesflash.library.Library) takes the finished images in place
+    of directory, stored once by SHA-1
+    snapshots (snesflash.snapshots.SnapshotStore) keeps every SRAM read as
+    a new version of the cart's save history
+    compression ('gzip' or 'zstd', snesflash.compress) writes the .smc and
+    .srm compressed as they are read; an interrupted compressed dump starts
+    over.  The library keeps its images raw
+    returns (read, checksum): whether the ROM was read this time and its
+    16-bit sum, None when it was skipped or no mapping stood out'''
+    cart.resetCounters()
+    try:
+        return _dumpCart(cart, directory, statusFile, readCart, readSRAM, convertedSRAMsize, slots,
+                  dat, known, library, snapshots, compression)
+    finally:
+        if reportFile:
+            try:
+                cart.metrics.save(reportFile, cart)
+            except OSError as e:
+                print("could not write report " + reportFile + ": " + str(e))
+
+def _identify(dat, known, header, romPath):
+    #which DAT entry the dump is, remembered against the header when it is one
+    found = identify(dat, romPath, compress.openRead)
+    if found is None:
+        print("no match in the DAT for " + romPath)
+        return None
+    name, size, sha1 = found
+    print("DAT match: " + name + " (sha1 " + sha1 + ")")
+    if known is not None:
+        try:
+            known.add(header, sha1)
+        except OSError as e:
+            #the dump is fine, this cart is just read again next time
+            print("known dumps not updated: " + str(e))
+    return name
+
+def _dumpCart(cart, directory, statusFile, readCart, readSRAM, convertedSRAMsize, slots,
+              dat, known, library, snapshots, compression):
+    metrics = cart.metrics
+    with metrics.phase('power'):
+        cart.readRom()
+        utime.sleep(.25)
+
+    #every header location scored once, the mapping is the clear winner or nothing
+    with metrics.phase('header'):
+        found = detect(cart)
+    if found is None:
+        with open(statusFile, 'w') as g:
+            g.write("NULL")
+        return False, None
+    header = found.header
+    print("Mapping: " + cart.mapper.name + " (score " + str(found.score) + ")")
+    print("Checksums Matched" if header.checksumsMatch else "Checksums didn't match.")
+    cart.headerChecksum = header.checksum
+    cartname = header.title[:20]
+    fileName = dumpName(header.title)
+    ROMmakeup = header.makeup
+    ROMSpeed = header.speed
+    bankSize = header.mapMode
+    ROMtype = header.cartType
+    ROMsize = header.romMbits
+    SRAMsize = header.sramSize
+    county = header.country
+    license = header.license
+    version = header.version
+    inverseChecksum = header.complement
+    checksum = header.checksum
+    VBLvector = header.nmiVector
+    resetVector = header.resetVector
+
+    numberOfPages = cart.getNumOfPages(ROMsize)
+    print("Game Title:  "+cartname)
+    print("Rom Makeup:  "+str(ROMmakeup))
+    print("-Rom Speed:  "+str(ROMSpeed))
+    print("-Bank Size:  "+str(bankSize))
+    print("ROM Type:  "+str(ROMtype))
+
+    if header.isCX4:
+        print("\nCapcom CX4 Rom Type Detected!")
+        with metrics.phase('cx4'):
+            cart.CX4setROMSize(ROMsize)
+        print("")
+
+    print("Rom Size:  "+str(ROMsize)+" Mbits")
+    print("SRAM Size: Value: " +str(SRAMsize))
+    if convertedSRAMsize == 0 and header.sramKbits:
+        convertedSRAMsize = header.sramKbits
+        print(convertedSRAMsize)
+    print(" | " + str(convertedSRAMsize) + "Kbits")
+
+    print("Country:  "+str(county))
+    print("license:  "+str(license))
+    print("Version:  1."+str(version))
+    print("invChkS:  "+str(hex(inverseChecksum)))
+    print("RomChkS:  "+str(hex(checksum)))
+    print("XORChkS:  "+str(hex(inverseChecksum | checksum)))
+    print("\nVBL Vector:  "+ str(VBLvector))
+    print("RST Vector:  "+ str(resetVector))
+    print("\n#ofPages:  "+str(numberOfPages))
+    print("")
+
+    if directory != "" and directory[len(directory)-1] != "/":
+        directory +="/"
+    if compression and library is None and not compress.available(compression):
+        print("no " + compression + " compressor here, writing raw")
+        compression = None
+    if library is not None:
+        compression = None
+    extension = compress.EXTENSIONS[compression] if compression else ''
+
+    with open(statusFile, 'w') as g:
+        g.write(cartname)
+
+    romPath = directory + fileName + '.smc' + extension
+    if library is not None:
+        romPath = library.workPath(header, ROM)
+    journalPath = romPath + '.journal'
+    stored = library.find(header, ROM) if library is not None else None
+    if readCart:
+        verified = known.find(header) if known is not None else None
+        if verified:
+            print("verified dump already in the library (sha1 " + verified + ") not dumping again")
+            readCart = False
+        elif stored is not None:
+            print("already in the library as " + stored['name'] + " not dumping again")
+            readCart = False
+        elif known is not None and _exists(romPath) and not _exists(journalPath):
+            #a finished dump, but not one of this cart: same title, other game
+            romPath = directory + fileName + '-' + ('%04x' % checksum) + '.smc' + extension
+            journalPath = romPath + '.journal'
+    if readCart:
+        #a journal next to the rom means an earlier dump never finished
+        if _exists(romPath) and not _exists(journalPath):
+            print("rom exists not dumping again")
+            readCart = False
+    elif readCart:
+        print("Will not dump cart due to Options")
+
+    if readCart:
+        timeStart = utime.time()
+        span = numberOfPages * cart.mapper.bankSize
+        with metrics.phase('size'):
+            length = probeSize(cart, span)
+        if length < span:
+            print("ROM is " + str(length) + " bytes, the rest of the " + str(span) +
+                  " in the header is mirrors, not reading those")
+            numberOfPages = length // cart.mapper.bankSize
+        journal = Journal.open(journalPath, {'title': cartname, 'checksum': checksum,
+                                             'complement': inverseChecksum,
+                                             'mapping': cart.mapper.name, 'size': length})
+        if compression:
+            #a compressed stream only grows at the end, so the journal
+            #just marks the dump unfinished and every bank is read again
+            ledger = Ledger()
+            file = compress.CompressedOut(romPath, compression)
+            gaps = [(0, length)]
+            patches = compress.Patches()
+        else:
+            ledger = Ledger(journal)
+            #sized for the whole cart up front, banks go in at their offsets
+            file = RomFile(romPath, length)
+            gaps = journal.missing(ledger, length, file.existing or 0)
+            journal.out = file
+            patches = file
+        if length < span:
+            ledger.mirrored(length, span, cart.mapper.bankSize)
+        try:
+            cart.totalChecksum = sum(entry.sum for entry in ledger.entries)
+            if ledger.entries and gaps:
+                print("resuming at offset " + hex(gaps[0][0]) + " of " + hex(length) +
+                      ", " + str(len(gaps)) + " ranges left to read")
+
+            if cart.isLowROM:
+                print("reading"+ str(numberOfPages)+ "low Rom Pages.")
+            elif numberOfPages > 64:
+                #the mapper carries on from bank 0xff to 0x40 by itself
+                print("reading first of 64 of "+str(numberOfPages)+ "hi Rom Pages")
+                print("then last "+str(numberOfPages - 64) + "of High rom pages.")
+            else:
+                print("reading "+ str(numberOfPages) + "Hi Rom Pages")
+            with metrics.phase('rom'):
+                for offset, count in gaps:
+                    cart.ripRange(offset, count, out=file, ledger=ledger, slots=slots)
+            if length < span:
+                #each mirrored bank summed as often as the header counts it
+                cart.totalChecksum = ledger.total()
+
+            print(("\nEntire Checksum: "+str(hex(cart.totalChecksum))))
+            print(("\nHeader Checksum: "+str(hex(checksum))))
+            cart.totalChecksum = (cart.totalChecksum & 0xFFFF)
+
+            print("16-bit generated Checksum:  "+str(hex(cart.totalChecksum)))
+            print("checksum ok" if cart.totalChecksum == checksum else "checksum bad")
+            if cart.totalChecksum != checksum:
+                print("re-reading banks, suspects first")
+                with metrics.phase('repair'):
+                    repaired = repairBanks(cart, ledger, checksum, patches)
+                print("checksum ok after re-reading" if repaired else
+                      "checksum still bad after re-reading")
+                cart.totalChecksum = ledger.total()
+                for entry in ledger.unstable():
+                    print("unstable bank: " + hex(entry.bank))
+            timeEnd = utime.time()
+            print("\nIt Took "+str(timeEnd - timeStart) + " seconds to read the cart")
+        finally:
+            file.close()
+            journal.close()
+        if compression:
+            if patches.banks:
+                compress.rewrite(romPath, patches.banks, cart.mapper.bankSize)
+            print(str(length) + " bytes compressed to " + str(os.stat(romPath)[6]))
+        if cart.totalChecksum == checksum:
+            journal.finish()
+            datName = None
+            if dat is not None:
+                with metrics.phase('identify'):
+                    datName = _identify(dat, known, header, romPath)
+            if library is not None:
+                stored = library.store(romPath, ROM, header, datName)
+        else:
+            print("keeping " + journalPath + ", the next run " +
+                  ("dumps it again" if compression else "retries the bad banks"))
+
+    if readSRAM and not convertedSRAMsize:
+        print("cart has no SRAM, nothing to save")
+    elif readSRAM:
+        sramPath = directory+fileName+'.srm'+extension
+        if library is not None:
+            sramPath = library.workPath(header, SRAM)
+        with (compress.CompressedOut(sramPath, compression) if compression else
+              open(sramPath,'wb')) as file:
+            timeStart = utime.time()
+            with metrics.phase('sram'):
+                cart.ripSRAM(convertedSRAMsize, ROMsize, out=file)
+            timeEnd = utime.time()
+            print("\nIt Took "+ str(timeEnd-timeStart) + "seconds to Read SRAM data")
+        if snapshots is not None:
+            file = compress.openRead(sramPath)
+            try:
+                snapshots.snapshot(header, file.read())
+            finally:
+                file.close()
+        if library is not None:
+            #saves go by the name the ROM is stored under
+            library.store(sramPath, SRAM, header,
+                          stored['name'][:-4] if stored is not None else None)
+    return readCart, (cart.totalChecksum if readCart else None)
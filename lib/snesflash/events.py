@@ -0,0 +1,130 @@
+"""
+`snesflash.events`
+====================================================
+Cart insertion and removal without re-running the whole setup.  The cart
+stays powered for reading with the address parked on 00:ffdc, the low byte
+of the header's checksum complement.  Every mapping decodes the header
+there, and the complement and checksum low bytes (00:ffdc, 00:ffde) can not
+both be 0xff, so a cart with a sane header always reads something other
+than the 0xff the data pull-ups give an empty slot.
+
+The data chip is set to interrupt on any change of the data pins.  With its
+INT output wired to ``intPin`` the watcher just waits for the edge;
+without, it polls the chip's INTF register, one one-byte read per
+``interval``.  Either way an interrupt is only a hint: the two bytes are
+probed, and re-probed after ``settle`` so a cart still being pushed in is
+not dumped half seated.  A full probe also runs every ``probeEvery``
+intervals to catch the odd cart whose byte at 00:ffdc is 0xff anyway.
+"""
+try:
+    import utime
+except ImportError:
+    import time as utime
+
+INSERTED = 'inserted'
+REMOVED = 'removed'
+
+_BANK = 0x00
+_PROBE = (0xffdc, 0xffde)
+
+
+class CartEvents:
+    def __init__(self, cart, intPin=None, interval=0.25, settle=0.5, probeEvery=20):
+        self.cart = cart
+        self.intPin = intPin
+        self.interval = interval
+        self.settle = settle
+        self.probeEvery = probeEvery
+        self.present = False
+        self._pending = False
+        self._armed = False
+        if intPin is not None:
+            #Pycom firmware calls it callback, MicroPython irq
+            hook = getattr(intPin, 'callback', None) or intPin.irq
+            hook(trigger=intPin.IRQ_FALLING, handler=self._irq)
+
+    def _irq(self, pin):
+        self._pending = True
+
+    def _probe(self):
+        cart = self.cart
+        for addr in _PROBE:
+            if cart.readAddrBank(addr, _BANK) != 0xff:
+                return True
+        return False
+
+    def arm(self):
+        #power the slot for reading, park the address and watch the data pins
+        cart = self.cart
+        cart.readRom()
+        cart.readAddrBank(_PROBE[0], _BANK)
+        datachip = cart.datachip
+        datachip.intcon = 0x00   #interrupt on change from the last level
+        datachip.gpinten = 0xff
+        datachip.intcap          #clear anything already latched
+        self._pending = False
+        self._armed = True
+
+    def disarm(self):
+        self.cart.datachip.gpinten = 0x00
+        self._armed = False
+
+    def _changed(self):
+        if self.intPin is not None:
+            return self._pending or not self.intPin.value()
+        return self.cart.datachip.intf != 0
+
+    def check(self):
+        """Probe the slot now; returns INSERTED, REMOVED or None when
+        nothing changed.  Leaves the watcher disarmed after an insertion,
+        the dump owns the bus until ``arm`` is called again."""
+        present = self._probe()
+        if present and not self.present:
+            utime.sleep(self.settle)
+            present = self._probe()
+        if present and not self.present:
+            self.present = True
+            self.disarm()
+            self.cart.forgetHeader()
+            return INSERTED
+        if self._armed:
+            #back to the parked address, the gpio read clears INTF
+            self.cart.readAddrBank(_PROBE[0], _BANK)
+        if present == self.present:
+            return None
+        self.present = False
+        self.cart.forgetHeader()
+        return REMOVED
+
+    def wait(self, timeout=None):
+        """Block until the slot changes, returns INSERTED or REMOVED, or
+        None once ``timeout`` seconds pass without a change."""
+        if not self._armed:
+            self.arm()
+        polls = self.probeEvery  #look straight away, there may be a cart in already
+        waited = 0.0
+        while True:
+            if self._changed() or polls >= self.probeEvery:
+                polls = 0
+                self._pending = False
+                event = self.check()
+                if event:
+                    return event
+            if timeout is not None and waited >= timeout:
+                return None
+            utime.sleep(self.interval)
+            waited += self.interval
+            polls += 1
+
+    def run(self, onInsert, onRemove=None):
+        """Forever: call ``onInsert(cart)`` for every cart put in the slot
+        and ``onRemove(cart)`` when it comes out."""
+        while True:
+            event = self.wait()
+            if event == INSERTED:
+                try:
+                    onInsert(self.cart)
+                finally:
+                    self.arm()
+            elif event == REMOVED and onRemove:
+                onRemove(self.cart)
@@ -0,0 +1,342 @@
+"""
+`snesflash.farm`
+====================================================
+Several cart adapters on one host, each dumping on its own.  A station
+with adapters on separate Pi buses (i2c-1, i2c-3, ...) or at different
+MCP address triples on a shared one describes them in a JSON file::
+
+    {
+      "directory": "/srv/snes/",
+      "watch": true,
+      "slots": 4,
+      "adapters": [
+        {"name": "left", "bus": 1},
+        {"name": "right", "bus": 3},
+        {"name": "third", "bus": 1, "address": "0x24", "bank": "0x26",
+         "data": "0x26", "controls": "0x27"}
+      ]
+    }
+
+Anything left out of an adapter comes from the top level and then from
+``DEFAULTS`` (the Waterbury addresses).  ``run`` gives every adapter a
+worker process in a pool, so the I2C traffic of one never waits on the
+Python of another; ``watch`` workers dump every cart put in their slot,
+otherwise each dumps the cart it has once.  A worker that dies is started
+again after ``restartDelay`` seconds.
+
+All workers write to the one ``directory`` (or ``library``, see
+snesflash.library), and keep saves in the one ``history`` (see
+snesflash.snapshots), compressed when ``compression`` is set (see
+snesflash.compress).  A dump holds ``<title>.lock`` there while it runs,
+so the same game in two adapters is only dumped once, and the usual "rom
+exists" check covers it after that.  A lock left behind by a worker that
+was killed outright has to be removed by hand.
+
+Each worker's prints go to ``<logs>/<name>.log``; the parent prints one
+progress line per bank and per dump for the whole farm and keeps the
+totals, with every dump's snesflash.metrics report, in ``reportFile``.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import multiprocessing
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+from snesflash import transport
+from snesflash.cart import SnesCart
+from snesflash.dump import dumpCart
+from snesflash.detect import detect
+from snesflash.datindex import openIndexes
+from snesflash.library import Library, safeName
+from snesflash.snapshots import SnapshotStore
+from snesflash.events import CartEvents
+from snesflash.metrics import Metrics
+
+DEFAULTS = {'bus': 1, 'address': 0x20, 'bank': 0x22, 'data': 0x22, 'controls': 0x23,
+            'board': 'waterbury', 'baudrate': 100000, 'slots': 4, 'watch': False,
+            'readCart': True, 'readSRAM': True, 'sramKbits': 0, 'directory': '',
+            'logs': '/tmp', 'dat': None, 'known': None, 'library': None,
+            'history': None, 'compression': None}
+_ADDRESSES = ('address', 'bank', 'data', 'controls')
+
+
+def _int(value):
+    #JSON has no hex literals, addresses may come as "0x20"
+    return int(value, 0) if isinstance(value, str) else int(value)
+
+
+def loadConfig(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def adapters(config):
+    """Every adapter of ``config`` with the top level settings and
+    ``DEFAULTS`` filled in."""
+    found = []
+    names = set()
+    for index, adapter in enumerate(config.get('adapters', ())):
+        settings = dict(DEFAULTS)
+        settings.update((key, value) for key, value in config.items() if key != 'adapters')
+        settings.update(adapter)
+        settings.setdefault('name', 'adapter' + str(index))
+        for key in _ADDRESSES + ('bus',):
+            settings[key] = _int(settings[key])
+        if settings['name'] in names:
+            raise ValueError('adapter name used twice: ' + settings['name'])
+        names.add(settings['name'])
+        found.append(settings)
+    seen = {}
+    for settings in found:
+        where = (settings['bus'], settings['address'])
+        if where in seen:
+            raise ValueError(settings['name'] + ' and ' + seen[where] +
+                             ' share bus ' + str(where[0]) + ' address ' + hex(where[1]))
+        seen[where] = settings['name']
+    return found
+
+
+def openBus(settings):
+    return transport.openSMBus(settings['bus'])
+
+
+class _Progress(Metrics):
+    #passes every bank on to the farm as it is read
+    def __init__(self, queue, name):
+        self.queue = queue
+        self.name = name
+        Metrics.__init__(self)
+
+    def bank(self, bank, seconds):
+        Metrics.bank(self, bank, seconds)
+        self.queue.put(('bank', self.name, bank, len(self.banks)))
+
+
+def _claim(path):
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except OSError:
+        return False
+    os.write(fd, str(os.getpid()).encode())
+    os.close(fd)
+    return True
+
+
+def _dump(cart, settings, queue, dat=None, known=None, library=None, history=None):
+    name = settings['name']
+    directory = settings['directory']
+    found = detect(cart)
+    if found is None:
+        queue.put(('unknown', name))
+        return
+    header = found.header
+    title = header.title[:20]
+    lock = os.path.join(library.root if library is not None else directory,
+                        safeName(title) + '.lock')
+    if not _claim(lock):
+        queue.put(('busy', name, title))
+        return
+    try:
+        queue.put(('start', name, title, cart.getNumOfPages(header.romMbits)))
+        start = time.time()
+        read, checksum = dumpCart(cart, directory, settings['statusFile'],
+                                  settings['readCart'], settings['readSRAM'],
+                                  settings['sramKbits'], slots=settings['slots'],
+                                  dat=dat, known=known, library=library,
+                                  snapshots=history, compression=settings['compression'])
+        if not read:
+            #already dumped, or readCart is off: nothing read, nothing to count
+            queue.put(('skipped', name, title))
+            return
+        report = cart.metrics.report(cart)
+        report['bytes'] = len(cart.metrics.banks) * cart.mapper.bankSize
+        report['seconds'] = round(time.time() - start, 3)
+        report['checksumOk'] = checksum == header.checksum
+        queue.put(('dumped', name, title, report))
+    finally:
+        os.remove(lock)
+
+
+def _initWorker():
+    #Ctrl-C is the parent's to handle; a terminate still runs the finally
+    #that powers the cart down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+
+def worker(settings, queue, opener=openBus):
+    """Drive one adapter: its own bus, SnesCart and log file."""
+    name = settings['name']
+    settings.setdefault('statusFile', os.path.join(settings['logs'], 'insertedCart-' + name))
+    log = open(os.path.join(settings['logs'], name + '.log'), 'a')
+    sys.stdout = log
+    bus = opener(settings)
+    cart = SnesCart(address=settings['address'], bank=settings['bank'],
+                    data=settings['data'], i2c=bus, board=settings['board'],
+                    controls=settings['controls'], baudrate=settings['baudrate'])
+    cart.metrics = _Progress(queue, name)
+    known = settings['known']
+    if settings['dat'] and not known:
+        known = os.path.join(settings['library'] or settings['directory'], 'knownDumps.idx')
+    dat, known = openIndexes(settings['dat'], known)
+    library = Library(settings['library']) if settings['library'] else None
+    history = (SnapshotStore(settings['history'], compression=settings['compression'])
+               if settings['history'] else None)
+
+    def removed(cart):
+        with open(settings['statusFile'], 'w') as f:
+            f.write("NULL")
+        queue.put(('removed', name))
+    try:
+        queue.put(('ready', name))
+        if settings['watch']:
+            CartEvents(cart).run(lambda cart: _dump(cart, settings, queue, dat, known, library,
+                                                         history),
+                                 removed)
+        else:
+            _dump(cart, settings, queue, dat, known, library, history)
+    finally:
+        cart.shutdown()
+        bus.close()
+        for index in (dat, known):
+            if index is not None:
+                index.close()
+        log.close()
+
+
+class Farm:
+    """The parent side: one pool worker per adapter, restarts, progress
+    and the combined report."""
+
+    def __init__(self, config, reportFile=None, opener=openBus, restartDelay=5.0,
+                 out=None):
+        self.adapters = adapters(config)
+        self.reportFile = reportFile
+        self.opener = opener
+        self.restartDelay = restartDelay
+        self.out = out or sys.stdout
+        self.stats = dict((settings['name'], {'dumps': 0, 'bytes': 0, 'seconds': 0.0,
+                                              'badChecksums': 0, 'skipped': 0, 'restarts': 0,
+                                              'cart': None, 'banks': 0, 'pages': 0})
+                          for settings in self.adapters)
+        self.dumps = []
+        self.started = time.time()
+
+    def _say(self, name, text):
+        self.out.write('[' + name + '] ' + text + '\n')
+        self.out.flush()
+
+    def handle(self, message):
+        kind, name = message[0], message[1]
+        stats = self.stats[name]
+        if kind == 'start':
+            stats['cart'], stats['pages'], stats['banks'] = message[2], message[3], 0
+            self._say(name, 'dumping ' + message[2].strip())
+        elif kind == 'bank':
+            stats['banks'] = message[3]
+            self._say(name, stats['cart'].strip() + ' bank ' + hex(message[2]) + ' (' +
+                      str(message[3]) + '/' + str(stats['pages']) + ')')
+        elif kind == 'dumped':
+            report = message[3]
+            stats['dumps'] += 1
+            stats['bytes'] += report['bytes']
+            stats['seconds'] += report['seconds']
+            if not report['checksumOk']:
+                stats['badChecksums'] += 1
+            stats['cart'] = None
+            self.dumps.append({'adapter': name, 'title': message[2], 'report': report})
+            self._say(name, message[2].strip() + ' done in ' + str(report['seconds']) + 's' +
+                      ('' if report['checksumOk'] else ', checksum bad') + ' | ' + self.summary())
+            self.save()
+        elif kind == 'skipped':
+            stats['skipped'] += 1
+            stats['cart'] = None
+            self._say(name, message[2].strip() + ' already dumped, ROM not read again')
+        elif kind == 'busy':
+            self._say(name, message[2].strip() + ' is being dumped on another adapter')
+        elif kind == 'unknown':
+            self._say(name, 'no mapping stands out for this cart, not dumped')
+        elif kind == 'removed':
+            self._say(name, 'cart removed')
+        elif kind == 'ready':
+            self._say(name, 'ready')
+
+    def totals(self):
+        elapsed = time.time() - self.started
+        total = sum(stats['bytes'] for stats in self.stats.values())
+        return {'dumps': sum(stats['dumps'] for stats in self.stats.values()),
+                'bytes': total, 'seconds': round(elapsed, 3),
+                'bytesPerSecond': round(total / elapsed, 1) if elapsed else 0}
+
+    def summary(self):
+        totals = self.totals()
+        return (str(totals['dumps']) + ' dumps, ' + str(totals['bytes']) + ' bytes, ' +
+                str(totals['bytesPerSecond']) + ' B/s over the farm')
+
+    def report(self):
+        return {'totals': self.totals(), 'adapters': self.stats, 'dumps': self.dumps}
+
+    def save(self):
+        if not self.reportFile:
+            return
+        try:
+            with open(self.reportFile, 'w') as f:
+                json.dump(self.report(), f)
+        except OSError as e:
+            self._say('farm', 'could not write report ' + self.reportFile + ': ' + str(e))
+
+    def run(self, poll=0.2):
+        """Run every adapter until the one shot workers are all done, or
+        for watch farms until interrupted.  Returns the report."""
+        manager = multiprocessing.Manager()
+        queue = manager.Queue()
+        pool = multiprocessing.Pool(len(self.adapters), _initWorker)
+        running = {}
+        restartAt = {}
+
+        def start(settings):
+            running[settings['name']] = pool.apply_async(
+                worker, (dict(settings), queue, self.opener))
+        for settings in self.adapters:
+            start(settings)
+        try:
+            while running or restartAt:
+                try:
+                    self.handle(queue.get(timeout=poll))
+                    continue
+                except Empty:
+                    pass
+                for settings in self.adapters:
+                    name = settings['name']
+                    result = running.get(name)
+                    if result is not None and result.ready():
+                        del running[name]
+                        try:
+                            result.get()
+                        except Exception as e:
+                            self._say(name, 'worker failed: ' + repr(e))
+                            if settings['watch']:
+                                restartAt[name] = time.time() + self.restartDelay
+                    elif name in restartAt and time.time() >= restartAt[name]:
+                        del restartAt[name]
+                        self.stats[name]['restarts'] += 1
+                        self._say(name, 'restarting')
+                        start(settings)
+            #anything still queued from workers that just finished
+            while True:
+                try:
+                    self.handle(queue.get_nowait())
+                except Empty:
+                    break
+        finally:
+            pool.terminate()
+            pool.join()
+            manager.shutdown()
+            self.save()
+        return self.report()
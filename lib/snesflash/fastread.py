@@ -0,0 +1,49 @@
+"""
+`snesflash.fastread`
+====================================================
+The ROM read loop for ``machine.I2C``, compiled by MicroPython's native
+emitter.  SnesCart._readRun spends most of each byte in the interpreter:
+the ``datachip.gpio`` property, ``_read_u8``, the transport's counting
+wrapper, then the same again for the address write.  ``readRun`` makes the
+two driver calls straight on the raw bus object, into and out of buffers
+allocated once, and leaves the chip and transport counters to be brought up
+to date with a few additions per run (``account``).
+
+Only the loop is compiled, in snesflash.nativeloop.  Viper would not buy
+anything more here, since every pass is two calls into the I2C driver.
+Where the port was built without the native emitter (and on CPython) that
+module does not import, ``available`` is False and SnesCart keeps to its
+plain loop.
+"""
+try:
+    from snesflash.nativeloop import readRun as _readRun
+    available = True
+except (ImportError, SyntaxError):
+    _readRun = None
+    available = False
+
+
+class FastRead:
+    def __init__(self, i2c, dataAddr, dataRegister, addrAddr):
+        self.i2c = i2c                  #the raw machine.I2C, not the transport
+        self.dataAddr = dataAddr
+        self.dataRegister = dataRegister
+        self.addrAddr = addrAddr
+        self.one = bytearray(1)
+        self.low = bytearray(1)
+        self.both = bytearray(2)
+
+    def readRun(self, start, count, buf):
+        #fill buf[0:count], the address chip already holding start
+        _readRun(self.i2c.readfrom_mem_into, self.i2c.writeto_mem, self.dataAddr,
+                 self.dataRegister, self.addrAddr, start, count, buf, self.one,
+                 self.low, self.both)
+
+
+def account(transport, dataChip, addrChip, start, count):
+    #what the plain loop would have counted for the same run
+    pages = (start + count - 1) // 256 - start // 256
+    transport.transactions += 2 * count - 1
+    transport.bytes += 4 * count + 3 * (count - 1) + pages
+    dataChip.reads += count
+    addrChip.writes += count - 1
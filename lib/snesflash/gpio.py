@@ -0,0 +1,343 @@
+"""
+`snesflash.gpio`
+====================================================
+The cart wired straight to a Linux board's GPIO lines, no expanders.  Each
+group of lines (16 address, 8 bank, 8 data, 5 control) is one bulk request
+through libgpiod, so setting an address or sampling the data byte is one
+ioctl instead of an I2C transaction.  Host only, needs the ``gpiod`` Python
+bindings (libgpiod 2.x, or the 1.x ones Raspberry Pi OS ships).
+
+``GpioBus`` stands in for the i2c bus and hands SnesCart ports that answer
+the same register names the MCP230xx classes do (``gpio``, ``gpioa``,
+``iodir``, ``gppu``, ``intf``...), so everything above the chips runs
+unchanged::
+
+    bus = GpioBus(loadWiring('wiring.json'))
+    cart = SnesCart(i2c=bus, board='gpio')
+
+A 40 pin Raspberry Pi header has 28 GPIO lines and this needs 37.  A group
+can sit on any gpiochip, so use a Compute Module, or put the bank on a
+second chip (a USB or HAT GPIO board shows up as one).  ``activeLow`` lists
+lines that are inverted on the way out, the control lines follow the
+Waterbury board with the cart MOSFET on power active low.
+
+To test without hardware, ``simbus.SimGpio`` is a mock chip wired to a
+SimCart, passed as ``opener``.  The ``gpio-sim`` kernel module gives real
+gpiochips with nothing on the other end, for the libgpiod side alone.
+"""
+import json
+
+ADDRESS = 'address'
+BANK = 'bank'
+DATA = 'data'
+CONTROLS = 'controls'
+
+#lowest bit first.  Controls are /rd, /rst, /wr, /cs, power, as the
+#snesflash.cart control bits
+WIRING = {'chip': '/dev/gpiochip0',
+          ADDRESS: list(range(0, 16)),
+          BANK: list(range(16, 24)),
+          DATA: list(range(24, 32)),
+          CONTROLS: list(range(32, 37)),
+          'activeLow': []}
+
+
+def loadWiring(path):
+    """WIRING with whatever ``path`` (JSON) sets.  A group is a list of
+    line offsets on ``chip``, or {"chip": ..., "lines": [...]}."""
+    wiring = dict(WIRING)
+    if path:
+        with open(path) as f:
+            wiring.update(json.load(f))
+    return wiring
+
+
+def lineGroups(wiring):
+    #role -> (chip path, offsets, inverted bits)
+    groups = {}
+    activeLow = wiring.get('activeLow', ())
+    for role, width in ((ADDRESS, 16), (BANK, 8), (DATA, 8), (CONTROLS, 5)):
+        group = wiring[role]
+        path = wiring['chip']
+        if isinstance(group, dict):
+            path = group.get('chip', path)
+            group = group['lines']
+        if len(group) != width:
+            raise ValueError(role + " needs " + str(width) + " lines, the wiring has " +
+                             str(len(group)))
+        invert = 0
+        for bit, offset in enumerate(group):
+            if offset in activeLow:
+                invert |= 1 << bit
+        groups[role] = (path, list(group), invert)
+    return groups
+
+
+class _Request:
+    #one bulk request, the value is an int with the first offset as bit 0.
+    #The binding's class makes the request in _request and has configure,
+    #set, get and release, as simbus._SimLines does
+    def __init__(self, role, path, offsets, output, pullUp):
+        import gpiod
+        self.gpiod = gpiod
+        self.role = role
+        self.path = path
+        self.offsets = offsets
+        self._request(output, pullUp)
+
+
+class _LinesV2(_Request):
+    #libgpiod 2.x: gpiod.request_lines, values by offset, partial sets
+    def _request(self, output, pullUp):
+        from gpiod.line import Bias, Direction, Value
+        self.active, self.inactive = Value.ACTIVE, Value.INACTIVE
+        self._settings = lambda output, pullUp: self.gpiod.LineSettings(
+            direction=Direction.OUTPUT if output else Direction.INPUT,
+            bias=Bias.PULL_UP if pullUp and not output else Bias.AS_IS)
+        self._cache = {}
+        self.request = self.gpiod.request_lines(
+            self.path, consumer='snesflash-' + self.role,
+            config={tuple(self.offsets): self._settings(output, pullUp)})
+
+    def configure(self, output, pullUp):
+        self.request.reconfigure_lines({tuple(self.offsets): self._settings(output, pullUp)})
+
+    def set(self, value, mask):
+        #only the lines under mask go out; an address low byte is 8 lines
+        key = (value & mask, mask)
+        values = self._cache.get(key)
+        if values is None:
+            values = {}
+            for bit, offset in enumerate(self.offsets):
+                if mask >> bit & 1:
+                    values[offset] = self.active if value >> bit & 1 else self.inactive
+            if mask < 0x100:
+                self._cache[key] = values
+        self.request.set_values(values)
+
+    def get(self):
+        value = 0
+        for bit, level in enumerate(self.request.get_values(self.offsets)):
+            if level == self.active:
+                value |= 1 << bit
+        return value
+
+    def release(self):
+        self.request.release()
+
+
+class _LinesV1(_Request):
+    #libgpiod 1.x: chip.get_lines bulk, all lines on every set, and a new
+    #request to change direction
+    def _request(self, output, pullUp):
+        gpiod = self.gpiod
+        self.lines = gpiod.Chip(self.path).get_lines(self.offsets)
+        self._output = None
+        self.configure(output, pullUp)
+
+    def configure(self, output, pullUp):
+        gpiod = self.gpiod
+        if self._output is not None:
+            self.lines.release()
+        flags = 0
+        if pullUp and not output:
+            flags = getattr(gpiod, 'LINE_REQ_FLAG_BIAS_PULL_UP', 0)
+        if output:
+            self.lines.request(consumer='snesflash-' + self.role, type=gpiod.LINE_REQ_DIR_OUT,
+                               flags=flags, default_vals=[0] * len(self.offsets))
+        else:
+            self.lines.request(consumer='snesflash-' + self.role, type=gpiod.LINE_REQ_DIR_IN,
+                               flags=flags)
+        self._output = output
+
+    def set(self, value, mask):
+        self.lines.set_values([value >> bit & 1 for bit in range(len(self.offsets))])
+
+    def get(self):
+        value = 0
+        for bit, level in enumerate(self.lines.get_values()):
+            value |= level << bit
+        return value
+
+    def release(self):
+        self.lines.release()
+
+
+def openLines(role, path, offsets, output, pullUp):
+    """The libgpiod request for a group, whichever binding is installed."""
+    import gpiod
+    if hasattr(gpiod, 'request_lines'):
+        return _LinesV2(role, path, offsets, output, pullUp)
+    return _LinesV1(role, path, offsets, output, pullUp)
+
+
+class GpioPort:
+    """A group of lines with an expander's registers.  Direction is for the
+    whole port: an ``iodir`` with every bit set makes it an input, anything
+    else an output.  The interrupt registers are polled: ``intf`` reads the
+    lines and compares them with the level last captured (by ``gpinten``,
+    ``intcap`` or a ``gpio`` read), or with ``defval`` for bits set in
+    ``intcon``."""
+
+    def __init__(self, bus, lines, width, invert, output):
+        self._bus = bus
+        self._lines = lines
+        self._address = lines.path + ':' + ','.join(str(o) for o in lines.offsets)
+        self._mask = (1 << width) - 1
+        self._invert = invert
+        self._output = output
+        self._value = 0
+        self._gppu = self._mask if not output else 0
+        self._defval = 0
+        self._gpinten = 0
+        self._intcon = 0
+        self._level = 0
+        self.reads = 0
+        self.writes = 0
+
+    def resetCounters(self):
+        self.reads = 0
+        self.writes = 0
+
+    def _get(self):
+        self.reads += 1
+        self._bus.transactions += 1
+        if self._output:
+            return self._value
+        return self._lines.get() ^ self._invert
+
+    def _set(self, value, mask):
+        self.writes += 1
+        self._bus.transactions += 1
+        self._value = value & self._mask
+        self._lines.set(self._value ^ self._invert, mask)
+
+    @property
+    def gpio(self):
+        #like the chip, reading the port clears a pending change
+        value = self._get()
+        if self._gpinten:
+            self._level = value
+        return value
+
+    @gpio.setter
+    def gpio(self, val):
+        self._set(val, self._mask)
+
+    @property
+    def gpioa(self):
+        return self._get() & 0xff
+
+    @gpioa.setter
+    def gpioa(self, val):
+        self._set((self._value & 0xff00) | (val & 0xff), 0x00ff)
+
+    @property
+    def gpiob(self):
+        return self._get() >> 8
+
+    @gpiob.setter
+    def gpiob(self, val):
+        self._set((self._value & 0x00ff) | (val & 0xff) << 8, 0xff00)
+
+    @property
+    def iodir(self):
+        return 0 if self._output else self._mask
+
+    @iodir.setter
+    def iodir(self, val):
+        output = (val & self._mask) != self._mask
+        if output != self._output:
+            self._bus.transactions += 1
+            self._lines.configure(output, bool(self._gppu))
+            self._output = output
+            if output:
+                self._set(self._value, self._mask)
+
+    @property
+    def gppu(self):
+        return self._gppu
+
+    @gppu.setter
+    def gppu(self, val):
+        if bool(val) != bool(self._gppu) and not self._output:
+            self._bus.transactions += 1
+            self._lines.configure(False, bool(val))
+        self._gppu = val & self._mask
+
+    @property
+    def defval(self):
+        return self._defval
+
+    @defval.setter
+    def defval(self, val):
+        self._defval = val & self._mask
+
+    @property
+    def intcon(self):
+        return self._intcon
+
+    @intcon.setter
+    def intcon(self, val):
+        self._intcon = val & self._mask
+
+    @property
+    def gpinten(self):
+        return self._gpinten
+
+    @gpinten.setter
+    def gpinten(self, val):
+        self._gpinten = val & self._mask
+        if self._gpinten:
+            self._level = self._get()
+
+    @property
+    def intcap(self):
+        self._level = self._get()
+        return self._level
+
+    @property
+    def intf(self):
+        if not self._gpinten:
+            return 0
+        level = self._get()
+        against = (self._defval & self._intcon) | (self._level & ~self._intcon)
+        return (level ^ against) & self._gpinten
+
+
+class GpioBus:
+    """The line requests for one cart slot, in the place of an i2c bus.
+    ``transactions`` counts line ioctls; nothing goes over a wire, so
+    ``bytes`` stays 0 and the clock can not be changed."""
+    batched = False
+
+    def __init__(self, wiring=None, opener=openLines):
+        groups = lineGroups(wiring or WIRING)
+        self.transactions = 0
+        self.bytes = 0
+        self.ports = {}
+        self._lines = []
+        try:
+            for role, width, output in ((CONTROLS, 5, True), (ADDRESS, 16, True),
+                                        (BANK, 8, True), (DATA, 8, False)):
+                path, offsets, invert = groups[role]
+                lines = opener(role, path, offsets, output, not output)
+                self._lines.append(lines)
+                self.ports[role] = GpioPort(self, lines, width, invert, output)
+        except Exception:
+            self.close()
+            raise
+        #power off (the MOSFET is active low) until the cart asks for it
+        self.ports[CONTROLS].gpio = 0x10
+
+    def resetCounters(self):
+        self.transactions = 0
+        self.bytes = 0
+
+    def setClock(self, baudrate):
+        return False
+
+    def close(self):
+        for lines in self._lines:
+            lines.release()
+        self._lines = []
@@ -0,0 +1,65 @@
+"""
+`snesflash.header`
+====================================================
+The cart's internal header, decoded from the 64 byte block at the header
+offset (0x7fc0 LoROM, 0xffc0 HiROM): the 32 bytes of header proper followed
+by the native and emulation mode vectors.
+"""
+try:
+    from micropython import const
+except ImportError:
+    def const(val):
+        return val
+
+HEADERSIZE = const(64)
+CX4 = const(0xf3)
+
+
+def _word(data, index):
+    return data[index] | data[index + 1] << 8
+
+
+class Header:
+    __slots__ = ('offset', 'title', 'makeup', 'cartType', 'romSize', 'sramSize',
+                 'country', 'license', 'version', 'complement', 'checksum',
+                 'nmiVector', 'resetVector')
+
+    def __init__(self, data, offset=0):
+        self.offset = offset
+        self.title = ''.join([chr(b) for b in data[0:21]])
+        self.makeup = data[0x15]
+        self.cartType = data[0x16]
+        self.romSize = data[0x17]
+        self.sramSize = data[0x18]
+        self.country = data[0x19]
+        self.license = data[0x1a]
+        self.version = data[0x1b]
+        self.complement = _word(data, 0x1c)
+        self.checksum = _word(data, 0x1e)
+        self.nmiVector = _word(data, 0x2a)    #native mode NMI, $ffea
+        self.resetVector = _word(data, 0x3c)  #emulation mode RESET, $fffc
+
+    @property
+    def checksumsMatch(self):
+        return self.checksum ^ self.complement == 0xffff
+
+    @property
+    def speed(self):
+        return self.makeup >> 4
+
+    @property
+    def mapMode(self):
+        #0 LoROM, 1 HiROM, 2/5 the Ex mappings
+        return self.makeup & 0x0f
+
+    @property
+    def romMbits(self):
+        return pow(2, self.romSize - 7) if self.romSize >= 7 else -1
+
+    @property
+    def sramKbits(self):
+        return 1 << (self.sramSize + 3) if 0 < self.sramSize <= 12 else 0
+
+    @property
+    def isCX4(self):
+        return self.cartType == CX4
@@ -0,0 +1,97 @@
+"""
+`snesflash.journal`
+====================================================
+Checkpoints for a dump in progress.  ``<dump>.journal`` sits next to the
+partial output: a first line identifying the cart (title, header checksums,
+mapping, size) and one line per bank once its data is safely in the output
+file.  A restarted dump of the same cart reads only the banks that are not
+in the journal, wherever they are; a different cart starts the journal
+over.  The
+journal is removed once the dump checks out, so an output file with a
+journal next to it is never mistaken for a finished dump.
+"""
+import os
+try:
+    import json
+except ImportError:
+    import ujson as json
+
+
+def _fsync(f):
+    f.flush()
+    fsync = getattr(os, 'fsync', None)
+    if fsync:
+        fsync(f.fileno())
+
+
+class Journal:
+    def __init__(self, path, ident):
+        self.path = path
+        self.ident = ident
+        self.out = None      # the output file, flushed before each checkpoint
+        self.saved = []      # bank records found on disk from an earlier run
+        self._f = None
+
+    @classmethod
+    def open(cls, path, ident):
+        journal = cls(path, ident)
+        try:
+            with open(path) as f:
+                lines = f.read().split('\n')
+            if lines and json.loads(lines[0]) == ident:
+                for line in lines[1:]:
+                    if line:
+                        journal.saved.append(json.loads(line))
+            else:
+                print("journal is for a different cart, starting over")
+        except (OSError, ValueError):
+            pass
+        journal._f = open(path, 'w')
+        journal._f.write(json.dumps(ident) + '\n')
+        for record in journal.saved:
+            journal._f.write(json.dumps(record) + '\n')
+        _fsync(journal._f)
+        return journal
+
+    def missing(self, ledger, length, size=None):
+        """Feed the saved banks to ``ledger`` and return the (offset, length)
+        ranges of the ``length`` byte dump still to be read, in order.  A
+        bank only counts when it lies within the first ``size`` bytes, what
+        really made it to disk."""
+        latest = {}
+        for record in self.saved:
+            latest[record['offset']] = record
+        gaps = []
+        offset = 0
+        for start in sorted(latest):
+            record = latest[start]
+            end = start + record['length']
+            if start < offset or end > length or (size is not None and end > size):
+                continue
+            ledger.restore(record['offset'], record['length'], record['bank'],
+                           record['sum'], record['sha1'])
+            if start > offset:
+                gaps.append((offset, start - offset))
+            offset = end
+        if offset < length:
+            gaps.append((offset, length - offset))
+        return gaps
+
+    def complete(self, entry):
+        # checkpoint one bank, after its data has hit the output file
+        if self.out is not None:
+            _fsync(self.out)
+        self._f.write(json.dumps({'offset': entry.offset, 'length': entry.length,
+                                  'bank': entry.bank, 'sum': entry.sum,
+                                  'sha1': entry.sha1}) + '\n')
+        _fsync(self._f)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def finish(self):
+        # dump verified, the journal has done its job
+        self.close()
+        os.remove(self.path)
@@ -0,0 +1,191 @@
+"""
+`snesflash.ledger`
+====================================================
+Per-bank sums and hashes for a dump, and targeted repair when the total does
+not match the header checksum: re-read the banks, vote each byte of the
+ones that changed across several reads, patch the output in place and report the banks
+that gave different data from one read to the next.  Banks with some sign
+of trouble go first; the rest are each read once more and only voted on when
+that read differs, so a dirty contact with no bus errors is still found and
+a header checksum that is just wrong (hacks, protos) costs one re-read at
+the normal clock.
+"""
+try:
+    import hashlib
+except ImportError:
+    import uhashlib as hashlib
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+
+from snesflash.mapper import mirror
+
+OPENBUS = 0.5   # open bus score from which a bank is a suspect
+
+
+def sha1hex(data):
+    return binascii.hexlify(hashlib.sha1(data).digest()).decode()
+
+
+class BankEntry:
+    __slots__ = ('offset', 'length', 'bank', 'sum', 'sha1', 'errors', 'unstable')
+
+    def __init__(self, offset, length, bank, total, digest):
+        self.offset = offset
+        self.length = length
+        self.bank = bank
+        self.sum = total
+        self.sha1 = digest
+        self.errors = 0        # bus errors seen while reading this bank
+        self.unstable = False  # re-reads disagreed with each other
+
+    def openBusScore(self, data):
+        # fraction of 0xff/0x00 bytes, what floating or shorted data lines
+        # read as on a bank with a bad contact
+        flat = data.count(b'\xff') + data.count(b'\x00')
+        return flat / float(len(data)) if data else 0
+
+
+class Ledger:
+    def __init__(self, journal=None):
+        self.entries = []
+        self._byOffset = {}
+        self.journal = journal  # snesflash.journal.Journal to checkpoint banks to
+        self.weights = {}       # offset -> times the bank shows up in the header's ROM size
+
+    def _add(self, entry):
+        self.entries.append(entry)
+        self._byOffset[entry.offset] = entry
+        return entry
+
+    def measure(self, offset, chunk, bank):
+        # sum and hash a bank without recording it, the pipeline does the
+        # two on different threads
+        return BankEntry(offset, len(chunk), bank, sum(chunk), sha1hex(chunk))
+
+    def add(self, entry):
+        self._add(entry)
+        if self.journal is not None:
+            self.journal.complete(entry)
+        return entry
+
+    def restore(self, offset, length, bank, total, digest):
+        # a bank finished by an earlier run, taken from its journal
+        return self._add(BankEntry(offset, length, bank, total, digest))
+
+    def update(self, entry, data):
+        entry.sum = sum(data)
+        entry.sha1 = sha1hex(data)
+        if self.journal is not None:
+            self.journal.complete(entry)
+
+    def mirrored(self, size, span, step):
+        # only size bytes were read, but the header checksum is over the
+        # ROM mirrored out to span; every bank counts once per copy
+        self.weights = {}
+        for offset in range(0, span, step):
+            source = mirror(offset, size)
+            self.weights[source] = self.weights.get(source, 0) + 1
+
+    def get(self, offset):
+        return self._byOffset.get(offset)
+
+    def total(self):
+        weights = self.weights
+        return sum(entry.sum * weights.get(entry.offset, 1) for entry in self.entries) & 0xFFFF
+
+    def suspects(self, out=None):
+        """Every bank in the order worth re-reading: ones that saw bus
+        errors, then ones that look like open bus (scored from the written
+        file when ``out`` is readable, ``OPENBUS`` or more), then the rest
+        from the end of the cart, where bad contacts on the high address
+        lines show up first."""
+        scored = []
+        for index, entry in enumerate(self.entries):
+            score = 0.0
+            if out is not None:
+                try:
+                    out.seek(entry.offset)
+                    score = entry.openBusScore(out.read(entry.length))
+                except (OSError, AttributeError):
+                    pass
+            if score < OPENBUS:
+                score = 0.0
+            scored.append((-entry.errors, -score, -index, entry))
+        scored.sort(key=lambda item: item[:3])
+        return [item[3] for item in scored]
+
+    def unstable(self):
+        return [entry for entry in self.entries if entry.unstable]
+
+
+def vote(samples):
+    # byte by byte majority of the reads, first read wins a three way tie
+    out = bytearray(samples[0])
+    half = len(samples) // 2
+    for index in range(len(out)):
+        counts = {}
+        for sample in samples:
+            val = sample[index]
+            counts[val] = counts.get(val, 0) + 1
+        best = out[index]
+        for val in counts:
+            if counts[val] > half:
+                best = val
+        out[index] = best
+    return out
+
+
+def repairBanks(cart, ledger, expected, out=None, mapping=None, reads=3):
+    """Re-read banks in ``Ledger.suspects`` order until the ledger total
+    matches ``expected``, or every bank has been read once more.
+
+    Each bank is read once more; if that matches its recorded hash the
+    bank is taken as good and skipped.  Otherwise it is read until there are
+    ``reads`` samples, voted byte by byte, the result is written over the
+    bank in ``out`` (opened for update) and the ledger entry is replaced.
+    The bus goes a step slower for the first bank that needs voting and is
+    back at its old clock when this returns.  Returns True when the total
+    matches."""
+    if ledger.total() == expected:
+        return True
+    baudrate = cart.baudrate
+    slowed = False
+    try:
+        suspects = ledger.suspects(out)
+        for entry in suspects:
+            first = cart.readRange(entry.offset, entry.length, mapping)
+            if sha1hex(first) == entry.sha1:
+                continue
+            samples = [first]
+            # reads that change from one pass to the next are what a marginal
+            # bus looks like too, take the rest of the samples a step slower
+            if not slowed:
+                cart.slowDown()
+                slowed = True
+            while len(samples) < reads:
+                samples.append(cart.readRange(entry.offset, entry.length, mapping))
+            entry.unstable = True
+            data = samples[0]
+            for sample in samples[1:]:
+                if sample != data:
+                    data = vote(samples)
+                    break
+            print("bank " + hex(entry.bank) + " re-read, " + str(len(samples)) + " reads")
+            if out is not None:
+                writeAt = getattr(out, 'writeAt', None)
+                if writeAt is not None:
+                    writeAt(entry.offset, data)
+                else:
+                    out.seek(entry.offset)
+                    out.write(data)
+            # journalled after the write, as ripRange does
+            ledger.update(entry, data)
+            if ledger.total() == expected:
+                return True
+        print("every bank re-read, the total still does not match")
+        return False
+    finally:
+        if cart.baudrate != baudrate:
+            cart.setClock(baudrate)
@@ -0,0 +1,185 @@
+"""
+`snesflash.library`
+====================================================
+A dump library that keeps every ROM and SRAM image once, under its SHA-1::
+
+    library/
+        objects/9a/9a806fd598dd52759e307e881eed703669686b3b
+        incoming/            dumps in progress (and their journals)
+        library.jsonl        one line per stored image
+        Super Mario World.smc -> objects/...
+
+dumpCart reads into ``incoming/`` as before, then ``store`` moves the
+finished file into ``objects/``, or just deletes it when that image is
+already there.  The readable names next to ``objects/`` are hard links,
+symlinks where hard links fail, and only index entries on filesystems with
+neither (the Pycom's FAT card).  A ROM name taken by a different image gets
+the header checksum added; an SRAM name always points at the newest save.
+
+``find`` answers "do we have this cart" from the index by header title,
+checksum and complement, so dumpCart skips a stored cart before reading
+any ROM bank.  The index is only ever appended to, and is re-read when it
+grows, so farm workers can share a library.
+"""
+import os
+try:
+    import json
+except ImportError:
+    import ujson as json
+try:
+    import utime
+except ImportError:
+    import time as utime
+
+from snesflash.datindex import fileDigests
+
+ROM = 'rom'
+SRAM = 'sram'
+_EXTENSIONS = {ROM: '.smc', SRAM: '.srm'}
+_UNSAFE = '/\\:*?"<>|'
+
+
+def _clean(title):
+    #no path or shell characters, no control bytes
+    return ''.join('_' if c in _UNSAFE or ord(c) < 0x20 or ord(c) > 0x7e else c
+                   for c in title)
+
+
+def safeName(title):
+    #a header title as a file name, without the padding
+    return _clean(title).strip() or 'untitled'
+
+
+def dumpName(title):
+    #what dumpCart and link.dump call a cart's .smc/.srm: the first 20
+    #characters of the title, padding and all, as dumps have always been
+    return _clean(title[:20])
+
+
+def _exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+def _makedirs(path):
+    #os.makedirs is not on MicroPython
+    done = ''
+    for part in path.split('/'):
+        done += part + '/'
+        if part and not _exists(done):
+            os.mkdir(done)
+
+
+class Library:
+    def __init__(self, root):
+        self.root = root if root.endswith('/') else root + '/'
+        self.incoming = self.root + 'incoming/'
+        self.objects = self.root + 'objects/'
+        self.indexPath = self.root + 'library.jsonl'
+        _makedirs(self.incoming)
+        _makedirs(self.objects)
+        self.entries = []
+        self._byKey = {}
+        self._names = {}
+        self._read = 0
+        self.linkless = False
+        self._load()
+
+    def _load(self):
+        #pick up lines appended since the last look, by us or another worker
+        try:
+            size = os.stat(self.indexPath)[6]
+        except OSError:
+            return
+        if size <= self._read:
+            return
+        with open(self.indexPath, 'rb') as f:
+            f.seek(self._read)
+            data = f.read()
+        end = data.rfind(b'\n') + 1    #a line still being written waits
+        self._read += end
+        for line in data[:end].split(b'\n'):
+            if line:
+                self._add(json.loads(line.decode()))
+
+    def _add(self, entry):
+        self.entries.append(entry)
+        self._byKey[(entry['kind'], entry['title'], entry['checksum'],
+                     entry['complement'])] = entry
+        self._names[entry['name']] = entry['sha1']
+
+    def blobPath(self, sha1):
+        return self.objects + sha1[:2] + '/' + sha1
+
+    def find(self, header, kind=ROM):
+        """Latest index entry stored for this cart, or None."""
+        self._load()
+        return self._byKey.get((kind, header.title, header.checksum, header.complement))
+
+    def workPath(self, header, kind=ROM):
+        #where dumpCart writes before store
+        return self.incoming + safeName(header.title) + '-' + ('%04x' % header.checksum) + \
+            _EXTENSIONS[kind]
+
+    def _name(self, kind, header, sha1, name):
+        base = safeName(name or header.title)
+        ext = _EXTENSIONS[kind]
+        if kind == SRAM:
+            return base + ext
+        for candidate in (base, base + ' [' + ('%04x' % header.checksum) + ']',
+                          base + ' [' + sha1[:8] + ']'):
+            taken = self._names.get(candidate + ext)
+            if taken is None or taken == sha1:
+                return candidate + ext
+        return base + ' [' + sha1 + ']' + ext
+
+    def _link(self, blob, name):
+        path = self.root + name
+        try:
+            os.remove(path)     #an older save, or a stale link
+        except OSError:
+            pass
+        try:
+            os.link(blob, path)
+            return
+        except (AttributeError, OSError):
+            pass
+        try:
+            os.symlink(blob[len(self.root):], path)
+            return
+        except (AttributeError, OSError):
+            pass
+        if not self.linkless:
+            print("no links on this filesystem, names are in " + self.indexPath + " only")
+        self.linkless = True
+
+    def store(self, path, kind, header, name=None):
+        """Move the finished image at ``path`` into the library and return
+        its index entry.  ``name`` overrides the title for the readable
+        name, a DAT game name for instance."""
+        self._load()
+        sha1 = fileDigests(path)[0]
+        size = os.stat(path)[6]
+        blob = self.blobPath(sha1)
+        if _exists(blob):
+            os.remove(path)
+            print("already in the library: " + sha1)
+        else:
+            _makedirs(self.objects + sha1[:2])
+            os.rename(path, blob)
+        latest = self.find(header, kind)
+        if latest is not None and latest['sha1'] == sha1:
+            #the same image as last time (an unchanged save), nothing to index
+            return latest
+        entry = {'kind': kind, 'title': header.title, 'checksum': header.checksum,
+                 'complement': header.complement, 'sha1': sha1, 'size': size,
+                 'name': self._name(kind, header, sha1, name), 'time': utime.time()}
+        with open(self.indexPath, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        self._load()
+        self._link(blob, entry['name'])
+        print("stored " + entry['name'] + " as " + sha1)
+        return entry
@@ -0,0 +1,441 @@
+"""
+`snesflash.link`
+====================================================
+Dumps streamed straight off the board to a PC, over a UART or a TCP socket,
+in place of the SD card and the REPL.  Every message both ways is one
+frame::
+
+    a5 5a | kind | seq (2) | length (2) | payload | CRC32 (4)
+
+little endian, the CRC over kind to the end of the payload.  The PC numbers
+its requests with ``seq`` and the board answers with the same one, so a
+late frame from an earlier request is never taken for part of this one.
+
+    PC                               board
+    INFO                             HEADER  score, ROM length, mapping, 64 byte header
+    READ  bank, addr, length         DATA    position, bytes   (one per chunk)
+    SRAM  kbits, lowrom, at, length  DATA    ...
+                                     END     bytes sent, or ERROR message
+
+``Server`` runs on the board: it detects the mapping and the real ROM size
+(snesflash.detect) for INFO and reads ranges with ``SnesCart.readRuns``.  It
+keeps nothing between requests.  ``Receiver`` runs on the PC.  It keeps
+track of which chunks of a request came in whole, and asks again for just
+the ranges that did not: bad CRC, lost or cut short.  ``dump`` writes the
+.smc and .srm the way dumpCart names them.
+
+The link is anything with ``read(n)`` (returning what came in before its
+timeout, b'' or None for nothing) and ``write(data)``: a ``machine.UART``,
+a pyserial ``Serial``, or a socket in a ``SocketLink``.  A
+``socket.socketpair()`` makes a loopback for tests; simbus.NoisyLink damages
+the traffic on one to exercise the retransmits.  On the PC::
+
+    python3 lib/snesflash/link.py /dev/ttyUSB0 dumps/
+    python3 lib/snesflash/link.py 192.168.4.1:4040 dumps/
+"""
+import errno
+try:
+    import socket
+except ImportError:
+    import usocket as socket
+try:
+    import struct
+except ImportError:
+    import ustruct as struct
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+
+from snesflash import mapper
+from snesflash.detect import detect, probeSize
+from snesflash.header import Header, HEADERSIZE
+
+MAGIC = b'\xa5\x5a'
+CHUNK = 1024
+MAXPAYLOAD = 0x8000
+_HEAD = '<2sBHH'
+_HEADSIZE = 7
+_TIMEOUT = getattr(socket, 'timeout', ())
+
+#PC to board
+INFO = 0x49
+READ = 0x52
+SRAM = 0x53
+BYE = 0x51
+#board to PC
+HEADER = 0x68
+DATA = 0x64
+END = 0x65
+ERROR = 0x78
+
+
+def frame(kind, seq, payload=b''):
+    head = struct.pack(_HEAD, MAGIC, kind, seq, len(payload))
+    crc = binascii.crc32(payload, binascii.crc32(head[2:]))
+    return head + payload + struct.pack('<I', crc & 0xffffffff)
+
+
+def _sendData(link, seq, position, data):
+    #a DATA frame in three writes, so the chunk is never copied
+    head = struct.pack(_HEAD + 'I', MAGIC, DATA, seq, len(data) + 4, position)
+    crc = binascii.crc32(data, binascii.crc32(head[2:]))
+    link.write(head)
+    link.write(data)
+    link.write(struct.pack('<I', crc & 0xffffffff))
+
+
+class FrameReader:
+    """Good frames off a link as (kind, seq, payload).  Anything that does
+    not check out is skipped a byte at a time until the next magic, and
+    counted in ``bad``."""
+
+    def __init__(self, link):
+        self.link = link
+        self.buf = b''
+        self.bad = 0
+
+    def _fill(self, n):
+        #False when the link timed out first, what did come stays buffered
+        while len(self.buf) < n:
+            data = self.link.read(n - len(self.buf))
+            if not data:
+                return False
+            self.buf += data
+        return True
+
+    def next(self):
+        """The next good frame, None when the link times out."""
+        while True:
+            if not self._fill(_HEADSIZE):
+                return None
+            at = self.buf.find(MAGIC)
+            if at < 0:
+                self.buf = self.buf[-1:]
+                continue
+            if at:
+                self.bad += 1
+                self.buf = self.buf[at:]
+                continue
+            unused, kind, seq, length = struct.unpack(_HEAD, self.buf[:_HEADSIZE])
+            if length > MAXPAYLOAD + 4:
+                self._skip()
+                continue
+            end = _HEADSIZE + length
+            if not self._fill(end + 4):
+                return None
+            crc = binascii.crc32(self.buf[2:end]) & 0xffffffff
+            if crc != struct.unpack('<I', self.buf[end:end + 4])[0]:
+                self._skip()
+                continue
+            payload = self.buf[_HEADSIZE:end]
+            self.buf = self.buf[end + 4:]
+            return kind, seq, payload
+
+    def _skip(self):
+        self.bad += 1
+        self.buf = self.buf[1:]
+
+
+def _timedOut(e):
+    #CPython raises socket.timeout, MicroPython an OSError with the errno
+    return isinstance(e, _TIMEOUT) or (e.args and e.args[0] in (errno.ETIMEDOUT, errno.EAGAIN))
+
+
+class SocketLink:
+    """A connected socket as a link, a receive timeout reads as nothing."""
+
+    def __init__(self, sock, timeout=1.0):
+        self.sock = sock
+        sock.settimeout(timeout)
+
+    def read(self, n):
+        try:
+            return self.sock.recv(n)
+        except OSError as e:
+            if _timedOut(e):
+                return b''
+            raise
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+    def close(self):
+        self.sock.close()
+
+
+def listen(port, timeout=1.0):
+    """Wait for the PC on TCP ``port`` (the network already up), its
+    connection as a link."""
+    server = socket.socket()
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(socket.getaddrinfo('0.0.0.0', port)[0][-1])
+    server.listen(1)
+    print("waiting for the PC on port " + str(port))
+    conn, peer = server.accept()
+    server.close()
+    print("PC connected from " + str(peer))
+    return SocketLink(conn, timeout)
+
+
+def connect(where, baudrate=921600, timeout=1.0):
+    """A link to the board from ``host:port`` or a serial device (pyserial)."""
+    if ':' in where and not where.startswith('/'):
+        host, port = where.rsplit(':', 1)
+        return SocketLink(socket.create_connection((host, int(port)), timeout), timeout)
+    import serial
+    return serial.Serial(where, baudrate, timeout=timeout)
+
+
+def sramSlice(runs, at, length):
+    #the part of an SRAM image's bank windows (cart.sramRuns) from at for length
+    sliced = []
+    for bank, start, count in runs:
+        if length <= 0:
+            break
+        if at >= count:
+            at -= count
+            continue
+        n = min(count - at, length)
+        sliced.append((bank, start + at, n))
+        length -= n
+        at = 0
+    return sliced
+
+
+class Server:
+    """The board side: answers requests until the PC says BYE."""
+
+    def __init__(self, cart, link, chunkSize=CHUNK):
+        self.cart = cart
+        self.link = link
+        self.chunkSize = chunkSize
+        self.reader = FrameReader(link)
+
+    def serve(self):
+        while True:
+            message = self.reader.next()
+            if message is None:
+                continue
+            kind, seq, payload = message
+            if kind == BYE:
+                self.link.write(frame(END, seq, struct.pack('<I', 0)))
+                return
+            try:
+                self.handle(kind, seq, payload)
+            except (OSError, ValueError) as e:
+                self.link.write(frame(ERROR, seq, str(e).encode()))
+
+    def handle(self, kind, seq, payload):
+        cart = self.cart
+        if kind == INFO:
+            #no slot events here, the cart may have been swapped since the last INFO
+            cart.forgetHeader()
+            found = detect(cart)
+            if found is None:
+                self.link.write(frame(ERROR, seq, b'no mapping stands out'))
+                return
+            header = found.header
+            if header.isCX4:
+                cart.CX4setROMSize(header.romMbits)
+                cart.readRom()
+            mapping = cart.mapper
+            length = probeSize(cart, cart.getNumOfPages(header.romMbits) * mapping.bankSize)
+            raw = cart.readRange(mapping.header, HEADERSIZE, mapping)
+            name = mapping.name.encode()
+            self.link.write(frame(HEADER, seq, struct.pack('<BIB', found.score, length, len(name)) +
+                                  name + bytes(raw)))
+        elif kind == READ:
+            bank, addr, length = struct.unpack('<BHI', payload)
+            if addr + length > 0x10000:
+                raise ValueError("range runs past the end of bank " + hex(bank))
+            cart.readRom()
+            self._send(seq, cart.readRuns([(bank, addr, length)], self.chunkSize))
+        elif kind == SRAM:
+            kbits, lowROM, at, length = struct.unpack('<HBII', payload)
+            runs = sramSlice(cart.sramRuns(kbits, bool(lowROM)), at, length)
+            self._send(seq, cart.streamSRAM(kbits, bool(lowROM), runs, self.chunkSize))
+        else:
+            raise ValueError("unknown request " + hex(kind))
+
+    def _send(self, seq, chunks):
+        position = 0
+        for chunk in chunks:
+            _sendData(self.link, seq, position, chunk)
+            position += len(chunk)
+        self.link.write(frame(END, seq, struct.pack('<I', position)))
+
+
+def holes(received, length):
+    """(start, count) of everything in ``length`` not covered by the
+    ``received`` (start, count) ranges."""
+    missing = []
+    at = 0
+    for start, count in sorted(received):
+        if start > at:
+            missing.append((at, start - at))
+        at = max(at, start + count)
+    if at < length:
+        missing.append((at, length - at))
+    return missing
+
+
+class Receiver:
+    """The PC side.  ``retries`` is how many times the ranges still missing
+    from a request are asked for again before giving up with an OSError."""
+
+    def __init__(self, link, retries=5):
+        self.link = link
+        self.retries = retries
+        self.reader = FrameReader(link)
+        self.seq = 0
+        self.resent = 0
+
+    def _ask(self, kind, payload=b''):
+        self.seq = (self.seq + 1) & 0xffff
+        self.link.write(frame(kind, self.seq, payload))
+        return self.seq
+
+    def _reply(self, seq):
+        #next frame for this request, None on a timeout
+        while True:
+            message = self.reader.next()
+            if message is None or message[1] == seq:
+                return message
+
+    def info(self):
+        """(mapping, Header, ROM length, score) of the cart in the slot."""
+        for attempt in range(self.retries + 1):
+            reply = self._reply(self._ask(INFO))
+            if reply is None:
+                continue
+            kind, seq, payload = reply
+            if kind == ERROR:
+                raise ValueError(payload.decode())
+            score, length, size = struct.unpack('<BIB', payload[:6])
+            name = payload[6:6 + size].decode()
+            raw = payload[6 + size:]
+            mapping = mapper.byName(name)
+            return mapping, Header(raw, mapping.header), length, score
+        raise OSError("board did not answer")
+
+    def _fetch(self, kind, request, length, out):
+        #request(at, count) is the payload for that part of the range, out(at,
+        #data) takes every good chunk; only the holes go round again
+        missing = [(0, length)]
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.resent += sum(count for at, count in missing)
+            left = []
+            for at, count in missing:
+                seq = self._ask(kind, request(at, count))
+                received = []
+                while True:
+                    reply = self._reply(seq)
+                    if reply is None:
+                        break
+                    what, seq, payload = reply
+                    if what == ERROR:
+                        raise ValueError(payload.decode())
+                    if what == END:
+                        break
+                    if what == DATA:
+                        position = struct.unpack('<I', payload[:4])[0]
+                        out(at + position, payload[4:])
+                        received.append((position, len(payload) - 4))
+                left.extend((at + start, n) for start, n in holes(received, count))
+            missing = left
+            if not missing:
+                return
+        raise OSError(str(sum(count for at, count in missing)) + " bytes never came through")
+
+    def readRange(self, bank, addr, length):
+        data = bytearray(length)
+
+        def out(at, chunk):
+            data[at:at + len(chunk)] = chunk
+        self._fetch(READ, lambda at, count: struct.pack('<BHI', bank, addr + at, count),
+                    length, out)
+        return data
+
+    def readSRAM(self, kbits, isLowROM):
+        data = bytearray(kbits * 128)
+
+        def out(at, chunk):
+            data[at:at + len(chunk)] = chunk
+        self._fetch(SRAM, lambda at, count: struct.pack('<HBII', kbits, 1 if isLowROM else 0,
+                                                        at, count),
+                    len(data), out)
+        return data
+
+    def readROM(self, mapping, length, out):
+        """The first ``length`` bytes of ROM into ``out.writeAt``, a bus run
+        at a time."""
+        offset = 0
+        for bank, addr, count in mapping.runs(0, length):
+            base = offset
+            self._fetch(READ, lambda at, n: struct.pack('<BHI', bank, addr + at, n), count,
+                        lambda at, chunk: out.writeAt(base + at, chunk))
+            offset += count
+
+    def close(self):
+        seq = self._ask(BYE)
+        self._reply(seq)
+
+
+def checksum(path, length, span, bankSize):
+    #the header checksum of a dump whose last span - length bytes are mirrors
+    sums = []
+    with open(path, 'rb') as f:
+        for offset in range(0, length, bankSize):
+            sums.append(sum(f.read(bankSize)))
+    total = 0
+    for offset in range(0, span, bankSize):
+        total += sums[mapper.mirror(offset, length) // bankSize]
+    return total & 0xffff
+
+
+def dump(receiver, directory='', readCart=True, readSRAM=True):
+    """Dump the cart in the board's slot to ``directory``.  True when the
+    ROM checksum matched (or the ROM was not read)."""
+    from snesflash.library import dumpName
+    from snesflash.romfile import RomFile
+    mapping, header, length, score = receiver.info()
+    name = dumpName(header.title)
+    if directory and not directory.endswith('/'):
+        directory += '/'
+    print("Mapping: " + mapping.name + " (score " + str(score) + ") " + name.strip())
+    ok = True
+    if readCart:
+        span = max(header.romMbits, 0) * 0x20000
+        romPath = directory + name + '.smc'
+        with RomFile(romPath, length) as file:
+            receiver.readROM(mapping, length, file)
+        ok = checksum(romPath, length, max(span, length), mapping.bankSize) == header.checksum
+        print(romPath + ": " + str(length) + " bytes, " + ("checksum ok" if ok else "checksum bad"))
+    if readSRAM and header.sramKbits:
+        sramPath = directory + name + '.srm'
+        with open(sramPath, 'wb') as f:
+            f.write(receiver.readSRAM(header.sramKbits, mapping.isLowROM))
+        print(sramPath + ": " + str(header.sramKbits) + " Kbits")
+    if receiver.reader.bad or receiver.resent:
+        print(str(receiver.reader.bad) + " bad frames, " + str(receiver.resent) +
+              " bytes asked for again")
+    return ok
+
+
+if __name__ == '__main__':
+    import sys
+    import getopt
+    opts, args = getopt.getopt(sys.argv[1:], 'b:rs')
+    opts = dict(opts)
+    if len(args) != 2:
+        print("Usage: link.py [-b baudrate] [-r ROM only] [-s SRAM only] "
+              "<serial device | host:port> <directory>")
+        sys.exit(2)
+    receiver = Receiver(connect(args[0], int(opts.get('-b', 921600))))
+    try:
+        ok = dump(receiver, args[1], '-s' not in opts, '-r' not in opts)
+    finally:
+        receiver.close()
+    sys.exit(0 if ok else 1)
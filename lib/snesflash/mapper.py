@@ -0,0 +1,147 @@
+"""
+`snesflash.mapper`
+====================================================
+Memory maps from linear ROM file offsets to SNES bus addresses.  Instead of
+recomputing bank and address for every byte, the read loops ask a mapper for
+the runs covering a file range and walk each run with a plain address
+counter::
+
+    for bank, addr, length in mapper.HIROM.runs(0, 0x200000):
+        ...
+
+New cart mappings only need a ``locate``/``offsetOf`` pair here.
+"""
+
+_4MB = 0x400000
+
+
+class _Mapper:
+    name = None
+    header = 0x7FC0      # file offset of the internal header
+    bankSize = 0x8000    # bytes of ROM visible per bank
+    isLowROM = True
+
+    def locate(self, offset):
+        # (bank, addr) holding file offset ``offset``
+        raise NotImplementedError
+
+    def offsetOf(self, bank):
+        # file offset of the first ROM byte in ``bank``
+        raise NotImplementedError
+
+    def runs(self, start, length):
+        """List of (bank, start address, length) runs covering ``length``
+        bytes of the file from ``start``.  Runs never cross a bank, so a
+        reader only has to set the bank once per run and count the address
+        up from there."""
+        out = []
+        end = start + length
+        mask = self.bankSize - 1
+        offset = start
+        while offset < end:
+            bank, addr = self.locate(offset)
+            count = self.bankSize - (offset & mask)
+            if count > end - offset:
+                count = end - offset
+            out.append((bank, addr, count))
+            offset += count
+        return out
+
+    def __repr__(self):
+        return '<mapper ' + self.name + '>'
+
+
+class LoROM(_Mapper):
+    # 32K of ROM in the top half of banks 0x00-0x7D; the last two banks of a
+    # 4MB image come from the 0xFE/0xFF mirror since 0x7E/0x7F are WRAM.
+    name = 'lorom'
+
+    def locate(self, offset):
+        bank = offset >> 15
+        if bank >= 0x7E:
+            bank |= 0x80
+        return bank, 0x8000 | (offset & 0x7FFF)
+
+    def offsetOf(self, bank):
+        return (bank & 0x7F) << 15
+
+
+class HiROM(_Mapper):
+    # 64K banks from 0xC0; anything past 4MB continues at 0x40, which is how
+    # main() has always read the tail of large HiROM carts.
+    name = 'hirom'
+    header = 0xFFC0
+    bankSize = 0x10000
+    isLowROM = False
+
+    def locate(self, offset):
+        if offset < _4MB:
+            return 0xC0 + (offset >> 16), offset & 0xFFFF
+        return 0x40 + ((offset - _4MB) >> 16), offset & 0xFFFF
+
+    def offsetOf(self, bank):
+        if bank >= 0xC0:
+            return (bank - 0xC0) << 16
+        return _4MB + ((bank & 0x3F) << 16)
+
+
+class ExHiROM(HiROM):
+    # Same bus layout as HiROM, header in the upper 4MB.
+    name = 'exhirom'
+    header = 0x40FFC0
+
+
+class ExLoROM(LoROM):
+    # First 4MB of the file in banks 0x80-0xFF, the rest in 0x00-0x7D.
+    name = 'exlorom'
+    header = 0x407FC0
+
+    def locate(self, offset):
+        if offset < _4MB:
+            return 0x80 + (offset >> 15), 0x8000 | (offset & 0x7FFF)
+        return (offset - _4MB) >> 15, 0x8000 | (offset & 0x7FFF)
+
+    def offsetOf(self, bank):
+        if bank >= 0x80:
+            return (bank - 0x80) << 15
+        return _4MB + (bank << 15)
+
+
+LOROM = LoROM()
+HIROM = HiROM()
+EXLOROM = ExLoROM()
+EXHIROM = ExHiROM()
+
+MAPPERS = {LOROM.name: LOROM, HIROM.name: HIROM,
+           EXLOROM.name: EXLOROM, EXHIROM.name: EXHIROM}
+
+
+def mirror(offset, size):
+    # Where ``offset`` lands on a ROM of ``size`` bytes: a cart whose ROM is
+    # not a power of two (12/20/48 Mbit) decodes the space past its last
+    # chip as repeats of that chip, the way the address lines fold.
+    if size == 0:
+        return 0
+    base = 0
+    mask = 1 << 24
+    while offset >= size:
+        while not offset & mask:
+            mask >>= 1
+        offset -= mask
+        if size > mask:
+            size -= mask
+            base += mask
+        mask >>= 1
+    return base + offset
+
+
+def forLowROM(isLowROM):
+    # Mapper for the old isLowROM flag.
+    return LOROM if isLowROM else HIROM
+
+
+def byName(name):
+    try:
+        return MAPPERS[name]
+    except KeyError:
+        raise ValueError('Unknown mapping: ' + str(name))
@@ -0,0 +1,100 @@
+"""
+`snesflash.metrics`
+====================================================
+Where a dump's time goes.  ``Metrics`` keeps wall time per phase (power up,
+header, CX4 setup, ROM, SRAM, ...) and per ROM bank; ``report`` adds the
+transport's transaction and byte counts, each expander's register reads and
+writes and the SnesCart address/bank cache hits, and ``save`` writes it all
+out as JSON.
+
+Comparing ``wireSeconds`` (bytes on the wire at the bus clock) with the ROM
+time tells a bus bound station from one held up by Python or by storage,
+which ``writeSeconds`` covers.
+"""
+try:
+    import json
+except ImportError:
+    import ujson as json
+try:
+    from utime import ticks_us, ticks_diff
+
+    def now():
+        return ticks_us()
+
+    def since(start):
+        return ticks_diff(ticks_us(), start) / 1000000.0
+except ImportError:
+    import time
+    _clock = getattr(time, 'perf_counter', time.time)
+
+    def now():
+        return _clock()
+
+    def since(start):
+        return _clock() - start
+
+
+class _Phase:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = now()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add(self.name, since(self.start))
+        return False
+
+
+class Metrics:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.phases = {}
+        self.order = []
+        self.banks = []         #(bank, seconds to read it)
+        self.writeSeconds = 0.0 #time spent handing data to the output file
+
+    def phase(self, name):
+        #with cart.metrics.phase('header'): ...
+        return _Phase(self, name)
+
+    def add(self, name, seconds):
+        if name not in self.phases:
+            self.phases[name] = 0.0
+            self.order.append(name)
+        self.phases[name] += seconds
+
+    def bank(self, bank, seconds):
+        self.banks.append((bank, seconds))
+
+    def report(self, cart=None):
+        report = {
+            'phases': [[name, round(self.phases[name], 6)] for name in self.order],
+            'banks': [[bank, round(seconds, 6)] for bank, seconds in self.banks],
+            'writeSeconds': round(self.writeSeconds, 6),
+        }
+        if cart is None:
+            return report
+        bus = cart.bus
+        report['baudrate'] = cart.baudrate
+        report['transactions'] = bus.transactions
+        report['bytes'] = bus.bytes
+        if cart.baudrate:
+            report['wireSeconds'] = round(bus.bytes * 9.0 / cart.baudrate, 6)
+        report['busErrors'] = cart.busErrors
+        report['skipped'] = {'bank': cart.bankSkips, 'addrHigh': cart.upSkips,
+                             'addrLow': cart.lowSkips}
+        chips = {}
+        for name, chip in cart.chips():
+            chips[name] = {'address': chip._address, 'reads': chip.reads,
+                           'writes': chip.writes}
+        report['chips'] = chips
+        return report
+
+    def save(self, path, cart=None):
+        with open(path, 'w') as f:
+            f.write(json.dumps(self.report(cart)))
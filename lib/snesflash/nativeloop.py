@@ -0,0 +1,34 @@
+"""
+`snesflash.nativeloop`
+====================================================
+The inner ROM read loop of snesflash.fastread on its own.  MicroPython
+only compiles a function to machine code when it sees the literal
+``@micropython.native`` decorator, so the loop can not pick the decorator
+at run time.  Importing this module fails with an ImportError on CPython
+and a SyntaxError on a port built without the native emitter, and
+fastread falls back to SnesCart's plain loop on either.
+"""
+import micropython
+
+_GPIOA = 0x12
+
+
+@micropython.native
+def readRun(readInto, write, dataAddr, dataRegister, addrAddr, start, count, buf,
+            one, low, both):
+    addr = start
+    end = start + count
+    index = 0
+    while True:
+        readInto(dataAddr, dataRegister, one)
+        buf[index] = one[0]
+        index += 1
+        addr += 1
+        if addr == end:
+            break
+        if addr & 0xff:
+            low[0] = addr & 0xff
+            write(addrAddr, _GPIOA, low)
+        else:
+            both[1] = addr >> 8
+            write(addrAddr, _GPIOA, both)
@@ -0,0 +1,145 @@
+"""
+`snesflash.pipeline`
+====================================================
+A ROM rip as three stages on their own threads: the caller's thread reads
+banks off the bus, a second sums and hashes them for the ledger and a third
+writes them out and journals them.  The bank buffers go round a fixed ring
+of ``slots`` so the reader can be at most that many banks ahead of the disk,
+and a slow SD card or a hash only costs time when it is slower than the bus.
+
+On the Pi the reader spends most of a bank blocked in I2C ioctls, which
+drop the GIL, so the other two really do run alongside it.  A port without
+``_thread`` runs the same stages one after another.
+"""
+try:
+    import _thread
+except ImportError:
+    _thread = None
+try:
+    from queue import Queue
+except ImportError:
+    try:
+        import utime
+    except ImportError:
+        import time as utime
+
+    class Queue:
+        #just enough of queue.Queue for MicroPython, which has locks but no
+        #conditions to wait on, so an empty get polls
+        def __init__(self):
+            self._items = []
+            self._lock = _thread.allocate_lock()
+
+        def put(self, item):
+            self._lock.acquire()
+            self._items.append(item)
+            self._lock.release()
+
+        def get(self):
+            while True:
+                self._lock.acquire()
+                if self._items:
+                    item = self._items.pop(0)
+                    self._lock.release()
+                    return item
+                self._lock.release()
+                utime.sleep(0.001)
+
+from snesflash.metrics import now, since
+
+#fields of an item going down the pipeline
+_OFFSET, _BANK, _BUF, _COUNT, _ERRORS, _ENTRY = range(6)
+
+
+def _hash(ledger, item):
+    if ledger is not None:
+        entry = ledger.measure(item[_OFFSET], memoryview(item[_BUF])[:item[_COUNT]], item[_BANK])
+        entry.errors = item[_ERRORS]
+        item[_ENTRY] = entry
+
+
+def _write(cart, mapping, out, ledger, item):
+    cart._keep(mapping, item[_BANK], item[_OFFSET], memoryview(item[_BUF])[:item[_COUNT]],
+               out, ledger, item[_ENTRY])
+
+
+def _stage(work, args, source, sink, failed):
+    #run work on every item until the None closing the run.  After any stage
+    #fails items still go round untouched, so the reader is never left
+    #waiting for a buffer that will not come back
+    while True:
+        item = source.get()
+        if item is None:
+            break
+        if not failed:
+            try:
+                work(*(args + (item,)))
+            except Exception as e:
+                failed.append(e)
+        sink.put(item)
+    sink.put(None)
+
+
+def _chunks(mapping, startOffset, length):
+    #(offset, bank, start, count) a bank at most at a time
+    size = mapping.bankSize
+    offset = startOffset
+    for bank, start, count in mapping.runs(startOffset, length):
+        while count:
+            n = size if count > size else count
+            yield offset, bank, start, n
+            offset += n
+            start += n
+            count -= n
+
+
+def _read(cart, item, bank, start, n):
+    errors = cart.busErrors
+    began = now()
+    cart._readRunRetry(bank, start, n, item[_BUF])
+    cart.metrics.bank(bank, since(began))
+    cart.currentOffset = item[_OFFSET] + n
+    item[_ERRORS] = cart.busErrors - errors
+
+
+def ripPipelined(cart, startOffset, length, mapping, out, ledger=None, slots=4):
+    """``SnesCart.ripRange`` with reading, hashing and writing overlapped.
+    Leaves the sums of a trailing half page in ``cart._pageChecksum`` the
+    same as the plain loop does."""
+    if _thread is None:
+        item = [0, 0, bytearray(mapping.bankSize), 0, 0, None]
+        for offset, bank, start, n in _chunks(mapping, startOffset, length):
+            item[_OFFSET] = offset
+            item[_BANK] = bank
+            item[_COUNT] = n
+            _read(cart, item, bank, start, n)
+            _hash(ledger, item)
+            _write(cart, mapping, out, ledger, item)
+        return
+
+    free = Queue()
+    filled = Queue()
+    hashed = Queue()
+    failed = []
+    for _ in range(max(1, slots)):
+        free.put([0, 0, bytearray(mapping.bankSize), 0, 0, None])
+    _thread.start_new_thread(_stage, (_hash, (ledger,), filled, hashed, failed))
+    _thread.start_new_thread(_stage, (_write, (cart, mapping, out, ledger), hashed, free, failed))
+    try:
+        for offset, bank, start, n in _chunks(mapping, startOffset, length):
+            item = free.get()
+            if failed:
+                break
+            item[_OFFSET] = offset
+            item[_BANK] = bank
+            item[_COUNT] = n
+            item[_ENTRY] = None
+            _read(cart, item, bank, start, n)
+            filled.put(item)
+    finally:
+        filled.put(None)
+        #written buffers come back to free, the run is over at the writer's None
+        while free.get() is not None:
+            pass
+    if failed:
+        raise failed[0]
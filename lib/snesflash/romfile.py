@@ -0,0 +1,119 @@
+"""
+`snesflash.romfile`
+====================================================
+The ROM output file, sized for the whole cart before the first bank is
+read.  Where the OS has them the space is reserved with ``fallocate`` and
+the file is memory mapped, so ``writeAt`` puts a bank straight at its
+offset in the page cache.  Banks can land in any order: resumed gaps,
+re-reads from repairBanks, pipeline batches.  On MicroPython there is
+neither, and ``writeAt`` seeks and writes.
+
+It still reads, writes and seeks like a plain file, so the ledger, journal
+and repair code take it as ``out`` unchanged.
+"""
+import os
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+
+def _size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return None
+
+
+class RomFile:
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.existing = _size(path)   #bytes on disk before this run, None for a new file
+        self.f = open(path, 'r+b' if self.existing is not None else 'w+b')
+        self.pos = 0
+        self.map = None
+        self._reserve()
+        if mmap is not None and size:
+            try:
+                self.map = mmap.mmap(self.f.fileno(), size)
+            except (ValueError, OSError, AttributeError):
+                self.map = None
+
+    def _reserve(self):
+        #whole file up front, so a full card fails now rather than a bank
+        #from the end, and the file does not fragment as it grows
+        if self.existing == self.size:
+            return
+        truncate = getattr(self.f, 'truncate', None)
+        if truncate is None:
+            return                      #MicroPython: the file grows as banks land
+        if self.existing is not None and self.existing > self.size:
+            truncate(self.size)
+            return
+        fallocate = getattr(os, 'posix_fallocate', None)
+        if fallocate is not None:
+            try:
+                fallocate(self.f.fileno(), 0, self.size)
+                return
+            except OSError:
+                pass                    #not on this filesystem
+        truncate(self.size)
+
+    def writeAt(self, offset, data):
+        n = len(data)
+        if self.map is not None:
+            self.map[offset:offset + n] = data
+        else:
+            self.f.seek(offset)
+            self.f.write(data)
+        return n
+
+    def write(self, data):
+        n = self.writeAt(self.pos, data)
+        self.pos += n
+        return n
+
+    def read(self, n=-1):
+        if n < 0:
+            n = self.size - self.pos
+        if self.map is not None:
+            data = self.map[self.pos:self.pos + n]
+        else:
+            self.f.seek(self.pos)
+            data = self.f.read(n)
+        self.pos += len(data)
+        return data
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += self.size
+        self.pos = offset
+        return offset
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        if self.map is not None:
+            self.map.flush()
+        self.f.flush()
+
+    def fileno(self):
+        return self.f.fileno()
+
+    def close(self):
+        if self.map is not None:
+            self.map.flush()
+            self.map.close()
+            self.map = None
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
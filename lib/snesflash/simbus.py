@@ -0,0 +1,737 @@
+"""
+`snesflash.simbus`
+====================================================
+In-process stand-ins for the I2C bus, the MCP23008/MCP23017 expanders and a
+SNES cartridge, so the dumper can be run, timed and regression tested on any
+Linux box.  Host only.
+
+Typical use::
+
+    board = SimBoard(SimCart.fromFile('game.sfc'))
+    cart = SnesCart(i2c=board.i2c, pins=board.pins, **board.addresses)
+
+``board.i2c`` speaks the MicroPython ``machine.I2C`` API as well as the
+``smbus``/``smbus2`` APIs (wrap it in a snesflash.transport to pick one), and
+counts every transaction and byte that goes over the (virtual) wire.  The
+``addresses`` are the SnesCart keyword arguments for the board's wiring.
+"""
+import errno
+import random
+import time
+
+from snesflash.mapper import mirror
+
+# Register layout of a single MCP230xx port (MCP23008 addresses, MCP23017
+# addresses with IOCON.BANK = 0 are these times two plus the port number).
+_IODIR   = 0x00
+_IPOL    = 0x01
+_GPINTEN = 0x02
+_DEFVAL  = 0x03
+_INTCON  = 0x04
+_IOCON   = 0x05
+_GPPU    = 0x06
+_INTF    = 0x07
+_INTCAP  = 0x08
+_GPIO    = 0x09
+_OLAT    = 0x0A
+
+_IOCON_SEQOP = 0x20
+
+LOROM   = 'lorom'
+HIROM   = 'hirom'
+EXLOROM = 'exlorom'
+EXHIROM = 'exhirom'
+
+# Where each mapping keeps its internal header in the ROM image.
+HEADERS = ((LOROM, 0x7FC0), (HIROM, 0xFFC0), (EXHIROM, 0x40FFC0), (EXLOROM, 0x407FC0))
+
+
+class Latency:
+    """Time model for one I2C transaction: a fixed overhead (driver call,
+    syscall, start/stop conditions) plus nine clocks for every byte on the
+    wire at the current bus clock.  With ``realtime`` the bus really sleeps
+    for that long, otherwise the time is only accumulated in
+    ``SimI2C.elapsed``.
+    """
+
+    def __init__(self, overhead=0.0, baudrate=100000, realtime=False):
+        self.overhead = overhead
+        self.baudrate = baudrate
+        self.realtime = realtime
+
+    def cost(self, nbytes):
+        return self.overhead + nbytes * 9.0 / self.baudrate
+
+
+class _SimExpander:
+    # Register file of an MCP230xx with IOCON.BANK = 0.  ``sense(port)``
+    # returns the level the outside world drives onto a port (or None when
+    # nothing drives it) and ``on_change()`` is called after every write.
+    ports = 1
+
+    def __init__(self):
+        self.regs = bytearray(11 * self.ports)
+        self.pointer = 0
+        self.sense = None
+        self.on_change = None
+        self._last = bytearray(b'\xff' * self.ports)  # pin levels interrupt-on-change compares with
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.regs)):
+            self.regs[i] = 0
+        for port in range(self.ports):
+            self.regs[self._index(_IODIR, port)] = 0xFF
+
+    def _index(self, reg, port):
+        return reg * self.ports + port
+
+    def get(self, reg, port=0):
+        return self.regs[self._index(reg, port)]
+
+    def output(self, port=0):
+        # Level on the pins: driven from OLAT where the pin is an output,
+        # pulled high by GPPU (or left low) where it is an input.
+        iodir = self.get(_IODIR, port)
+        return (self.get(_OLAT, port) & ~iodir | self.get(_GPPU, port) & iodir) & 0xFF
+
+    def pins(self, port=0):
+        iodir = self.get(_IODIR, port)
+        level = self.sense(port) if self.sense else None
+        if level is None:
+            level = self.get(_GPPU, port)
+        level = (level ^ self.get(_IPOL, port)) & iodir
+        return (level | self.get(_OLAT, port) & ~iodir) & 0xFF
+
+    def sample(self, port=0):
+        # Latch an interrupt the way the chip does when its input pins move:
+        # against DEFVAL where INTCON is set, else against the last level.
+        # INTF/INTCAP keep the first capture until GPIO or INTCAP is read.
+        # Returns True when that raises INT.
+        level = self.pins(port)
+        last = self._last[port]
+        self._last[port] = level
+        intf = self._index(_INTF, port)
+        if self.regs[intf]:
+            return False
+        intcon = self.get(_INTCON, port)
+        against = self.get(_DEFVAL, port) & intcon | last & ~intcon
+        flags = (level ^ against) & self.get(_GPINTEN, port) & 0xFF
+        if not flags:
+            return False
+        self.regs[intf] = flags
+        self.regs[self._index(_INTCAP, port)] = level
+        return True
+
+    def interrupt(self, port=0):
+        # INT output, True while active
+        return self.get(_INTF, port) != 0
+
+    def _next(self, pointer):
+        if self.get(_IOCON) & _IOCON_SEQOP:
+            # Byte mode: the pointer stays put, or on the MCP23017 toggles
+            # between the A/B halves of the same register.
+            return pointer ^ 1 if self.ports == 2 else pointer
+        return (pointer + 1) % len(self.regs)
+
+    def _load(self, pointer):
+        reg, port = divmod(pointer, self.ports)
+        if reg == _GPIO:
+            # Reading GPIO (or INTCAP) clears the interrupt condition.
+            self.regs[self._index(_INTF, port)] = 0
+            self._last[port] = self.pins(port)
+            return self._last[port]
+        if reg == _INTCAP:
+            self.regs[self._index(_INTF, port)] = 0
+        return self.regs[pointer]
+
+    def _store(self, pointer, val):
+        reg, port = divmod(pointer, self.ports)
+        if reg == _GPIO:
+            reg = _OLAT
+        elif reg == _INTF or reg == _INTCAP:
+            return
+        elif reg == _IOCON:
+            # IOCONA and IOCONB are the same register.
+            for p in range(self.ports):
+                self.regs[self._index(_IOCON, p)] = val & 0xFF
+            return
+        elif reg == _GPINTEN:
+            self._last[port] = self.pins(port)
+        self.regs[self._index(reg, port)] = val & 0xFF
+
+    def write(self, pointer, data):
+        self.pointer = pointer % len(self.regs)
+        for val in data:
+            self._store(self.pointer, val)
+            self.pointer = self._next(self.pointer)
+        if self.on_change:
+            self.on_change()
+
+    def read(self, nbytes, pointer=None):
+        if pointer is not None:
+            self.pointer = pointer % len(self.regs)
+        out = bytearray(nbytes)
+        for i in range(nbytes):
+            out[i] = self._load(self.pointer)
+            self.pointer = self._next(self.pointer)
+        return out
+
+
+class SimMCP23008(_SimExpander):
+    ports = 1
+
+
+class SimMCP23017(_SimExpander):
+    ports = 2
+
+
+def _asBytes(buf):
+    # machine.I2C on the Pycom accepts an int wherever it takes a buffer.
+    if isinstance(buf, int):
+        return bytes((buf & 0xFF,))
+    if isinstance(buf, str):
+        return buf.encode()
+    return bytes(buf)
+
+
+class i2c_msg:
+    """Same shape as ``smbus2.i2c_msg`` for ``SimI2C.i2c_rdwr``."""
+
+    I2C_M_RD = 0x0001
+
+    def __init__(self, addr, flags, buf):
+        self.addr = addr
+        self.flags = flags
+        self.buf = buf
+        self.len = len(buf)
+
+    @classmethod
+    def write(cls, addr, buf):
+        return cls(addr, 0, bytearray(_asBytes(buf)))
+
+    @classmethod
+    def read(cls, addr, length):
+        return cls(addr, cls.I2C_M_RD, bytearray(length))
+
+    def __iter__(self):
+        return iter(self.buf)
+
+    def __len__(self):
+        return self.len
+
+    def __bytes__(self):
+        return bytes(self.buf)
+
+
+class SimI2C:
+    """A virtual I2C bus.  Devices are attached by address; every driver
+    call (a machine.I2C or smbus call, or a whole ``i2c_rdwr`` batch) is one
+    transaction and is charged to ``transactions``, ``bytes`` and ``elapsed``
+    through the latency model.
+    """
+
+    MASTER = 0
+    i2c_msg = i2c_msg
+
+    def __init__(self, latency=None, maxBaudrate=None, errorRate=0.01):
+        self.devices = {}
+        self.latency = latency or Latency()
+        # Above maxBaudrate (None: never) each read transaction has an
+        # errorRate chance of a NACK and as much again of a flipped bit, the
+        # way long wires and weak pull-ups fail when the clock is pushed.
+        self.maxBaudrate = maxBaudrate
+        self.errorRate = errorRate
+        self.random = random.Random(0)
+        self.resetCounters()
+
+    def resetCounters(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    def attach(self, address, device):
+        self.devices[address] = device
+        return device
+
+    def _device(self, addr):
+        try:
+            return self.devices[addr]
+        except KeyError:
+            raise OSError(errno.EIO, 'I2C bus error: no ACK from 0x%02x' % addr)
+
+    def _account(self, nbytes):
+        cost = self.latency.cost(nbytes)
+        self.transactions += 1
+        self.bytes += nbytes
+        self.elapsed += cost
+        if self.latency.realtime:
+            time.sleep(cost)
+
+    def _fault(self, data):
+        if self.maxBaudrate is None or self.latency.baudrate <= self.maxBaudrate:
+            return data
+        roll = self.random.random()
+        if roll < self.errorRate:
+            raise OSError(errno.EIO, 'I2C bus error: NACK at %dHz' % self.latency.baudrate)
+        if roll < 2 * self.errorRate and data:
+            data = bytearray(data)
+            data[self.random.randrange(len(data))] ^= 1 << self.random.randrange(8)
+        return data
+
+    # machine.I2C API
+    def init(self, mode=None, baudrate=100000, **kwargs):
+        self.latency.baudrate = baudrate
+
+    def scan(self):
+        return sorted(self.devices)
+
+    def writeto(self, addr, buf, stop=True):
+        data = _asBytes(buf)
+        device = self._device(addr)
+        self._account(1 + len(data))
+        if data:
+            device.write(data[0], data[1:])
+        return len(data)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        device = self._device(addr)
+        self._account(1 + nbytes)
+        return bytes(self._fault(device.read(nbytes)))
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self.readfrom(addr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        data = _asBytes(buf)
+        device = self._device(addr)
+        self._account(2 + len(data))
+        device.write(memaddr, data)
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        device = self._device(addr)
+        # register write, repeated start, read back
+        self._account(3 + nbytes)
+        return bytes(self._fault(device.read(nbytes, memaddr)))
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf))
+
+    # smbus.SMBus API
+    def write_byte(self, addr, val):
+        self.writeto(addr, val)
+
+    def read_byte(self, addr):
+        return self.readfrom(addr, 1)[0]
+
+    def write_byte_data(self, addr, cmd, val):
+        self.writeto_mem(addr, cmd, val)
+
+    def read_byte_data(self, addr, cmd):
+        return self.readfrom_mem(addr, cmd, 1)[0]
+
+    def write_word_data(self, addr, cmd, val):
+        self.writeto_mem(addr, cmd, bytes((val & 0xFF, (val >> 8) & 0xFF)))
+
+    def read_word_data(self, addr, cmd):
+        data = self.readfrom_mem(addr, cmd, 2)
+        return data[0] | data[1] << 8
+
+    def write_i2c_block_data(self, addr, cmd, vals):
+        self.writeto_mem(addr, cmd, bytes(vals))
+
+    def read_i2c_block_data(self, addr, cmd, length=32):
+        return list(self.readfrom_mem(addr, cmd, length))
+
+    # smbus2.SMBus API
+    def i2c_rdwr(self, *msgs):
+        nbytes = 0
+        for msg in msgs:
+            device = self._device(msg.addr)
+            nbytes += 1 + msg.len
+            if msg.flags & i2c_msg.I2C_M_RD:
+                msg.buf[:] = self._fault(device.read(msg.len))
+            elif msg.len:
+                device.write(msg.buf[0], msg.buf[1:])
+        self._account(nbytes)
+
+    def close(self):
+        pass
+
+
+def _headerValid(rom, offset):
+    if len(rom) < offset + 0x40:
+        return False
+    complement = rom[offset + 0x1C] | rom[offset + 0x1D] << 8
+    checksum = rom[offset + 0x1E] | rom[offset + 0x1F] << 8
+    return complement ^ checksum == 0xFFFF
+
+
+def guessMapping(rom):
+    """Best guess at the mapping of a ROM image from where a header with a
+    valid checksum complement sits.  Falls back to LoROM."""
+    found = [name for name, offset in HEADERS if _headerValid(rom, offset)]
+    for name in (EXHIROM, EXLOROM):
+        if name in found:
+            return name
+    if HIROM in found and (LOROM not in found or rom[0xFFD5] & 0x0F == 1):
+        return HIROM
+    return LOROM
+
+
+def _sizeCode(size):
+    # header ROM/SRAM size byte: 1KB << code covers size
+    code = 0
+    while (1024 << code) < size:
+        code += 1
+    return code
+
+
+def makeROM(size, mapping=LOROM, title='SIM CART', sramSize=0, seed=0):
+    """A reproducible ROM image of ``size`` bytes for ``mapping``: seeded
+    random data with a valid internal header (title, map mode, ROM and SRAM
+    size codes, RESET vector).  The checksum is taken over the image as the
+    dumper sees it, mirrored up to the next power of two, the way real
+    12/20/48 Mbit carts are summed."""
+    rng = random.Random(seed)
+    rom = bytearray(rng.getrandbits(8 * size).to_bytes(size, 'little'))
+    header = dict(HEADERS)[mapping]
+    rom[header:header + 21] = title.encode('ascii')[:21].ljust(21)
+    rom[header + 0x15] = {LOROM: 0x20, HIROM: 0x21, EXLOROM: 0x22, EXHIROM: 0x25}[mapping]
+    rom[header + 0x16] = 0x02 if sramSize else 0x00
+    rom[header + 0x17] = _sizeCode(size)
+    rom[header + 0x18] = _sizeCode(sramSize) if sramSize else 0
+    rom[header + 0x1C:header + 0x20] = b'\xff\xff\x00\x00'
+    rom[header + 0x3C:header + 0x3E] = b'\x00\x80'
+    total = 0
+    for offset in range(0, 1024 << _sizeCode(size), 0x8000):
+        start = mirror(offset, size)
+        total += sum(rom[start:start + 0x8000])
+    total &= 0xFFFF
+    rom[header + 0x1C] = (total ^ 0xFFFF) & 0xFF
+    rom[header + 0x1D] = (total ^ 0xFFFF) >> 8
+    rom[header + 0x1E] = total & 0xFF
+    rom[header + 0x1F] = total >> 8
+    return bytes(rom)
+
+
+class SimCart:
+    """A cartridge built from a ROM image.  ``read(bank, addr)`` returns the
+    byte the cart drives for a bus address, or None for open bus.
+    """
+
+    def __init__(self, rom, mapping=LOROM, sram=0):
+        rom = bytes(rom)
+        if len(rom) % 1024 == 512:
+            rom = rom[512:]  # copier header
+        self.rom = rom
+        self.mapping = mapping
+        self.sram = bytearray(sram)
+        self.present = True
+        # bank -> chance that a read in that bank comes back with a bit
+        # flipped, to play a dirty or loose contact
+        self.flaky = {}
+        self.random = random.Random(0)
+
+    @classmethod
+    def fromFile(cls, path, mapping=None, sram=None):
+        with open(path, 'rb') as f:
+            rom = f.read()
+        if len(rom) % 1024 == 512:
+            rom = rom[512:]
+        mapping = mapping or guessMapping(rom)
+        if sram is None:
+            header = dict(HEADERS)[mapping]
+            code = rom[header + 0x18] if len(rom) > header + 0x18 else 0
+            sram = 1024 << code if 0 < code <= 8 else 0
+        return cls(rom, mapping, sram)
+
+    def romOffset(self, bank, addr):
+        high = addr & 0x8000
+        if self.mapping == LOROM:
+            if not high or 0x7E <= bank <= 0x7F:
+                return None
+            offset = (bank & 0x7F) << 15 | addr & 0x7FFF
+        elif self.mapping == EXLOROM:
+            if not high or 0x7E <= bank <= 0x7F:
+                return None
+            offset = (bank & 0x7F) << 15 | addr & 0x7FFF
+            if bank < 0x80:
+                offset += 0x400000
+        else:
+            if 0x7E <= bank <= 0x7F or (bank & 0x40 == 0 and not high):
+                return None
+            offset = (bank & 0x3F) << 16 | addr
+            if self.mapping == EXHIROM and bank < 0x80:
+                offset += 0x400000
+        return mirror(offset, len(self.rom))
+
+    def sramOffset(self, bank, addr):
+        if not self.sram:
+            return None
+        if self.mapping in (LOROM, EXLOROM):
+            if 0x70 <= bank & 0x7F <= 0x7D and addr < 0x8000:
+                return ((bank & 0x0F) << 15 | addr) % len(self.sram)
+        elif bank & 0x60 == 0x20 and 0x6000 <= addr < 0x8000:
+            return ((bank & 0x1F) << 13 | addr - 0x6000) % len(self.sram)
+        return None
+
+    def read(self, bank, addr):
+        if not self.present:
+            return None
+        offset = self.sramOffset(bank, addr)
+        if offset is not None:
+            return self.sram[offset]
+        offset = self.romOffset(bank, addr)
+        if offset is None:
+            return None
+        if bank in self.flaky and self.random.random() < self.flaky[bank]:
+            return self.rom[offset] ^ (1 << self.random.randrange(8))
+        return self.rom[offset]
+
+    def write(self, bank, addr, val):
+        offset = self.sramOffset(bank, addr) if self.present else None
+        if offset is not None:
+            self.sram[offset] = val
+
+
+class SimPin:
+    """Stand-in for machine.Pin: ``pin(value)`` sets it, ``pin()`` reads it."""
+
+    def __init__(self, board, value=0):
+        self._board = board
+        self._value = value
+
+    def __call__(self, value=None):
+        if value is None:
+            return self._value
+        self._value = 1 if value else 0
+        self._board.update()
+
+    value = __call__
+
+
+class SimIntPin:
+    """The data chip's INT output as the board sees it: ``value()`` is 0
+    while an interrupt is pending (active low) and ``irq``/``callback``
+    register a handler for the falling edge, like machine.Pin."""
+
+    IRQ_FALLING = 2
+
+    def __init__(self, board):
+        self._board = board
+        self._handler = None
+
+    def value(self):
+        board = self._board
+        return 0 if board.datachip.interrupt(board._dataport) else 1
+
+    __call__ = value
+
+    def irq(self, handler=None, trigger=IRQ_FALLING, **kwargs):
+        self._handler = handler
+
+    callback = irq
+
+    def fire(self):
+        if self._handler:
+            self._handler(self)
+
+
+class SimBoard:
+    """Expanders on a virtual bus wired up to a SimCart.
+
+    ``layout`` selects the wiring:
+
+    * ``'pycom'``: MCP23017 address chip at 0x20, MCP23008 bank chip at 0x21,
+      MCP23008 data chip at 0x22, control lines on board pins (``pins`` is
+      pwr, /cs, /wr, /rst, /rd, power active high).
+    * ``'waterbury'``: MCP23017 address chip at 0x20, MCP23017 at 0x22 with
+      the bank on port A and data on port B, controls on port A of an
+      MCP23017 at 0x23 (bit 4 drives the cart MOSFET, active low).
+    """
+
+    def __init__(self, cart, layout='pycom', latency=None):
+        self.cart = cart
+        self.layout = layout
+        self.i2c = SimI2C(latency)
+        self.addrchip = self.i2c.attach(0x20, SimMCP23017())
+        if layout == 'pycom':
+            self.bankchip = self.i2c.attach(0x21, SimMCP23008())
+            self.datachip = self.i2c.attach(0x22, SimMCP23008())
+            self._bankport = self._dataport = 0
+            self.ctrlchip = None
+            self.pins = tuple(SimPin(self) for i in range(5))
+            self.addresses = {'address': 0x20, 'bank': 0x21, 'data': 0x22, 'board': 'pycom'}
+        elif layout == 'waterbury':
+            self.bankchip = self.datachip = self.i2c.attach(0x22, SimMCP23017())
+            self._bankport, self._dataport = 0, 1
+            self.ctrlchip = self.i2c.attach(0x23, SimMCP23017())
+            self.pins = None
+            self.addresses = {'address': 0x20, 'bank': 0x22, 'data': 0x22,
+                              'controls': 0x23, 'board': 'waterbury'}
+        else:
+            raise ValueError('Unknown board layout: ' + str(layout))
+        self.datachip.sense = self._sense
+        self.intPin = SimIntPin(self)
+        for chip in set((self.addrchip, self.bankchip, self.datachip, self.ctrlchip)):
+            if chip is not None:
+                chip.on_change = self.update
+
+    def insert(self, cart):
+        # a cart pushed into the (possibly powered) slot
+        self.cart = cart
+        self._pinsChanged()
+
+    def remove(self):
+        self.cart = None
+        self._pinsChanged()
+
+    def _pinsChanged(self):
+        if self.datachip.sample(self._dataport):
+            self.intPin.fire()
+
+    def busAddress(self):
+        addr = self.addrchip.output(0) | self.addrchip.output(1) << 8
+        return self.bankchip.output(self._bankport), addr
+
+    def controls(self):
+        # (power, /cs, /wr, /rst, /rd) as logic levels, power 1 = on.
+        if self.ctrlchip is None:
+            return tuple(pin() for pin in self.pins)
+        lines = self.ctrlchip.output(0)
+        return (0 if lines & 0x10 else 1, lines >> 3 & 1, lines >> 2 & 1,
+                lines >> 1 & 1, lines & 1)
+
+    def _sense(self, port):
+        if port != self._dataport:
+            return None
+        power, cs, wr, rst, rd = self.controls()
+        if not power or rd or self.cart is None:
+            return None
+        bank, addr = self.busAddress()
+        return self.cart.read(bank, addr)
+
+    def update(self):
+        # SRAM /WE is level sensitive: while /WR is low and the data chip is
+        # driving the bus, the cart keeps latching whatever is on it.
+        power, cs, wr, rst, rd = self.controls()
+        if not power or wr or self.cart is None or self.datachip.get(_IODIR, self._dataport) == 0xFF:
+            return
+        bank, addr = self.busAddress()
+        self.cart.write(bank, addr, self.datachip.output(self._dataport))
+
+
+class _SimLines:
+    # one bulk line request on the mock chip, what snesflash.gpio.openLines
+    # returns for a real one
+    def __init__(self, board, role, path, offsets, output, pullUp):
+        self._board = board
+        self.role = role
+        self.path = path
+        self.offsets = offsets
+        self.output = output
+        self.pullUp = pullUp
+        self.value = 0
+
+    def configure(self, output, pullUp):
+        self.output = output
+        self.pullUp = pullUp
+        self._board.update()
+
+    def set(self, value, mask):
+        self._board.ioctl()
+        self.value = (self.value & ~mask) | (value & mask)
+        self._board.update()
+
+    def get(self):
+        self._board.ioctl()
+        if self.output:
+            return self.value
+        return self._board.sense(self)
+
+    def release(self):
+        self.output = False
+
+
+class SimGpio:
+    """A mock gpiochip wired to a SimCart, as snesflash.gpio expects: pass
+    ``request`` as the GpioBus ``opener``.  The line groups come to it by
+    role, so any wiring works.  Controls are /rd, /rst, /wr, /cs, power as
+    levels, with power active low (the Waterbury MOSFET).  Data lines that
+    nothing drives read as 0xff with pull-ups on, 0x00 without.
+    Counts like SimI2C: ``transactions`` are ioctls, ``elapsed`` adds up
+    ``latency`` seconds for each, and no ``bytes`` go over a wire."""
+
+    def __init__(self, cart, latency=0.0):
+        self.cart = cart
+        self.latency = latency
+        self.lines = {}
+        self.resetCounters()
+
+    def resetCounters(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    def ioctl(self):
+        self.transactions += 1
+        self.elapsed += self.latency
+
+    def request(self, role, path, offsets, output, pullUp):
+        lines = self.lines[role] = _SimLines(self, role, path, offsets, output, pullUp)
+        return lines
+
+    def _levels(self):
+        controls = self.lines['controls'].value
+        power = not controls & 0x10
+        return power, controls >> 3 & 1, controls >> 2 & 1, controls >> 1 & 1, controls & 1
+
+    def sense(self, lines):
+        idle = 0xff if lines.pullUp else 0x00
+        if lines.role != 'data' or len(self.lines) < 4:
+            return idle
+        power, cs, wr, rst, rd = self._levels()
+        if not power or rd or self.cart is None:
+            return idle
+        value = self.cart.read(self.lines['bank'].value, self.lines['address'].value)
+        return idle if value is None else value
+
+    def update(self):
+        # SRAM /WE is level sensitive, as on SimBoard
+        if len(self.lines) < 4 or self.cart is None:
+            return
+        data = self.lines['data']
+        power, cs, wr, rst, rd = self._levels()
+        if power and not wr and data.output:
+            self.cart.write(self.lines['bank'].value, self.lines['address'].value, data.value)
+
+
+class NoisyLink:
+    """A snesflash.link link that damages what is written through it: each
+    write has ``flipRate`` odds of a flipped bit and ``dropRate`` odds of
+    never arriving.  Reads pass straight through."""
+
+    def __init__(self, link, flipRate=0.0, dropRate=0.0, seed=0):
+        self.link = link
+        self.flipRate = flipRate
+        self.dropRate = dropRate
+        self.random = random.Random(seed)
+        self.flipped = 0
+        self.dropped = 0
+
+    def read(self, n):
+        return self.link.read(n)
+
+    def write(self, data):
+        if self.random.random() < self.dropRate:
+            self.dropped += 1
+            return
+        if data and self.random.random() < self.flipRate:
+            data = bytearray(data)
+            data[self.random.randrange(len(data))] ^= 1 << self.random.randrange(8)
+            self.flipped += 1
+        self.link.write(data)
+
+    def close(self):
+        self.link.close()
@@ -0,0 +1,162 @@
+"""
+`snesflash.snapshots`
+====================================================
+SRAM history.  Every save backed up goes in as fixed ``BLOCKSIZE`` blocks
+stored once under their SHA-1, plus a small JSON manifest listing the
+blocks of that version::
+
+    history/
+        blocks/3f/3f786850e387550fdab836ed7e6dc881de23001b
+        manifests/SUPER METROID-a0da/0.json, 1.json, ...
+
+A backup of a save that did not change since the last one adds nothing; one
+that did adds its manifest and only the blocks that are new.  Games touch a
+slot or two of their SRAM, so across scheduled backups of many carts most
+blocks are shared.  ``load`` puts any version back together and checks it
+against the whole image hash kept in its manifest.
+
+With ``compression`` ('gzip' or 'zstd', see snesflash.compress) new blocks
+are stored compressed, as ``<sha1>.gz``/``.zst``; the name stays the hash of
+the raw block, so compressed and raw stores share blocks and either reads.
+"""
+import os
+try:
+    import json
+except ImportError:
+    import ujson as json
+try:
+    import hashlib
+except ImportError:
+    import uhashlib as hashlib
+try:
+    import binascii
+except ImportError:
+    import ubinascii as binascii
+try:
+    import utime
+except ImportError:
+    import time as utime
+
+from snesflash import compress
+from snesflash.library import safeName, _exists, _makedirs
+
+BLOCKSIZE = 1024
+
+
+def _sha1(data):
+    return binascii.hexlify(hashlib.sha1(data).digest()).decode()
+
+
+def _write(path, data):
+    #via a temporary name, a block or manifest is either whole or missing
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        if not _exists(path):     #another worker stored the same block first
+            raise
+
+
+class SnapshotStore:
+    def __init__(self, root, blockSize=BLOCKSIZE, compression=None):
+        self.root = root if root.endswith('/') else root + '/'
+        self.compression = compression
+        self.blocks = self.root + 'blocks/'
+        self.manifests = self.root + 'manifests/'
+        self.blockSize = blockSize
+        _makedirs(self.blocks)
+        _makedirs(self.manifests)
+
+    def _cartDir(self, header):
+        return self.manifests + safeName(header.title) + '-' + ('%04x' % header.checksum) + '/'
+
+    def _blockPath(self, sha1):
+        return self.blocks + sha1[:2] + '/' + sha1
+
+    def _findBlock(self, sha1):
+        #(path, compression) of a stored block, raw or compressed
+        path = self._blockPath(sha1)
+        if _exists(path):
+            return path, None
+        for method in compress.EXTENSIONS:
+            if _exists(path + compress.EXTENSIONS[method]):
+                return path + compress.EXTENSIONS[method], method
+        return None, None
+
+    def versions(self, header):
+        """Version numbers kept for this cart, oldest first."""
+        try:
+            names = os.listdir(self._cartDir(header))
+        except OSError:
+            return []
+        return sorted(int(name[:-5]) for name in names if name.endswith('.json'))
+
+    def manifest(self, header, version=-1):
+        """The manifest of ``version``, counting from the newest when
+        negative, or None when there is no such version."""
+        versions = self.versions(header)
+        if version < 0:
+            if len(versions) < -version:
+                return None
+            version = versions[version]
+        try:
+            with open(self._cartDir(header) + str(version) + '.json') as f:
+                return json.loads(f.read())
+        except OSError:
+            return None
+
+    def snapshot(self, header, data):
+        """Back up ``data`` as this cart's newest save.  Returns the
+        manifest, the existing one when nothing changed."""
+        latest = self.manifest(header)
+        sha1 = _sha1(data)
+        if latest is not None and latest['sha1'] == sha1:
+            print("save unchanged since version " + str(latest['version']))
+            return latest
+        view = memoryview(data)
+        blocks = []
+        added = 0
+        for start in range(0, len(data), self.blockSize):
+            block = view[start:start + self.blockSize]
+            digest = _sha1(block)
+            if self._findBlock(digest)[0] is None:
+                _makedirs(self.blocks + digest[:2])
+                if self.compression:
+                    _write(self._blockPath(digest) + compress.EXTENSIONS[self.compression],
+                           compress.pack(block, self.compression))
+                else:
+                    _write(self._blockPath(digest), block)
+                added += 1
+            blocks.append(digest)
+        versions = self.versions(header)
+        manifest = {'version': versions[-1] + 1 if versions else 0,
+                    'title': header.title, 'checksum': header.checksum,
+                    'complement': header.complement, 'size': len(data),
+                    'blockSize': self.blockSize, 'sha1': sha1,
+                    'time': utime.time(), 'blocks': blocks}
+        cartDir = self._cartDir(header)
+        _makedirs(cartDir)
+        _write(cartDir + str(manifest['version']) + '.json', json.dumps(manifest).encode())
+        print("save version " + str(manifest['version']) + ", " + str(added) + " of " +
+              str(len(blocks)) + " blocks new")
+        return manifest
+
+    def load(self, header, version=-1):
+        """The save image of ``version`` (newest by default)."""
+        manifest = self.manifest(header, version)
+        if manifest is None:
+            raise ValueError("no save version " + str(version) + " for " + header.title)
+        data = bytearray()
+        for digest in manifest['blocks']:
+            path, method = self._findBlock(digest)
+            if path is None:
+                break
+            with open(path, 'rb') as f:
+                block = f.read()
+            data.extend(compress.unpack(block, method) if method else block)
+        if len(data) != manifest['size'] or _sha1(data) != manifest['sha1']:
+            raise ValueError("save version " + str(manifest['version']) + " of " +
+                             header.title + " is damaged")
+        return data
@@ -0,0 +1,96 @@
+"""
+`snesflash.sram`
+====================================================
+Putting a save back on a cart.  ``restore`` reads the cart's SRAM through
+the same windows ripSRAM uses (LoROM banks 0x70+ at 0x0000-0x7fff, HiROM
+banks 0x30+ at 0x6000-0x7fff), writes only the bytes that differ from the
+image with ``SnesCart.writeSRAMBytes`` (one data chip direction switch each
+way for the lot) and reads it all back to check.  A 64Kbit save with a few
+hundred changed bytes costs a read, a few hundred byte writes and a read,
+not 8192 writes.
+"""
+from snesflash import compress
+from snesflash.detect import detect
+
+
+def diff(current, target, runs):
+    """(bank, addr, value) for every byte of ``target`` that ``current``
+    does not already hold, in the order ``runs`` (from sramRuns) walks the
+    windows, so consecutive writes mostly move only the low address byte."""
+    writes = []
+    index = 0
+    for bank, start, count in runs:
+        end = index + count
+        if current[index:end] != target[index:end]:
+            for offset in range(count):
+                value = target[index + offset]
+                if current[index + offset] != value:
+                    writes.append((bank, start + offset, value))
+        index = end
+    return writes
+
+
+def restore(cart, image, sramKbits=None, isLowROM=None, verify=True, retries=2):
+    """Make the cart's SRAM hold ``image``.  Returns True once a full read
+    back matches (or straight after the writes with ``verify`` off); bytes
+    that did not take are written again up to ``retries`` times."""
+    sramKbits = len(image) // 128 if sramKbits is None else sramKbits
+    if len(image) != sramKbits * 128:
+        raise ValueError("save is " + str(len(image)) + " bytes, the cart has " +
+                         str(sramKbits * 128))
+    runs = cart.sramRuns(sramKbits, isLowROM)
+    cart.readRom()
+    current = cart.ripSRAM(sramKbits, 0, isLowROM)
+    written = 0
+    for attempt in range(retries + 1):
+        writes = diff(current, image, runs)
+        if not writes:
+            print("SRAM matches the save, " + str(written) + " bytes written")
+            return True
+        if attempt:
+            print(str(len(writes)) + " bytes did not take, writing them again")
+        cart.writeSRAMBytes(writes, isLowROM)
+        written += len(writes)
+        if not verify:
+            print(str(written) + " SRAM bytes written, not verified")
+            return True
+        current = cart.ripSRAM(sramKbits, 0, isLowROM)
+    print("SRAM still differs from the save in " + str(len(diff(current, image, runs))) +
+          " bytes")
+    return False
+
+
+def slotHeader(cart):
+    """Header of the cart in the slot when it has SRAM, with
+    ``cart.mapper`` set to its mapping, otherwise None."""
+    found = detect(cart)
+    if found is None or not found.header.sramKbits:
+        print("no cart with SRAM in the slot, not restoring")
+        return None
+    return found.header
+
+
+def restoreFile(cart, path, verify=True):
+    """Restore a .srm (or .srm.gz/.zst) to whatever cart is in the slot,
+    taking the mapping and SRAM size from its header."""
+    header = slotHeader(cart)
+    if header is None:
+        return False
+    f = compress.openRead(path)
+    try:
+        image = f.read()
+    finally:
+        f.close()
+    print("restoring " + path + " to " + header.title)
+    return restore(cart, image, header.sramKbits, verify=verify)
+
+
+def restoreVersion(cart, snapshots, version=-1, verify=True):
+    """Restore a version from the save history (snesflash.snapshots) of
+    the cart in the slot, the newest by default."""
+    header = slotHeader(cart)
+    if header is None:
+        return False
+    image = snapshots.load(header, version)
+    print("restoring save version " + str(version) + " to " + header.title)
+    return restore(cart, image, header.sramKbits, verify=verify)
@@ -0,0 +1,207 @@
+"""
+`snesflash.transport`
+====================================================
+One register level I2C interface over the buses the dumper runs on:
+MicroPython ``machine.I2C`` on the Pycom, ``smbus`` and ``smbus2`` on the Pi.
+
+Every transport speaks the ``machine.I2C`` register calls the pycom_mcp230xx
+expander classes already use (``writeto_mem``, ``readfrom_mem``,
+``readfrom_mem_into``, ``writeto``), plus ``transfer(ops)`` which runs a list
+of register operations as few bus calls as the platform allows.  An op is
+``(addr, register, data)`` to write ``data`` or ``(addr, register, nbytes)``
+to read ``nbytes``; ``transfer`` returns the reads in order.
+
+``batched`` is True when ``transfer`` really does save bus calls (smbus2's
+``i2c_rdwr``), so callers know when building op lists is worth it.
+
+``transactions`` counts driver calls (a whole ``i2c_rdwr`` batch is one) and
+``bytes`` what they put on the wire: an address byte per message, the
+register byte and the data.
+"""
+try:
+    from machine import I2C
+except ImportError:
+    I2C = None
+
+
+def _buffer(buf):
+    # machine.I2C takes an int wherever it takes a one byte buffer
+    if isinstance(buf, int):
+        return bytes((buf & 0xFF,))
+    return buf
+
+
+def _length(buf):
+    return 1 if isinstance(buf, int) else len(buf)
+
+
+class Transport:
+    batched = False
+    maxMessages = 1
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.resetCounters()
+
+    def resetCounters(self):
+        self.transactions = 0
+        self.bytes = 0
+
+    def writeto_mem(self, addr, memaddr, buf):
+        raise NotImplementedError
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        raise NotImplementedError
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        data = self.readfrom_mem(addr, memaddr, len(buf))
+        for i in range(len(buf)):
+            buf[i] = data[i]
+
+    def writeto(self, addr, buf):
+        buf = _buffer(buf)
+        self.writeto_mem(addr, buf[0], buf[1:])
+
+    def transfer(self, ops):
+        reads = []
+        for addr, register, data in ops:
+            if isinstance(data, int):
+                reads.append(self.readfrom_mem(addr, register, data))
+            else:
+                self.writeto_mem(addr, register, data)
+        return reads
+
+    def setClock(self, baudrate):
+        # False when the bus clock is fixed outside of our control
+        return False
+
+    def close(self):
+        close = getattr(self.bus, 'close', None)
+        if close:
+            close()
+
+
+class MachineI2C(Transport):
+    #MicroPython machine.I2C, already the register API we want
+
+    def writeto_mem(self, addr, memaddr, buf):
+        self.transactions += 1
+        self.bytes += 2 + _length(buf)
+        self.bus.writeto_mem(addr, memaddr, buf)
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        self.transactions += 1
+        self.bytes += 3 + nbytes
+        return self.bus.readfrom_mem(addr, memaddr, nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        self.transactions += 1
+        self.bytes += 3 + len(buf)
+        self.bus.readfrom_mem_into(addr, memaddr, buf)
+
+    def writeto(self, addr, buf):
+        self.transactions += 1
+        self.bytes += 1 + _length(buf)
+        self.bus.writeto(addr, buf)
+
+    def setClock(self, baudrate):
+        self.bus.init(I2C.MASTER if I2C else 0, baudrate=baudrate)
+        return True
+
+
+class SMBusTransport(Transport):
+    #smbus.SMBus: one ioctl per call, block calls for anything over a byte
+
+    def writeto_mem(self, addr, memaddr, buf):
+        buf = _buffer(buf)
+        self.transactions += 1
+        self.bytes += 2 + len(buf)
+        if len(buf) == 1:
+            self.bus.write_byte_data(addr, memaddr, buf[0])
+        else:
+            self.bus.write_i2c_block_data(addr, memaddr, list(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        self.transactions += 1
+        self.bytes += 3 + nbytes
+        if nbytes == 1:
+            return bytes((self.bus.read_byte_data(addr, memaddr),))
+        return bytes(self.bus.read_i2c_block_data(addr, memaddr, nbytes))
+
+
+class SMBus2Transport(SMBusTransport):
+    """smbus2.SMBus: same block calls, plus ``transfer`` packs the ops into
+    ``i2c_rdwr`` calls of up to ``maxMessages`` messages (the kernel's
+    I2C_RDWR_IOCTL_MAX_MSGS), one ioctl for the lot."""
+
+    batched = True
+    maxMessages = 42
+
+    def __init__(self, bus, i2c_msg=None):
+        SMBusTransport.__init__(self, bus)
+        if i2c_msg is None:
+            i2c_msg = getattr(bus, 'i2c_msg', None)
+        if i2c_msg is None:
+            from smbus2 import i2c_msg
+        self._msg = i2c_msg
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        if nbytes == 1:
+            self.transactions += 1
+            self.bytes += 4
+            return bytes((self.bus.read_byte_data(addr, memaddr),))
+        return self.transfer(((addr, memaddr, nbytes),))[0]
+
+    def _rdwr(self, msgs, nbytes):
+        self.transactions += 1
+        self.bytes += nbytes
+        self.bus.i2c_rdwr(*msgs)
+
+    def transfer(self, ops):
+        msg = self._msg
+        reads = []
+        pending = []
+        nbytes = 0
+        for addr, register, data in ops:
+            if isinstance(data, int):
+                if len(pending) + 2 > self.maxMessages:
+                    self._rdwr(pending, nbytes)
+                    pending = []
+                    nbytes = 0
+                read = msg.read(addr, data)
+                pending.append(msg.write(addr, [register]))
+                pending.append(read)
+                reads.append(read)
+                nbytes += 3 + data
+            else:
+                if len(pending) + 1 > self.maxMessages:
+                    self._rdwr(pending, nbytes)
+                    pending = []
+                    nbytes = 0
+                data = _buffer(data)
+                pending.append(msg.write(addr, [register] + list(data)))
+                nbytes += 2 + len(data)
+        if pending:
+            self._rdwr(pending, nbytes)
+        return [bytes(read) for read in reads]
+
+
+def wrap(i2c):
+    """Transport for whatever bus object we were handed."""
+    if isinstance(i2c, Transport):
+        return i2c
+    if hasattr(i2c, 'writeto_mem'):
+        return MachineI2C(i2c)
+    if hasattr(i2c, 'i2c_rdwr'):
+        return SMBus2Transport(i2c)
+    return SMBusTransport(i2c)
+
+
+def openSMBus(busnum=1):
+    #fastest Linux bus available, smbus2 if installed, else python-smbus
+    try:
+        import smbus2
+    except ImportError:
+        import smbus
+        return SMBusTransport(smbus.SMBus(busnum))
+    return SMBus2Transport(smbus2.SMBus(busnum))
@@ -0,0 +1,35 @@
+"""
+`snesflash.zstdio`
+====================================================
+The zstd side of snesflash.compress, on its own so the Pycom build can
+leave it out: it needs the ``zstandard`` package, which is Pi only.
+Importing it raises ImportError without that, and compress takes that as
+zstd not being available.
+"""
+import zstandard
+
+
+class Writer:
+    #a zstd frame written to f as the data comes, f stays open
+    def __init__(self, f, level, wbits):
+        params = zstandard.ZstdCompressionParameters.from_level(level, window_log=max(wbits, 10))
+        self.stream = zstandard.ZstdCompressor(compression_params=params).stream_writer(
+            f, closefd=False)
+
+    def write(self, data):
+        self.stream.write(data)
+
+    def finish(self):
+        self.stream.close()
+
+
+def openRead(path):
+    return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+
+
+def pack(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def unpack(blob):
+    return zstandard.ZstdDecompressor().decompressobj().decompress(blob)
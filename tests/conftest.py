@@ -0,0 +1,25 @@
+"""Shared fixtures: carts on the simulated bus from snesflash.simbus."""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'lib'), ROOT]
+
+import pytest
+
+from snesflash import simbus, transport
+from snesflash.cart import SnesCart
+
+
+@pytest.fixture
+def makeCart():
+    """makeCart(simCart, layout='pycom') -> SnesCart on a SimBoard, the
+    waterbury layout through the batched smbus2 transport.  The board is
+    left on the cart as ``simBoard``."""
+    def make(sim, layout='pycom'):
+        board = simbus.SimBoard(sim, layout)
+        i2c = board.i2c if layout == 'pycom' else transport.SMBus2Transport(board.i2c)
+        cart = SnesCart(i2c=i2c, pins=board.pins, **board.addresses)
+        cart.simBoard = board
+        return cart
+    return make
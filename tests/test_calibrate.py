@@ -0,0 +1,56 @@
+import json
+
+import main
+from snesflash import calibrate, simbus
+
+_ROM = simbus.makeROM(0x20000)
+
+
+def test_calibrateStopsBelowTheRateThatFails(makeCart):
+    cart = makeCart(simbus.SimCart(_ROM))
+    cart.simBoard.i2c.maxBaudrate = 400000
+    cart.simBoard.i2c.errorRate = 0.05
+    assert calibrate.calibrate(cart) == 400000
+    assert cart.baudrate == 400000
+    assert cart.fallback
+
+
+def test_calibrateTakesTheFastestCleanRate(makeCart):
+    cart = makeCart(simbus.SimCart(_ROM))
+    assert calibrate.calibrate(cart) == calibrate.RATES[-1]
+
+
+def test_calibrateNeedsAClockItCanChange(makeCart):
+    assert calibrate.calibrate(makeCart(simbus.SimCart(_ROM), 'waterbury')) is None
+
+
+def test_calibrateNeedsACart(makeCart):
+    sim = simbus.SimCart(_ROM)
+    sim.present = False
+    assert calibrate.calibrate(makeCart(sim)) is None
+
+
+def test_clockIsStoredPerBoard(tmp_path):
+    path = str(tmp_path / 'clock.json')
+    assert calibrate.loadClock(path, 'pycom') is None
+    calibrate.saveClock(path, 'pycom', 400000)
+    calibrate.saveClock(path, 'waterbury', calibrate.FIXED)
+    assert calibrate.loadClock(path, 'pycom') == 400000
+    assert calibrate.loadClock(path, 'waterbury') == calibrate.FIXED
+
+
+def test_mainRemembersABoardItCouldNotCalibrate(makeCart, tmp_path, monkeypatch):
+    sim = simbus.SimCart(_ROM)
+    sim.present = False
+    clockFile = str(tmp_path / 'clock.json')
+    kwargs = dict(directory=str(tmp_path), statusFile=str(tmp_path / 'status'),
+                  clockFile=clockFile, reportFile=None, datFile=None, knownFile=None,
+                  history=None)
+    main.main(makeCart(sim), **kwargs)
+    with open(clockFile) as f:
+        assert json.load(f) == {'pycom': calibrate.FIXED}
+
+    def again(cart):
+        raise AssertionError('calibrated again')
+    monkeypatch.setattr(main, 'calibrate', again)
+    main.main(makeCart(sim), **kwargs)
@@ -0,0 +1,80 @@
+import gzip
+
+import pytest
+
+from snesflash import compress, simbus
+from snesflash.dump import dumpCart
+
+_METHODS = [compress.GZIP,
+            pytest.param(compress.ZSTD, marks=pytest.mark.skipif(
+                not compress.available(compress.ZSTD), reason='no zstandard'))]
+_DATA = bytes(range(256)) * 64 + b'\xff' * 0x4000
+
+
+def _read(path):
+    f = compress.openRead(path)
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+
+@pytest.mark.parametrize('method', _METHODS)
+def test_compressedOutRoundTrips(tmp_path, method):
+    path = str(tmp_path / ('x' + compress.EXTENSIONS[method]))
+    with compress.CompressedOut(path, method) as out:
+        for offset in range(0, len(_DATA), 0x1000):
+            out.writeAt(offset, _DATA[offset:offset + 0x1000])
+    assert _read(path) == _DATA
+    assert (tmp_path / ('x' + compress.EXTENSIONS[method])).stat().st_size < len(_DATA) // 4
+
+
+def test_gzipOpensWithTheStandardTools(tmp_path):
+    path = str(tmp_path / 'x.gz')
+    with compress.CompressedOut(path) as out:
+        out.write(_DATA)
+    with gzip.open(path) as f:
+        assert f.read() == _DATA
+
+
+def test_compressedOutOnlyGoesForward(tmp_path):
+    with compress.CompressedOut(str(tmp_path / 'x.gz')) as out:
+        out.writeAt(0, b'abcd')
+        with pytest.raises(ValueError):
+            out.writeAt(0x100, b'efgh')
+
+
+def test_rewritePutsThePatchedBanksIn(tmp_path):
+    path = str(tmp_path / 'x.gz')
+    with compress.CompressedOut(path) as out:
+        out.write(_DATA)
+    patches = compress.Patches()
+    patches.writeAt(0x2000, b'\x01' * 0x1000)
+    compress.rewrite(path, patches.banks, 0x1000)
+    expected = bytearray(_DATA)
+    expected[0x2000:0x3000] = b'\x01' * 0x1000
+    assert _read(path) == expected
+
+
+@pytest.mark.parametrize('method', _METHODS)
+def test_packRoundTrips(method):
+    assert compress.unpack(compress.pack(_DATA, method), method) == _DATA
+
+
+def test_rawFilesReadAsTheyAre(tmp_path):
+    (tmp_path / 'x.smc').write_bytes(_DATA)
+    assert compress.methodOf('x.smc') is None
+    assert _read(str(tmp_path / 'x.smc')) == _DATA
+
+
+def test_dumpWritesCompressedFiles(makeCart, tmp_path):
+    rom = simbus.makeROM(0x20000, title='PACKED', sramSize=0x800)
+    sim = simbus.SimCart(rom, sram=0x800)
+    sim.sram[:] = b'\x5a' * 0x800
+    cart = makeCart(sim)
+    dumpCart(cart, str(tmp_path), str(tmp_path / 'status'), compression=compress.GZIP)
+    name = 'PACKED              '
+    assert _read(str(tmp_path / (name + '.smc.gz'))) == rom
+    assert _read(str(tmp_path / (name + '.srm.gz'))) == bytes(sim.sram)
+    assert cart.totalChecksum == rom[0x7fde] | rom[0x7fdf] << 8
+    assert not (tmp_path / (name + '.smc.gz.journal')).exists()
@@ -0,0 +1,114 @@
+import binascii
+import hashlib
+import time
+
+import pytest
+
+from snesflash import datindex, simbus
+from snesflash.datindex import DatIndex, KnownDumps, build, identify
+from snesflash.dump import _identify
+from snesflash.header import Header
+
+_ROM = simbus.makeROM(0x20000, title='DAT TEST')
+_OTHER = simbus.makeROM(0x20000, title='DAT OTHER', seed=1)
+
+
+def _digests(rom):
+    return '%08X' % (binascii.crc32(rom) & 0xFFFFFFFF), hashlib.sha1(rom).hexdigest()
+
+
+def _xml(tmp_path):
+    lines = ['<?xml version="1.0"?>', '<datafile>']
+    for name, rom in (('Dat Test (USA)', _ROM), ('Dat &amp; Other (Japan)', _OTHER)):
+        crc, sha1 = _digests(rom)
+        lines += ['\t<game name="' + name + '">',
+                  '\t\t<rom name="' + name + '.sfc" size="' + str(len(rom)) + '" crc="' +
+                  crc + '" sha1="' + sha1 + '"/>', '\t</game>']
+    lines.append('</datafile>')
+    path = str(tmp_path / 'snes.dat')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return path
+
+
+def _index(tmp_path):
+    path = str(tmp_path / 'snes.idx')
+    assert build(_xml(tmp_path), path) == 2
+    return DatIndex(path)
+
+
+def _header(rom=_ROM):
+    return Header(rom[0x7fc0:0x8000], 0x7fc0)
+
+
+def test_lookupsByCRCAndSHA1(tmp_path):
+    dat = _index(tmp_path)
+    crc, sha1 = _digests(_OTHER)
+    assert dat.byCRC(int(crc, 16)) == [('Dat & Other (Japan)', 0x20000)]
+    assert dat.bySHA1(sha1) == ('Dat & Other (Japan)', 0x20000)
+    assert dat.bySHA1('00' * 20) is None
+    assert dat.byCRC(0) == []
+    dat.close()
+
+
+def test_clrmameproDat(tmp_path):
+    crc, sha1 = _digests(_ROM)
+    path = str(tmp_path / 'snes.dat')
+    with open(path, 'w') as f:
+        f.write('clrmamepro (\n\tname "SNES"\n)\n\ngame (\n\tname "Dat Test (USA)"\n'
+                '\trom ( name "Dat Test (USA).sfc" size 131072 crc ' + crc +
+                ' sha1 ' + sha1 + ' )\n)\n')
+    build(path, str(tmp_path / 'snes.idx'))
+    dat = DatIndex(str(tmp_path / 'snes.idx'))
+    assert dat.bySHA1(sha1) == ('Dat Test (USA)', 0x20000)
+    dat.close()
+
+
+def test_dumpWithMirrorsPastTheEndIsIdentified(tmp_path):
+    dat = _index(tmp_path)
+    path = str(tmp_path / 'DAT TEST.smc')
+    with open(path, 'wb') as f:
+        f.write(_ROM + _ROM)
+    assert identify(dat, path) == ('Dat Test (USA)', 0x20000, _digests(_ROM)[1])
+    with open(path, 'wb') as f:
+        f.write(_ROM[:-1] + b'\x00')
+    assert identify(dat, path) is None
+    dat.close()
+
+
+def test_knownDumpsSeeEachOthersEntries(tmp_path):
+    path = str(tmp_path / 'knownDumps.idx')
+    one, two = KnownDumps(path), KnownDumps(path)
+    assert two.find(_header()) is None
+    one.add(_header(), 'aa' * 20)
+    assert two.find(_header()) == 'aa' * 20
+    #the same count again is the same size, only the mtime tells them apart
+    time.sleep(0.01)
+    one.add(_header(), 'bb' * 20)
+    assert two.find(_header()) == 'bb' * 20
+    two.add(_header(_OTHER), 'cc' * 20)
+    assert (one.find(_header()), one.find(_header(_OTHER))) == ('bb' * 20, 'cc' * 20)
+    one.close()
+    two.close()
+
+
+def test_heldLockIsAnError(tmp_path, monkeypatch):
+    path = str(tmp_path / 'knownDumps.idx')
+    open(path + '.lock', 'w').close()
+    monkeypatch.setattr(datindex, '_lock', lambda path, lock=datindex._lock: lock(path, 0.1))
+    with pytest.raises(OSError):
+        KnownDumps(path).add(_header(), 'aa' * 20)
+
+
+def test_identifyCarriesOnWhenTheKnownDumpsAreLocked(tmp_path, monkeypatch, capsys):
+    dat = _index(tmp_path)
+    rom = str(tmp_path / 'DAT TEST.smc')
+    with open(rom, 'wb') as f:
+        f.write(_ROM)
+    known = KnownDumps(str(tmp_path / 'knownDumps.idx'))
+    open(known.path + '.lock', 'w').close()
+    monkeypatch.setattr(datindex, '_lock', lambda path, lock=datindex._lock: lock(path, 0.1))
+    assert _identify(dat, known, _header(), rom) == 'Dat Test (USA)'
+    assert 'known dumps not updated' in capsys.readouterr().out
+    assert known.find(_header()) is None
+    dat.close()
@@ -0,0 +1,79 @@
+import pytest
+
+from snesflash import detect, mapper, simbus
+
+
+def _resum(rom, header=0x7fc0):
+    #the header checksum pair for an edited power of two LoROM image
+    rom[header + 0x1c:header + 0x20] = b'\xff\xff\x00\x00'
+    total = sum(rom) & 0xffff
+    rom[header + 0x1c:header + 0x20] = bytes((total & 0xff ^ 0xff, total >> 8 ^ 0xff,
+                                               total & 0xff, total >> 8))
+    return bytes(rom)
+
+
+def _probe(makeCart, rom, mapping=mapper.LOROM, length=None):
+    cart = makeCart(simbus.SimCart(rom, mapping.name))
+    cart.readRom()
+    cart.mapper = mapping
+    return detect.probeSize(cart, length or len(rom))
+
+
+@pytest.mark.parametrize('mapping, size', [(simbus.LOROM, 0x100000),
+                                           (simbus.HIROM, 0x200000),
+                                           (simbus.EXHIROM, 0x600000)])
+def test_detectPicksTheMapping(makeCart, mapping, size):
+    rom = simbus.makeROM(size, mapping, title='DETECT ME')
+    cart = makeCart(simbus.SimCart(rom, mapping))
+    found = detect.detect(cart)
+    assert found is not None
+    assert found.mapping.name == mapping
+    assert cart.mapper is found.mapping
+    assert found.header.title.strip() == 'DETECT ME'
+    assert found.header.checksumsMatch
+
+
+def test_detectGivesUpOnAnEmptySlot(makeCart):
+    #the data pull-ups answer every read with 0xff
+    sim = simbus.SimCart(simbus.makeROM(0x80000))
+    sim.present = False
+    assert detect.detect(makeCart(sim)) is None
+
+
+def test_scoreFavoursTheRealHeader(makeCart):
+    rom = simbus.makeROM(0x80000)
+    cart = makeCart(simbus.SimCart(rom))
+    cart.readRom()
+    header = cart.readHeader(mapper.LOROM.header, mapping=mapper.LOROM)
+    assert detect.score(header, mapper.LOROM) >= detect.MINSCORE
+    assert detect.score(header, mapper.LOROM) > detect.score(header, mapper.HIROM)
+
+
+def test_probeSizeKeepsAFullRom(makeCart):
+    assert _probe(makeCart, simbus.makeROM(0x200000)) == 0x200000
+
+
+@pytest.mark.parametrize('size', [0x180000, 0x100000])
+def test_probeSizeFindsMirrors(makeCart, size):
+    #12 Mbit answering for 16, and 8 Mbit under a header that says 16
+    assert _probe(makeCart, simbus.makeROM(size), length=0x200000) == size
+
+
+def test_probeSizeFindsMirrorsOnHirom(makeCart):
+    rom = simbus.makeROM(0x280000, simbus.HIROM)
+    assert _probe(makeCart, rom, mapper.HIROM, 0x400000) == 0x280000
+
+
+def test_probeSizeKeepsFillerAtTheEnd(makeCart):
+    #the last 128KB of padding reads like a mirror of nothing in particular
+    rom = bytearray(simbus.makeROM(0x200000))
+    rom[-0x20000:] = b'\xff' * 0x20000
+    assert _probe(makeCart, _resum(rom)) == 0x200000
+
+
+def test_probeSizeNeedsMoreThanFillerAsProof(makeCart):
+    #a 16 Mbit ROM whose top 8 Mbit is all padding: 12 Mbit would explain
+    #every sample, but only with banks of 0xff
+    rom = bytearray(simbus.makeROM(0x200000))
+    rom[0x100000:] = b'\xff' * 0x100000
+    assert _probe(makeCart, _resum(rom)) == 0x200000
@@ -0,0 +1,73 @@
+import pytest
+
+from snesflash import events, simbus
+from snesflash.events import INSERTED, REMOVED, CartEvents
+
+_ROM = simbus.makeROM(0x20000)
+
+
+@pytest.fixture(autouse=True)
+def noSleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(events.utime, 'sleep', slept.append)
+    return slept
+
+
+def _watch(makeCart, intPin=False):
+    cart = makeCart(None)
+    board = cart.simBoard
+    watcher = CartEvents(cart, board.intPin if intPin else None, probeEvery=1000)
+    #the first wait always probes; an empty slot is no event
+    assert watcher.wait(timeout=1.0) is None
+    return board, watcher
+
+
+@pytest.mark.parametrize('intPin', [False, True])
+def test_insertionAndRemovalAreSeen(makeCart, intPin):
+    board, watcher = _watch(makeCart, intPin)
+    board.insert(simbus.SimCart(_ROM))
+    assert watcher.wait(timeout=1.0) == INSERTED
+    assert watcher.present and not watcher._armed
+    watcher.arm()
+    assert watcher.wait(timeout=1.0) is None
+    board.remove()
+    assert watcher.wait(timeout=1.0) == REMOVED
+    assert not watcher.present
+
+
+def test_insertionIsProbedAgainAfterSettling(makeCart, noSleep):
+    board, watcher = _watch(makeCart)
+    del noSleep[:]
+    board.insert(simbus.SimCart(_ROM))
+    assert watcher.wait(timeout=1.0) == INSERTED
+    assert noSleep[0] == watcher.settle
+
+
+def test_headerByteOfFFStillCountsAsACart(makeCart):
+    rom = bytearray(_ROM)
+    rom[0x7fdc] = 0xff
+    board, watcher = _watch(makeCart)
+    board.insert(simbus.SimCart(bytes(rom)))
+    assert watcher.check() == INSERTED
+
+
+def test_runDumpsEveryCartPutIn(makeCart):
+    board, watcher = _watch(makeCart)
+    seen = []
+
+    class Done(Exception):
+        pass
+
+    def inserted(cart):
+        seen.append('in')
+        board.remove()
+
+    def removed(cart):
+        seen.append('out')
+        if len(seen) == 4:
+            raise Done
+        board.insert(simbus.SimCart(_ROM))
+    board.insert(simbus.SimCart(_ROM))
+    with pytest.raises(Done):
+        watcher.run(inserted, removed)
+    assert seen == ['in', 'out', 'in', 'out']
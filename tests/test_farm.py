@@ -0,0 +1,66 @@
+import io
+import os
+
+from snesflash import simbus
+from snesflash.farm import DEFAULTS, Farm, _Progress, _dump
+from snesflash.header import Header
+from snesflash.library import dumpName
+
+
+class _Queue(list):
+    put = list.append
+
+
+def _settings(tmp_path, name='left'):
+    settings = dict(DEFAULTS, name=name, directory=str(tmp_path) + '/', readSRAM=False,
+                    statusFile=str(tmp_path / ('insertedCart-' + name)))
+    return settings
+
+
+def _farm():
+    return Farm({'adapters': [{'name': 'left', 'bus': 1}]}, out=io.StringIO())
+
+
+def test_dumpIsReportedWithItsChecksum(makeCart, tmp_path):
+    cart = makeCart(simbus.SimCart(simbus.makeROM(0x20000, title='FARM TEST')))
+    queue = _Queue()
+    cart.metrics = _Progress(queue, 'left')
+    _dump(cart, _settings(tmp_path), queue)
+    assert [message[0] for message in queue] == ['start'] + ['bank'] * 4 + ['dumped']
+    report = queue[-1][3]
+    assert report['checksumOk']
+    assert report['bytes'] == 0x20000
+    assert not os.path.exists(str(tmp_path / 'FARM TEST.lock'))
+    farm = _farm()
+    for message in queue:
+        farm.handle(message)
+    assert farm.stats['left']['dumps'] == 1
+    assert farm.stats['left']['badChecksums'] == 0
+
+
+def test_cartWithARomAlreadyThereIsSkipped(makeCart, tmp_path):
+    rom = simbus.makeROM(0x20000, title='FARM TEST')
+    title = Header(rom[0x7fc0:0x8000], 0x7fc0).title
+    with open(str(tmp_path / (dumpName(title) + '.smc')), 'wb') as f:
+        f.write(rom)
+    cart = makeCart(simbus.SimCart(rom))
+    queue = _Queue()
+    _dump(cart, _settings(tmp_path), queue)
+    assert [message[0] for message in queue] == ['start', 'skipped']
+    farm = _farm()
+    for message in queue:
+        farm.handle(message)
+    stats = farm.stats['left']
+    assert (stats['dumps'], stats['skipped'], stats['bytes'], stats['cart']) == (0, 1, 0, None)
+    assert farm.dumps == []
+
+
+def test_secondAdapterWithTheSameGameIsBusy(makeCart, tmp_path):
+    cart = makeCart(simbus.SimCart(simbus.makeROM(0x20000, title='FARM TEST')))
+    lock = str(tmp_path / 'FARM TEST.lock')
+    open(lock, 'w').close()
+    queue = _Queue()
+    _dump(cart, _settings(tmp_path, 'right'), queue)
+    assert [(kind, name, title.strip()) for kind, name, title in queue] == [
+        ('busy', 'right', 'FARM TEST')]
+    assert os.path.exists(lock)
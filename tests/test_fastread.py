@@ -0,0 +1,55 @@
+import importlib
+import sys
+import types
+
+import pytest
+
+from snesflash import fastread, simbus
+
+_ROM = simbus.makeROM(0x20000)
+
+
+@pytest.fixture
+def nativeLoop(monkeypatch):
+    #the compiled loop's source run as plain Python, the decorator a no-op
+    micropython = types.ModuleType('micropython')
+    micropython.native = lambda function: function
+    monkeypatch.setitem(sys.modules, 'micropython', micropython)
+    monkeypatch.delitem(sys.modules, 'snesflash.nativeloop', raising=False)
+    yield importlib.import_module('snesflash.nativeloop').readRun
+    sys.modules.pop('snesflash.nativeloop', None)
+
+
+def _run(cart, bank, start, count):
+    #from a cart already at start, so only the run itself is counted
+    cart.gotoBank(bank)
+    cart.gotoAddr(start, False)
+    cart.resetCounters()
+    cart.simBoard.i2c.resetCounters()
+    buf = bytearray(count)
+    cart._readRun(bank, start, count, buf)
+    return buf
+
+
+@pytest.mark.parametrize('start, count', [(0x8000, 0x8000), (0x80f0, 0x30), (0x9000, 1)])
+def test_fastReadCountsWhatThePlainLoopDoes(makeCart, nativeLoop, monkeypatch, start, count):
+    plain = makeCart(simbus.SimCart(_ROM))
+    plain.readRom()
+    expected = _run(plain, 0x01, start, count)
+    assert plain._fast is None
+
+    monkeypatch.setattr(fastread, '_readRun', nativeLoop)
+    cart = makeCart(simbus.SimCart(_ROM))
+    cart.readRom()
+    cart._fast = fastread.FastRead(cart.bus.bus, cart._dataRead[0], cart._dataRead[1], 0x20)
+    #LoROM bank 1 at 0x8000 is offset 0x8000
+    assert _run(cart, 0x01, start, count) == expected == _ROM[start:start + count]
+    #the raw bus saw the same calls, and account() put them on the counters
+    wire = cart.simBoard.i2c
+    assert (wire.transactions, wire.bytes) == (plain.simBoard.i2c.transactions,
+                                              plain.simBoard.i2c.bytes)
+    assert (cart.bus.transactions, cart.bus.bytes) == (wire.transactions, wire.bytes)
+    assert (plain.bus.transactions, plain.bus.bytes) == (wire.transactions, wire.bytes)
+    assert (cart.datachip.reads, cart.addrchip.writes) == (plain.datachip.reads,
+                                                          plain.addrchip.writes)
+    assert cart.currentAddr == plain.currentAddr == start + count - 1
@@ -0,0 +1,124 @@
+import io
+
+import pytest
+
+from snesflash import gpio, mapper, simbus
+from snesflash.cart import SnesCart
+from snesflash.detect import detect
+from snesflash.gpio import GpioBus, GpioPort, lineGroups
+
+
+class _Bus:
+    transactions = 0
+
+
+class _Lines:
+    #records what GpioPort asks of a request, input level set by hand
+    path = '/dev/gpiochip9'
+
+    def __init__(self, width):
+        self.offsets = list(range(width))
+        self.level = 0
+        self.sets = []
+        self.configured = []
+
+    def get(self):
+        return self.level
+
+    def set(self, value, mask):
+        self.sets.append((value, mask))
+
+    def configure(self, output, pullUp):
+        self.configured.append((output, pullUp))
+
+
+def _cart(sim):
+    chip = simbus.SimGpio(sim)
+    return chip, SnesCart(i2c=GpioBus(opener=chip.request), board='gpio')
+
+
+def test_romDumpOverGpio():
+    rom = simbus.makeROM(0x20000, title='GPIO TEST')
+    chip, cart = _cart(simbus.SimCart(rom))
+    cart.readRom()
+    found = detect(cart)
+    assert found.header.title.strip() == 'GPIO TEST'
+    out = io.BytesIO()
+    cart.ripRange(0, len(rom), out=out)
+    assert out.getvalue() == rom
+    assert chip.bytes == 0 and chip.transactions == cart.bus.transactions
+    cart.shutdown()
+
+
+def test_sramWriteOverGpio():
+    sim = simbus.SimCart(simbus.makeROM(0x20000, sramSize=0x2000), sram=0x2000)
+    chip, cart = _cart(sim)
+    cart.mapper = mapper.byName(simbus.LOROM)
+    cart.readRom()
+    cart.writeSRAMBytes([(0x70, 0x0010, 0xa5), (0x70, 0x0011, 0x5a)])
+    assert sim.sram[0x10:0x12] == b'\xa5\x5a'
+    assert not chip.lines['data'].output
+    cart.readRom()
+    assert cart.ripSRAM(64, 0)[0x10:0x12] == b'\xa5\x5a'
+    cart.shutdown()
+
+
+def test_iodirSwitchesTheWholePortOnce():
+    lines = _Lines(8)
+    port = GpioPort(_Bus(), lines, 8, 0, False)
+    assert port.iodir == 0xff
+    port.iodir = 0xff
+    assert lines.configured == []
+    port.gpio = 0x3c
+    port.iodir = 0x00
+    port.iodir = 0x0f       #any clear bit is an output, already one
+    assert lines.configured == [(True, True)]
+    #the last value goes back out with the lines
+    assert lines.sets[-1] == (0x3c, 0xff) and port.gpio == 0x3c
+    port.iodir = 0xff
+    assert lines.configured[-1] == (False, True)
+    lines.level = 0x81
+    assert port.gpio == 0x81
+
+
+def test_intfIsPolledAgainstTheLastLevel():
+    lines = _Lines(8)
+    port = GpioPort(_Bus(), lines, 8, 0, False)
+    lines.level = 0x01
+    assert port.intf == 0
+    port.gpinten = 0x03
+    lines.level = 0x03
+    assert port.intf == 0x02
+    assert port.gpio == 0x03    #reading the port takes the new level
+    assert port.intf == 0
+    lines.level = 0x83          #bit 7 is not enabled
+    assert port.intf == 0
+    #bit 0 against defval from now on, bit 1 still against the last level
+    port.intcon = 0x01
+    port.defval = 0x00
+    assert port.intf == 0x01
+    lines.level = 0x02
+    assert port.intf == 0
+
+
+def test_activeLowLinesAreInverted():
+    wiring = dict(gpio.WIRING, activeLow=[1, 33, 36],
+                  bank={'chip': '/dev/gpiochip1', 'lines': list(range(8))})
+    groups = lineGroups(wiring)
+    assert groups['address'] == ('/dev/gpiochip0', list(range(16)), 0x0002)
+    assert groups['bank'] == ('/dev/gpiochip1', list(range(8)), 0x02)
+    assert groups['controls'][2] == 0x12
+    assert groups['data'][2] == 0
+    lines = _Lines(5)
+    port = GpioPort(_Bus(), lines, 5, 0x12, True)
+    port.gpio = 0x10
+    assert lines.sets == [(0x02, 0x1f)] and port.gpio == 0x10
+    lines = _Lines(5)
+    port = GpioPort(_Bus(), lines, 5, 0x12, False)
+    lines.level = 0x12
+    assert port.gpio == 0x00
+
+
+def test_groupOfTheWrongWidthIsRejected():
+    with pytest.raises(ValueError):
+        lineGroups(dict(gpio.WIRING, data=list(range(24, 31))))
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from snesflash import simbus
+from snesflash.dump import dumpCart
+from snesflash.journal import Journal
+from snesflash.ledger import Ledger
+
+_ROM = simbus.makeROM(0x20000, title='RESUME')
+_NAME = 'RESUME              '
+
+
+class Unplugged(Exception):
+    pass
+
+
+def _unplugAfter(cart, banks):
+    #the cart comes out once ``banks`` banks are safely written
+    keep = cart._keep
+    done = []
+
+    def unplug(*args, **kwargs):
+        if len(done) == banks:
+            raise Unplugged()
+        done.append(args[1])
+        return keep(*args, **kwargs)
+    cart._keep = unplug
+
+
+def _dump(cart, directory):
+    dumpCart(cart, str(directory), str(directory / 'status'), readSRAM=False)
+
+
+def test_interruptedDumpResumesWhereItStopped(makeCart, tmp_path):
+    cart = makeCart(simbus.SimCart(_ROM))
+    _unplugAfter(cart, 2)
+    with pytest.raises(Unplugged):
+        _dump(cart, tmp_path)
+    romPath = tmp_path / (_NAME + '.smc')
+    assert (tmp_path / (_NAME + '.smc.journal')).exists()
+
+    cart = makeCart(simbus.SimCart(_ROM))
+    _dump(cart, tmp_path)
+    assert len(cart.metrics.banks) == 4 - 2
+    assert romPath.read_bytes() == _ROM
+    assert not (tmp_path / (_NAME + '.smc.journal')).exists()
+
+
+def test_finishedDumpIsNotReadAgain(makeCart, tmp_path):
+    _dump(makeCart(simbus.SimCart(_ROM)), tmp_path)
+    cart = makeCart(simbus.SimCart(_ROM))
+    _dump(cart, tmp_path)
+    assert cart.metrics.banks == []
+
+
+def test_journalForAnotherCartStartsOver(tmp_path):
+    path = str(tmp_path / 'x.journal')
+    journal = Journal.open(path, {'title': 'ONE'})
+    entry = Ledger().measure(0, b'\x01' * 16, 0)
+    journal.complete(entry)
+    journal.close()
+
+    journal = Journal.open(path, {'title': 'ONE'})
+    assert len(journal.saved) == 1
+    assert journal.missing(Ledger(), 64) == [(16, 48)]
+    journal.close()
+    journal = Journal.open(path, {'title': 'TWO'})
+    assert journal.saved == []
+    journal.finish()
+    assert not os.path.exists(path)
+
+
+def test_missingSkipsBanksPastWhatReachedDisk(tmp_path):
+    journal = Journal.open(str(tmp_path / 'x.journal'), {})
+    ledger = Ledger()
+    for offset in (0, 16, 32):
+        journal.complete(ledger.measure(offset, b'\x02' * 16, 0))
+    journal.close()
+    journal = Journal.open(str(tmp_path / 'x.journal'), {})
+    ledger = Ledger()
+    assert journal.missing(ledger, 64, size=32) == [(32, 32)]
+    assert [entry.offset for entry in ledger.entries] == [0, 16]
+    journal.close()
@@ -0,0 +1,90 @@
+import io
+
+from snesflash import mapper, simbus
+from snesflash.ledger import Ledger, repairBanks, vote
+
+_ROM = simbus.makeROM(0x20000)
+_CHECKSUM = _ROM[0x7fde] | _ROM[0x7fdf] << 8
+_LAST = 0x03
+
+
+def _rip(makeCart, flaky):
+    #a dump with some banks reading bad, then a clean contact for the repair
+    sim = simbus.SimCart(_ROM)
+    sim.flaky = dict((bank, 0.01) for bank in flaky)
+    cart = makeCart(sim)
+    cart.readRom()
+    cart.mapper = mapper.LOROM
+    ledger = Ledger()
+    out = io.BytesIO()
+    cart.ripRange(0, len(_ROM), out=out, ledger=ledger)
+    sim.flaky = {}
+    return cart, ledger, out
+
+
+def _countReads(cart):
+    reads = []
+    readRange = cart.readRange
+
+    def counted(offset, length, mapping=None):
+        reads.append(offset)
+        return readRange(offset, length, mapping)
+    cart.readRange = counted
+    return reads
+
+
+def test_repairFixesABadBankNearTheEnd(makeCart):
+    cart, ledger, out = _rip(makeCart, [_LAST])
+    assert ledger.total() != _CHECKSUM
+    baudrate = cart.baudrate
+    assert repairBanks(cart, ledger, _CHECKSUM, out)
+    assert out.getvalue() == _ROM
+    assert [entry.bank for entry in ledger.unstable()] == [_LAST]
+    assert cart.baudrate == baudrate
+
+
+def test_repairFindsABadBankWithNoBusErrors(makeCart):
+    #a dirty contact on bank 0: no errors, no open bus, the last bank read
+    cart, ledger, out = _rip(makeCart, [0x00])
+    reads = _countReads(cart)
+    assert repairBanks(cart, ledger, _CHECKSUM, out)
+    assert out.getvalue() == _ROM
+    assert [entry.bank for entry in ledger.unstable()] == [0x00]
+    #every other bank read once, bank 0 three times to vote
+    assert sorted(reads) == [0x00000] * 3 + [0x08000, 0x10000, 0x18000]
+
+
+def test_repairOfAWrongHeaderChecksumReadsEveryBankOnce(makeCart):
+    cart, ledger, out = _rip(makeCart, [])
+    reads = _countReads(cart)
+    baudrate = cart.baudrate
+    assert not repairBanks(cart, ledger, _CHECKSUM ^ 1, out)
+    assert sorted(reads) == [0x00000, 0x08000, 0x10000, 0x18000]
+    assert ledger.unstable() == []
+    assert cart.baudrate == baudrate
+
+
+def test_banksWithBusErrorsComeFirst(makeCart):
+    cart, ledger, out = _rip(makeCart, [])
+    ledger.entries[1].errors = 2
+    assert [entry.bank for entry in ledger.suspects(out)] == [0x01, 0x03, 0x02, 0x00]
+
+
+def test_openBusBanksAreSuspects(makeCart):
+    cart, ledger, out = _rip(makeCart, [])
+    data = bytearray(out.getvalue())
+    data[0x8000:0x10000] = b'\xff' * 0x8000
+    assert [entry.bank for entry in ledger.suspects(io.BytesIO(data))][:2] == [0x01, _LAST]
+
+
+def test_mirroredBanksCountOncePerCopy():
+    ledger = Ledger()
+    for offset in range(0, 0x180000, 0x8000):
+        ledger.add(ledger.measure(offset, b'\x01' * 4, offset >> 15))
+    ledger.mirrored(0x180000, 0x200000, 0x8000)
+    assert ledger.total() == 4 * (0x200000 // 0x8000)
+
+
+def test_voteTakesTheMajority():
+    assert vote([b'abc', b'abd', b'xbd']) == bytearray(b'abd')
+    assert vote([b'a', b'b', b'c']) == bytearray(b'a')
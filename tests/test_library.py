@@ -0,0 +1,70 @@
+import os
+
+from snesflash import simbus
+from snesflash.header import Header
+from snesflash.library import ROM, SRAM, Library, dumpName, safeName
+
+
+def _header(title='LIBRARY TEST', seed=0):
+    rom = simbus.makeROM(0x20000, title=title, seed=seed)
+    return Header(rom[0x7fc0:0x8000], 0x7fc0)
+
+
+def _dumped(library, header, data, kind=ROM):
+    path = library.workPath(header, kind)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _blobs(library):
+    return [name for folder in os.listdir(library.objects)
+            for name in os.listdir(library.objects + folder)]
+
+
+def test_sameImageIsStoredOnce(tmp_path):
+    library = Library(str(tmp_path))
+    header = _header()
+    first = library.store(_dumped(library, header, b'rom' * 100), ROM, header)
+    path = _dumped(library, header, b'rom' * 100)
+    again = library.store(path, ROM, header)
+    assert again == first
+    assert not os.path.exists(path)
+    assert _blobs(library) == [first['sha1']]
+    with open(library.indexPath) as f:
+        assert len(f.read().splitlines()) == 1
+
+
+def test_otherCartWithTheSameImageSharesTheBlob(tmp_path):
+    library = Library(str(tmp_path))
+    one, two = _header('ONE'), _header('TWO', seed=1)
+    library.store(_dumped(library, one, b'same'), ROM, one)
+    entry = library.store(_dumped(library, two, b'same'), ROM, two)
+    assert _blobs(library) == [entry['sha1']]
+    assert library.find(two)['name'] == 'TWO.smc'
+    assert len(library.entries) == 2
+
+
+def test_findSeesWhatAnotherWorkerStored(tmp_path):
+    library = Library(str(tmp_path))
+    other = Library(str(tmp_path))
+    header = _header()
+    assert other.find(header) is None
+    library.store(_dumped(library, header, b'rom'), ROM, header)
+    assert other.find(header)['sha1'] == library.find(header)['sha1']
+
+
+def test_newSaveReplacesTheName(tmp_path):
+    library = Library(str(tmp_path))
+    header = _header()
+    library.store(_dumped(library, header, b'save 1', SRAM), SRAM, header)
+    entry = library.store(_dumped(library, header, b'save 2', SRAM), SRAM, header)
+    assert library.find(header, SRAM) == entry
+    with open(library.root + entry['name'], 'rb') as f:
+        assert f.read() == b'save 2'
+
+
+def test_namesHaveNoPathCharacters():
+    assert safeName(' A/B\x00C  ') == 'A_B_C'
+    assert safeName('   ') == 'untitled'
+    assert dumpName('../ETC/PASSWD\x01 \x7f  MORE') == '.._ETC_PASSWD_ _  MO'
@@ -0,0 +1,63 @@
+import socket
+import threading
+
+import pytest
+
+from snesflash import link, simbus
+
+_ROM = simbus.makeROM(0x20000, title='LINK/TEST', sramSize=0x800)
+
+
+@pytest.fixture
+def receiver(makeCart):
+    """A Receiver talking to a Server over a loopback whose board side
+    flips and drops frames."""
+    board, pc = socket.socketpair()
+    sim = simbus.SimCart(_ROM, sram=0x800)
+    sim.sram[:] = bytes(range(256)) * 8
+    noisy = simbus.NoisyLink(link.SocketLink(board, 0.2), flipRate=0.05, dropRate=0.03,
+                             seed=3)
+    server = link.Server(makeCart(sim), noisy, chunkSize=256)
+    thread = threading.Thread(target=server.serve)
+    thread.daemon = True
+    thread.start()
+    receiver = link.Receiver(link.SocketLink(pc, 0.2), retries=20)
+    receiver.noisy = noisy
+    receiver.sim = sim
+    yield receiver
+    receiver.close()
+    thread.join(5)
+    board.close()
+    pc.close()
+
+
+def test_dumpComesThroughANoisyLink(receiver, tmp_path):
+    assert link.dump(receiver, str(tmp_path))
+    name = 'LINK_TEST           '
+    assert (tmp_path / (name + '.smc')).read_bytes() == _ROM
+    assert (tmp_path / (name + '.srm')).read_bytes() == bytes(receiver.sim.sram)
+    assert receiver.noisy.flipped and receiver.noisy.dropped
+    assert receiver.resent
+
+
+def test_framesCheckOut():
+    class Buffer:
+        def __init__(self, data):
+            self.data = data
+
+        def read(self, n):
+            data, self.data = self.data[:n], self.data[n:]
+            return data
+    good = link.frame(link.DATA, 7, b'payload')
+    bad = bytearray(good)
+    bad[9] ^= 1
+    reader = link.FrameReader(Buffer(b'junk' + bytes(bad) + good))
+    assert reader.next() == (link.DATA, 7, b'payload')
+    assert reader.bad
+    assert reader.next() is None
+
+
+def test_holesAreWhatWasNotReceived():
+    assert link.holes([(0, 10), (20, 5)], 30) == [(10, 10), (25, 5)]
+    assert link.holes([], 8) == [(0, 8)]
+    assert link.holes([(0, 8)], 8) == []
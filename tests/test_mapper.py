@@ -0,0 +1,69 @@
+from snesflash import mapper
+
+_4MB = 0x400000
+
+
+def test_loromRunsSplitAtBanks():
+    assert mapper.LOROM.runs(0x7ff0, 0x20) == [(0x00, 0xfff0, 0x10), (0x01, 0x8000, 0x10)]
+
+
+def test_loromWramBanksComeFromTheUpperMirror():
+    assert mapper.LOROM.locate(0x3f0000) == (0xfe, 0x8000)
+    assert mapper.LOROM.locate(0x3fffff) == (0xff, 0xffff)
+
+
+def test_hiromRunsCarryOnAt0x40Past4MB():
+    assert mapper.HIROM.runs(0, 0x20000) == [(0xc0, 0, 0x10000), (0xc1, 0, 0x10000)]
+    assert mapper.HIROM.runs(_4MB - 0x10, 0x20) == [(0xff, 0xfff0, 0x10), (0x40, 0, 0x10)]
+
+
+def test_exhiromSharesTheHiromBusLayout():
+    assert mapper.EXHIROM.header == 0x40ffc0
+    assert mapper.EXHIROM.runs(_4MB, 0x10000) == [(0x40, 0, 0x10000)]
+
+
+def test_exloromPutsTheFirst4MBInTheUpperBanks():
+    assert mapper.EXLOROM.runs(0, 0x10000) == [(0x80, 0x8000, 0x8000), (0x81, 0x8000, 0x8000)]
+    assert mapper.EXLOROM.runs(_4MB, 0x8000) == [(0x00, 0x8000, 0x8000)]
+
+
+def test_offsetOfUndoesLocate():
+    for mapping, size in ((mapper.LOROM, _4MB), (mapper.HIROM, _4MB),
+                          (mapper.EXLOROM, 0x600000), (mapper.EXHIROM, 0x600000)):
+        for offset in range(0, size, 0x18000):
+            bank, addr = mapping.locate(offset)
+            assert mapping.offsetOf(bank) + (addr & (mapping.bankSize - 1)) == offset
+
+
+def test_runsCoverTheRange():
+    for mapping in mapper.MAPPERS.values():
+        runs = mapping.runs(0x1234, 0x50000)
+        assert sum(count for bank, addr, count in runs) == 0x50000
+        assert all(addr + count <= 0x10000 for bank, addr, count in runs)
+
+
+def test_byNameRejectsUnknownMappings():
+    assert mapper.byName('hirom') is mapper.HIROM
+    try:
+        mapper.byName('sa1')
+    except ValueError:
+        pass
+    else:
+        assert False, 'no error for an unknown mapping'
+
+
+def test_mirrorOfPowerOfTwoRomWraps():
+    assert mapper.mirror(0x123456, 0x100000) == 0x23456
+    assert mapper.mirror(0x1234, 0) == 0
+
+
+def test_mirrorRepeatsTheSmallChip():
+    #12 Mbit: 8 Mbit then 4 Mbit, the last 4 Mbit of the 16 repeat the small chip
+    assert mapper.mirror(0x17ffff, 0x180000) == 0x17ffff
+    assert mapper.mirror(0x180000, 0x180000) == 0x100000
+    assert mapper.mirror(0x1c0000, 0x180000) == 0x140000
+    #20 Mbit: 16 + 4, the 4 repeats through the top 16
+    assert mapper.mirror(0x300000, 0x280000) == 0x200000
+    assert mapper.mirror(0x3c0000, 0x280000) == 0x240000
+    #48 Mbit: 32 + 16
+    assert mapper.mirror(0x700000, 0x600000) == 0x500000
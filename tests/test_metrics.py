@@ -0,0 +1,53 @@
+import io
+import json
+
+from snesflash import mapper, simbus
+from snesflash.metrics import Metrics
+
+
+def test_phasesAddUpInTheOrderFirstSeen():
+    metrics = Metrics()
+    with metrics.phase('header'):
+        pass
+    metrics.add('rom', 2.0)
+    metrics.add('header', 0.5)
+    report = metrics.report()
+    assert [name for name, seconds in report['phases']] == ['header', 'rom']
+    assert report['phases'][0][1] >= 0.5
+    assert report['phases'][1] == ['rom', 2.0]
+
+
+def test_phaseIsTimedWhenItRaises():
+    metrics = Metrics()
+    try:
+        with metrics.phase('sram'):
+            raise OSError
+    except OSError:
+        pass
+    assert metrics.order == ['sram']
+
+
+def test_reportCountsTheBusAndTheCaches(makeCart, tmp_path):
+    cart = makeCart(simbus.SimCart(simbus.makeROM(0x20000)))
+    cart.readRom()
+    cart.mapper = mapper.LOROM
+    cart.resetCounters()
+    cart.simBoard.i2c.resetCounters()
+    cart.ripRange(0, 0x20000, out=io.BytesIO())
+    #already on the last byte read: all three writes are skipped
+    cart.gotoBank(0x03)
+    cart.gotoAddr(0xffff, True)
+    path = str(tmp_path / 'report.json')
+    cart.metrics.save(path, cart)
+    with open(path) as f:
+        report = json.load(f)
+    wire = cart.simBoard.i2c
+    assert [bank for bank, seconds in report['banks']] == [0x00, 0x01, 0x02, 0x03]
+    assert (report['transactions'], report['bytes']) == (wire.transactions, wire.bytes)
+    assert report['wireSeconds'] == round(wire.bytes * 9.0 / cart.baudrate, 6)
+    assert report['busErrors'] == 0
+    assert report['skipped'] == {'bank': 1, 'addrHigh': 1, 'addrLow': 1}
+    chips = report['chips']
+    assert sorted(chips) == ['address', 'bank', 'data']
+    assert chips['data']['reads'] == 0x20000
+    assert chips['address']['address'] == 0x20
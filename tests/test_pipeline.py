@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+from snesflash import mapper, pipeline, simbus
+from snesflash.ledger import Ledger
+
+_ROM = simbus.makeROM(0x20000)
+
+
+def _rip(makeCart, slots, start=0, length=len(_ROM)):
+    cart = makeCart(simbus.SimCart(_ROM))
+    cart.readRom()
+    cart.mapper = mapper.LOROM
+    cart.totalChecksum = 0
+    ledger = Ledger()
+    out = io.BytesIO()
+    cart.ripRange(start, length, out=out, ledger=ledger, slots=slots)
+    return cart, ledger, out.getvalue()
+
+
+def _same(one, two):
+    (cart, ledger, data), (other, otherLedger, otherData) = one, two
+    assert data == otherData
+    assert cart.totalChecksum == other.totalChecksum
+    assert ([(entry.offset, entry.sum, entry.sha1) for entry in ledger.entries] ==
+            [(entry.offset, entry.sum, entry.sha1) for entry in otherLedger.entries])
+    assert ([bank for bank, seconds in cart.metrics.banks] ==
+            [bank for bank, seconds in other.metrics.banks])
+
+
+def test_pipelinedRipMatchesThePlainOne(makeCart, monkeypatch):
+    plain = _rip(makeCart, 0)
+    assert plain[2] == _ROM
+    for slots in (1, 4):
+        _same(_rip(makeCart, slots), plain)
+    #without threads the stages run in turn
+    monkeypatch.setattr(pipeline, '_thread', None)
+    _same(_rip(makeCart, 4), plain)
+
+
+def test_rangeOffTheBankEdges(makeCart):
+    plain = _rip(makeCart, 0, 0x4000, 0x10000)
+    assert plain[2] == _ROM[0x4000:0x14000]
+    _same(_rip(makeCart, 2, 0x4000, 0x10000), plain)
+
+
+class _FullDisk(io.BytesIO):
+    def write(self, data):
+        if self.tell() >= 0x8000:
+            raise OSError(28, 'No space left on device')
+        return io.BytesIO.write(self, data)
+
+
+def test_writerFailureStopsTheRead(makeCart):
+    cart = makeCart(simbus.SimCart(_ROM))
+    cart.readRom()
+    cart.mapper = mapper.LOROM
+    with pytest.raises(OSError):
+        cart.ripRange(0, len(_ROM), out=_FullDisk(), slots=1)
+    #the reader is at most the one slot and the bank in hand past the failure
+    assert len(cart.metrics.banks) <= 3
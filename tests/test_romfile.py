@@ -0,0 +1,58 @@
+import os
+
+import pytest
+
+from snesflash import romfile
+from snesflash.romfile import RomFile
+
+
+@pytest.fixture(params=['mmap', 'seek'])
+def access(request, monkeypatch):
+    #every test with the file mapped and again with seek and write, as on MicroPython
+    if request.param == 'seek':
+        monkeypatch.setattr(romfile, 'mmap', None)
+    return request.param
+
+
+def test_fileIsSizedBeforeTheFirstBank(tmp_path, access):
+    path = str(tmp_path / 'rom.smc')
+    with RomFile(path, 0x10000) as f:
+        assert f.existing is None
+        assert os.path.getsize(path) == 0x10000
+        assert (f.map is None) == (access == 'seek')
+
+
+def test_banksLandAtTheirOffsetsInAnyOrder(tmp_path, access):
+    path = str(tmp_path / 'rom.smc')
+    with RomFile(path, 0x30) as f:
+        f.writeAt(0x20, b'c' * 0x10)
+        f.writeAt(0x00, b'a' * 0x10)
+        f.seek(0x10)
+        f.write(b'b' * 0x10)
+        assert f.tell() == 0x20
+        f.seek(-0x18, 2)
+        assert f.read(0x10) == b'b' * 8 + b'c' * 8
+        f.seek(0)
+        assert f.read() == b'a' * 0x10 + b'b' * 0x10 + b'c' * 0x10
+    with open(path, 'rb') as f:
+        assert f.read() == b'a' * 0x10 + b'b' * 0x10 + b'c' * 0x10
+
+
+def test_existingFileKeepsItsBanks(tmp_path, access):
+    path = str(tmp_path / 'rom.smc')
+    with open(path, 'wb') as f:
+        f.write(b'x' * 0x10)
+    with RomFile(path, 0x20) as f:
+        assert f.existing == 0x10
+        f.writeAt(0x10, b'y' * 0x10)
+    with open(path, 'rb') as f:
+        assert f.read() == b'x' * 0x10 + b'y' * 0x10
+
+
+def test_longerFileIsCutToTheCart(tmp_path, access):
+    path = str(tmp_path / 'rom.smc')
+    with open(path, 'wb') as f:
+        f.write(b'x' * 0x40)
+    with RomFile(path, 0x20) as f:
+        assert f.existing == 0x40
+    assert os.path.getsize(path) == 0x20
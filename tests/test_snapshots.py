@@ -0,0 +1,81 @@
+import os
+import random
+
+import pytest
+
+from snesflash import simbus
+from snesflash.header import Header
+from snesflash.snapshots import SnapshotStore
+
+
+def _header(title='SAVE TEST', seed=0):
+    rom = simbus.makeROM(0x20000, title=title, seed=seed, sramSize=0x2000)
+    return Header(rom[0x7fc0:0x8000], 0x7fc0)
+
+
+def _save(seed=0):
+    rng = random.Random(seed)
+    return bytes(rng.getrandbits(8) for i in range(0x2000))
+
+
+def _blocks(store):
+    return sorted(name for folder in os.listdir(store.blocks)
+                  for name in os.listdir(store.blocks + folder))
+
+
+def test_changedSaveOnlyAddsItsNewBlocks(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    header = _header()
+    first = store.snapshot(header, _save())
+    assert first['version'] == 0 and len(_blocks(store)) == 8
+    changed = bytearray(_save())
+    changed[0x1234] ^= 0xff
+    second = store.snapshot(header, bytes(changed))
+    assert second['version'] == 1
+    assert len(_blocks(store)) == 9
+    assert store.versions(header) == [0, 1]
+    assert store.load(header, 0) == _save()
+    assert store.load(header) == changed
+
+
+def test_unchangedSaveAddsNothing(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    header = _header()
+    store.snapshot(header, _save())
+    again = store.snapshot(header, _save())
+    assert again['version'] == 0
+    assert store.versions(header) == [0]
+
+
+def test_cartsShareBlocks(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    store.snapshot(_header(), _save())
+    store.snapshot(_header('OTHER', seed=1), _save())
+    assert len(_blocks(store)) == 8
+    assert store.load(_header('OTHER', seed=1)) == _save()
+
+
+def test_compressedAndRawStoresReadEachOther(tmp_path):
+    header = _header()
+    packed = SnapshotStore(str(tmp_path), compression='gzip')
+    packed.snapshot(header, _save())
+    assert all(name.endswith('.gz') for name in _blocks(packed))
+    raw = SnapshotStore(str(tmp_path))
+    assert raw.load(header) == _save()
+    changed = bytearray(_save())
+    changed[0] ^= 1
+    raw.snapshot(header, bytes(changed))
+    assert packed.load(header) == changed
+
+
+def test_missingBlockIsDamage(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    header = _header()
+    manifest = store.snapshot(header, _save())
+    digest = manifest['blocks'][3]
+    os.remove(store.blocks + digest[:2] + '/' + digest)
+    with pytest.raises(ValueError):
+        store.load(header)
+    with pytest.raises(ValueError):
+        store.load(header, 5)
+    assert store.manifest(_header('NOBODY', seed=2)) is None
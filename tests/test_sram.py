@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from snesflash import mapper, simbus, sram
+
+_KBITS = 64
+
+
+def _cart(makeCart, layout, saved, mapping=simbus.LOROM):
+    sim = simbus.SimCart(simbus.makeROM(0x20000 if mapping == simbus.LOROM else 0x40000,
+                                        mapping, sramSize=len(saved)),
+                         mapping, sram=len(saved))
+    sim.sram[:] = saved
+    cart = makeCart(sim, layout)
+    cart.mapper = mapper.byName(mapping)
+    writes = []
+    writeSRAMBytes = cart.writeSRAMBytes
+
+    def counted(bytes, isLowROM=None):
+        writes.append(len(bytes))
+        return writeSRAMBytes(bytes, isLowROM)
+    cart.writeSRAMBytes = counted
+    return sim, cart, writes
+
+
+def _images():
+    rng = random.Random(1)
+    saved = bytearray(rng.getrandbits(8) for i in range(_KBITS * 128))
+    target = bytearray(saved)
+    for index in rng.sample(range(len(target)), 40):
+        target[index] ^= 0x5a
+    return saved, target
+
+
+@pytest.mark.parametrize('layout', ['pycom', 'waterbury'])
+@pytest.mark.parametrize('mapping', [simbus.LOROM, simbus.HIROM])
+def test_restoreWritesOnlyTheBytesThatDiffer(makeCart, layout, mapping):
+    saved, target = _images()
+    sim, cart, writes = _cart(makeCart, layout, saved, mapping)
+    assert sram.restore(cart, bytes(target), _KBITS)
+    assert sim.sram == target
+    assert writes == [40]
+
+
+def test_restoreOfTheSameSaveWritesNothing(makeCart):
+    saved, target = _images()
+    sim, cart, writes = _cart(makeCart, 'pycom', saved)
+    assert sram.restore(cart, bytes(saved), _KBITS)
+    assert writes == []
+
+
+def test_restoreRejectsASaveOfTheWrongSize(makeCart):
+    saved, target = _images()
+    sim, cart, writes = _cart(makeCart, 'pycom', saved)
+    with pytest.raises(ValueError):
+        sram.restore(cart, bytes(100), _KBITS)
+
+
+def test_diffWalksTheWindowsInOrder():
+    runs = [(0x30, 0x6000, 4), (0x31, 0x6000, 4)]
+    current = b'\x00' * 8
+    target = b'\x00\x01\x00\x00\x00\x00\x00\x02'
+    assert sram.diff(current, target, runs) == [(0x30, 0x6001, 1), (0x31, 0x6003, 2)]
+
+
+@pytest.mark.parametrize('layout', ['pycom', 'waterbury'])
+def test_writeSRAMKeepsTheCartPowered(makeCart, layout):
+    #one byte by hand: address, data, then the write levels
+    saved, target = _images()
+    sim, cart, writes = _cart(makeCart, layout, saved)
+    cart.readRom()
+    cart.gotoBankAddr(0x70, 0x0123, False)
+    cart.datachip.iodir = 0x00
+    cart.datachip.gpio = saved[0x123] ^ 0xff
+    cart.writeSRAM()
+    assert cart.simBoard.controls()[0] == 1
+    cart.datachip.iodir = 0xff
+    cart.readRom()
+    assert cart.ripSRAM(_KBITS, 0)[0x123] == saved[0x123] ^ 0xff
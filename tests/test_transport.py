@@ -0,0 +1,71 @@
+from snesflash import mapper, simbus, transport
+from snesflash.cart import SnesCart
+
+_OLATA = 0x14
+
+
+def _bus():
+    i2c = simbus.SimI2C()
+    i2c.attach(0x20, simbus.SimMCP23017())
+    i2c.attach(0x21, simbus.SimMCP23017())
+    return i2c
+
+
+def _ops(count):
+    ops = []
+    for index in range(count):
+        addr = 0x20 + index % 2
+        ops.append((addr, _OLATA, bytes((index & 0xff,))))
+        ops.append((addr, _OLATA, 1))
+    return ops
+
+
+def test_transferPacksTheOpsIntoFewCalls():
+    i2c = _bus()
+    bus = transport.SMBus2Transport(i2c)
+    reads = bus.transfer(_ops(30))
+    assert reads == [bytes((index,)) for index in range(30)]
+    #three messages an op pair, 42 to an ioctl
+    assert bus.transactions == i2c.transactions == 3
+    assert bus.bytes == 30 * (3 + 4)
+
+
+def test_unbatchedTransferIsACallAnOp():
+    i2c = _bus()
+    bus = transport.SMBusTransport(i2c)
+    assert not bus.batched
+    assert bus.transfer(_ops(30)) == [bytes((index,)) for index in range(30)]
+    assert bus.transactions == i2c.transactions == 60
+
+
+def test_wrapPicksTheTransportForTheBus():
+    i2c = _bus()
+    machine = transport.wrap(i2c)
+    assert type(machine) is transport.MachineI2C
+    assert transport.wrap(machine) is machine
+
+    class SMBus:
+        pass
+    assert type(transport.wrap(SMBus())) is transport.SMBusTransport
+    SMBus.i2c_rdwr = i2c.i2c_rdwr
+    SMBus.i2c_msg = i2c.i2c_msg
+    assert type(transport.wrap(SMBus())) is transport.SMBus2Transport
+
+
+def _rip(bus, board):
+    cart = SnesCart(i2c=bus, **board.addresses)
+    cart.readRom()
+    cart.mapper = mapper.LOROM
+    bus.resetCounters()
+    data = cart.readRange(0, 0x8000)
+    return data, bus.transactions
+
+
+def test_batchedWaterburyReadIsTheSameDataInFewerCalls():
+    rom = simbus.makeROM(0x20000)
+    board = simbus.SimBoard(simbus.SimCart(rom), 'waterbury')
+    batched, fewer = _rip(transport.SMBus2Transport(board.i2c), board)
+    board = simbus.SimBoard(simbus.SimCart(rom), 'waterbury')
+    plain, more = _rip(transport.SMBusTransport(board.i2c), board)
+    assert batched == plain == rom[:0x8000]
+    assert fewer * 10 < more
@@ -1,552 +1,177 @@
-import smbus
-import time
+#!/usr/bin/env python3
+# Raspberry Pi cart ripper for the Waterbury board: three MCP23017s on the
+# Pi's I2C bus.
+#   0x20: SNES address A0-A15 (port A low byte, port B high byte)
+#   0x22: SNES bank (port A) and data D0-D7 (port B)
+#   0x23: controls on port A
+#         GPA0: /RD | GPA1: /RESET | GPA2: /WR | GPA3: /CS
+#         GPA4: CART MOSFET (active low) | GPA7: /IRQ
+# The cart side is the same SnesCart the Pycom build uses, over smbus2 when
+# it is installed (batched i2c_rdwr reads) or python-smbus otherwise.
 import sys
 import os
 import getopt
 
-def readData():
-    return cart.read_byte_data(_SNESBankAndData,GPIOB)
-
-def gotoAddr(addr,isLowROM):
-    if addr <= 0xffff:
-        upByte = int(addr/256)
-        lowByte = addr - (upByte * 256)
-        gotoAddr.currentAddr = addr
-
-        if isLowROM != 0:
-            upByte = upByte | 0x80 # ORs a 1 to A15 if LoROM
-
-        if gotoAddr.currentUpByte != upByte:
-           cart.write_byte_data(_SNESAddressPins,GPIOB,upByte)
-           gotoAddr.currentUpByte = upByte
-
-        if gotoAddr.currentLowByte != lowByte:
-        cart.write_byte_data(_SNESAddressPins,GPIOA,lowByte)
-        gotoAddr.currentLowByte = lowByte
-
-    else:
-      cart.write_byte_data(_SNESAddressPins,GPIOA,0x00)
-      cart.write_byte_data(_SNESAddressPins,GPIOB,0x00)
-      gotoAddr.currentAddr = 0
-
-gotoAddr.currentAddr = -1
-gotoAddr.currentUpByte = -1
-gotoAddr.currentLowByte = -1
-
-def gotoBank(bank):
-    if bank != gotoBank.currentBank:
-        cart.write_byte_data(_SNESBankAndData,GPIOA,bank)
-        gotoBank.currentBank = bank
-
-gotoBank.currentBank = -1
-
-def readAddr(addr,isLowROM):
- gotoAddr(addr,isLowROM)
- return readData()
-
-def readAddrBank(addr,bank):
- gotoBank(bank)
- gotoAddr(addr,0)
- return readData()
-
-def gotoOffset(offset,isLowROM):
-
- if isLowROM == 0:
-  bank = int( offset / 65536) #64Kilobyte pages
-  addr = offset - (bank * 65536) #64kilobyte pages
-
- else:
-  bank = int( offset / 32768)#32kilobyte pages
-  addr = offset - (bank * 32768)#32kilobyte pages
-
- gotoBank(bank)
- gotoAddr(addr,isLowROM)
-
- gotoOffset.currentOffset = offset
-
-gotoOffset.currentOffset = 0
-
-
-
-def readOffset(offset,isLowROM):
- gotoOffset(offset,isLowROM)
- return readData()
-
-def compareROMchecksums(header,isLowROM):
- if isLowROM == 1:
-  cart.write_byte_data(_IOControls,GPIOA,0x06)#reset
-
- currentOffset = header + 28
- inverseChecksum  = readOffset(currentOffset,isLowROM)
- inverseChecksum += readOffset(currentOffset+1,isLowROM) * 256
- print "Inverse Checksum: " + str( hex(inverseChecksum) )
-
- currentOffset = header + 30
-
- ROMchecksum  = readOffset(currentOffset,isLowROM)
- ROMchecksum += readOffset(currentOffset+1,isLowROM) * 256
- print "Checksum: " + str(hex(ROMchecksum) )
-
-
- if (inverseChecksum ^ ROMchecksum) == 0xFFFF:
-  return 1
- else:
-  return 0
-
-
-def getUpNibble(value):
- return int(value/16)
-
-def getLowNibble(value):
- return ( value - (getUpNibble(value) * 16) )
-
-
-currentBank = 0
-currentAddr = 0
-currentOffset = 0
-
-def getROMsize(offset, isLowROM):
- ROMsizeRegister = readOffset(offset,isLowROM)
- ROMsizeRegister -= 7
-
- if ROMsizeRegister >=0:
-  return  pow(2, ROMsizeRegister)
- else:
-  return -1
-
-def getNumberOfPages(actualROMsize,isLowROM):
- actualROMsize *= 2
- if isLowROM == 1:
-  actualROMsize *= 2
-
- return actualROMsize
-
-def returnNULLheader():
- charStr = ""
- for x in range(0, 512):
-  charStr += chr(0x00)
- return charStr
-
-def CX4setROMsize(ROMsize):
- gotoOffset(0x007F52,0)
- ROMsizeRegister = readData()
- print "$007F52 offset reads    " + str( ROMsizeRegister )
- cart.write_byte_data(_SNESBankAndData,IODIRB,0x00) # Set MCP bank B to outputs  (SNES Data 0-7)
- cart.write_byte_data(_IOControls,GPIOA,0x03)#reset + /RD high
- # GPA0: /RD
- # GPA1: /RESET
- # GPA2: /WR
- # GPA3: /CS
- # GPA4: CART MOSFET
- # GPA7: /IRQ
-
- if ROMsize > 8:
-  if ROMsizeRegister == 1:
-   print "ROM is larger than 8 megs, writing 0x00 to CX4 register"
-   cart.write_byte_data(_SNESBankAndData,GPIOB,0x00)
-  else:
-   print "CX4 register is at correct value, will not change"
-
- else:
-  if ROMsizeRegister == 1:
-   print "CX4 register is at correct value, will not change"
-  else:
-   print "ROM is 8 megs, writing 0x01 to CX4 register"
-   cart.write_byte_data(_SNESBankAndData,GPIOB,0x01)
-
- cart.write_byte_data(_IOControls,GPIOA,0x06)#reset + /WR high
- cart.write_byte_data(_SNESBankAndData,IODIRB,0xFF) # Set MCP bank B to back to inputs  (SNES Data 0-7)
- print "$007F52 offset now reads " + str( readData() )
-
-
-
-def ripROM (startBank, isLowROM,numberOfPages):
-  #cart.write_byte_data(_IOControls,GPIOA,0x04)
- ROMdump = ""
- pageChecksum = 0
- currentByte = 0
- bank = 0
-
- if isLowROM == 1:
-  startOffset = startBank * 0x8000
- else:
-  startOffset = startBank * 0x10000
-
- offset = startOffset  # Set current Offset to starting offset
- gotoOffset(startOffset,isLowROM)# Change current bank & address to offset
-
- print "----Start Cart Read------"
- print ""
- #Start at current bank, and increment the number of banks needed
- for bank in range(startBank, (numberOfPages + startBank)  ):
-  print "Current Bank:  DEC: " + str( gotoBank.currentBank ) + "; HEX: " + str( hex(gotoBank.currentBank ))
-
-  #If bank increments, exit the following inner loop, else keep scanning
-  while bank == gotoBank.currentBank:
-   currentByte = readData()
-   ROMdump += chr(currentByte)
-   pageChecksum += currentByte
-   offset += 1 #Increment offset
-   gotoOffset(offset,isLowROM) #goto new offset
-
-  if isLowROM == 0 or (isLowROM == 1 and gotoBank.currentBank % 2 == 0):
-   print " - Page Checksum:       " + str( pageChecksum )
-   ripROM.totalChecksum += pageChecksum
-   pageChecksum = 0
-   print ""
-   print "Current Checksum:      " + str( ripROM.totalChecksum ) + " | Hex: " + str( hex( ripROM.totalChecksum ) )
-   print "Header Checksum:       " + str(hex(ROMchecksum))
-   print ""
-
- return ROMdump
-
-ripROM.totalChecksum = 0
-
-def ripSRAM(SRAMsize, ROMsize, isLowROM):
- SRAMdump = ""
- pageChecksum = 0
- currentByte = 0
- bank = 0
-
- startBank = 0
- startAddr = 0
- endAddr   = 0x7FFF
-
- if isLowROM == 1:
-  startBank = 0x70
-  startAddr = 0x0000
-  endAddr   = 0x7FFF
- else: #Else, is HiROM
-  startBank = 0x30
-  startAddr = 0x6000
-  endAddr   = 0x7FFF
-  cart.write_byte_data(_IOControls,GPIOA,0x0E)# RESET + /WR + /CS high
-  # GPA7: /IRQ | GPA4: CART MOSFET | GPA3: /CS | GPA2: /WR | GPA1: /RESET  | GPA0: /RD
-
- SRAMsize = (SRAMsize / 8.0) * 1024
- gotoBank(startBank)
- gotoAddr(startAddr,0)
-
- while SRAMsize > currentByte:
-  currentByte += 1
-  SRAMdump += chr( readData() )
-
-  if gotoAddr.currentAddr >= endAddr:
-   gotoBank( gotoBank.currentBank + 1)
-   gotoAddr(startAddr,0)
-  else:
-   gotoAddr( gotoAddr.currentAddr +1, 0)
-
- cart.write_byte_data(_IOControls,GPIOA,0x06)#reset + /WR high
- # GPA7: /IRQ | GPA4: CART MOSFET | GPA3: /CS | GPA2: /WR | GPA1: /RESET  | GPA0: /RD
-
- print str(currentByte) + " SRAM bytes read"
-
- return SRAMdump
-
-
-
-directory = ""
-readSRAM = 0
-readCart = 1
-convertedSRAMsize = 0
-val =0
-
-try:
- opts, args = getopt.getopt(sys.argv[1:],"Ssz:d:",["directory="])
-except getopt.GetoptError:
- print "Usage: cart_reader.py -d <optional directory> -S (Reads only SRAM)"
- sys.exit(2)
-for opt, arg in opts:
- if opt in ("-d","--directory"):
-  directory = arg
- if opt in ("-z"):
-  val = int(arg)
-  if val > 256 or val < 0:
-   convertedSRAMsize = 0
-  else:
-   convertedSRAMsize = val
- elif opt in ("-S"):
-  readSRAM = 1
-  readCart = 0
- elif opt in ("-s"):
-  readSRAM = 1
-  readCart = 1
-
-
-
-#if __name__ == "__main__":
-#  main(sys.argv[1:])
-
-# ------------ Setup Register Definitions ------------------------------------------
-databyte = ""
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lib'))
+from snesflash import transport
+from snesflash.cart import SnesCart
+from snesflash.dump import dumpCart
+from snesflash.events import CartEvents
+from snesflash.farm import Farm, loadConfig
+from snesflash.datindex import openIndexes
+from snesflash.library import Library
+from snesflash.sram import restoreFile, restoreVersion
+from snesflash.snapshots import SnapshotStore
+from snesflash.gpio import GpioBus, loadWiring
 
 _SNESAddressPins = 0x20 # MCP23017 Chip with SNES Address Pins
 _SNESBankAndData = 0x22 # MCP23017 Chip with SNES Bank and Data
 _IOControls      = 0x23 # MCP23017 Chip to control SNES IO Controls including MOSFET Power
 
-IODIRA = 0x00
-IODIRB = 0x01
-GPIOA  = 0x12
-GPIOB  = 0x13
-GPINTENB = 0x05
-DEFVALB = 0x07
-INTCONB = 0x09
-IOCON_B = 0x0B
-GPPUB   = 0x0D
-# ------------- Set Registers -----------------------------------------------------
-
-cart = smbus.SMBus(1)
-
-cart.write_byte_data(_SNESAddressPins,IODIRA,0x00) # Set MCP bank A to outputs (SNES Addr 0-7)
-cart.write_byte_data(_SNESAddressPins,IODIRB,0x00) # Set MCP bank B to outputs (SNES Addr 8-15)
-
-cart.write_byte_data(_SNESBankAndData,IODIRA,0x00) # Set MCP bank A to outputs (SNES Bank 0-7)
-cart.write_byte_data(_SNESBankAndData,IODIRB,0xFF) # Set MCP bank B to inputs  (SNES Data 0-7)
-
-cart.write_byte_data(_SNESBankAndData,GPPUB,0xFF) # Enables Pull-Up Resistors on MCP SNES Data 0-7
-cart.write_byte_data(_SNESBankAndData,DEFVALB,0xFF) # Expect MCP SNES Data 0-7 to default to 0xFF
-#cart.write_byte_data(_SNESBankAndData,GPINTENB,0xFF) # Sets up all of SNES Data 0-7 to be interrupt enabled
-cart.write_byte_data(_SNESBankAndData,GPINTENB,0x89) # Sets up some of SNES Data 0-7 to be interrupt enabled
-
-#cart.write_byte_data(_SNESBankAndData,INTCONB,0x00) # compares interrupts to previous SNES Data 0-7
-cart.write_byte_data(_SNESBankAndData,INTCONB,0xFF) # compares interrupts to DEFVALB
-
-
-
-
-cart.write_byte_data(_IOControls,IODIRA,0x80) # Set MCP bank A to outputs; WITH EXCEPTION TO IRQ
-# GPA0: /RD
-# GPA1: /RESET
-# GPA2: /WR
-# GPA3: /CS
-# GPA4: CART MOSFET
-# GPA7: /IRQ
-
-cart.write_byte_data(_IOControls,IODIRB,0x00) # Set MCP bank B to outputs
-
-#----------------------------------------------------------------------------------------------------
-cart.write_byte_data(_IOControls,GPIOA,0x06)#reset
-time.sleep(.25)
-#cart.write_byte_data(_IOControls,GPIOA,0x04)
-
-#-----------------------------------------------------
-
-cartname = ""
-
-headerAddr =32704
-isLowROM = 1
-isValid = 0
-
-if compareROMchecksums(32704,1) == 1:
- print "Checksums matched"
- ROMmakeup =  readOffset(headerAddr + 21,isLowROM)
- ROMspeed = getUpNibble(ROMmakeup)
- bankSize = getLowNibble(ROMmakeup)
-
- if bankSize == 0:
-   print "ROM Makeup match for LoROM. Assuming this is the case!"
-   isLowROM = 1
-   isValid = 1
- elif bankSize == 1:
-   print "ROM Makeup match for HiROM. Assuming this is the case!"
-   headerAddr = 65472
-   isLowROM = 0
-   isValid = 1
- else:
-  print "Bank Configuration Read Error"
-else:
- print "Checksums did not match. Either no cart, or cart read error"
-
-#--- Debug. Manually set bank size ----------
-#isLowROM = 1
-#-------------------------------------------
-
-
-currentAddr = headerAddr
-gotoOffset(headerAddr, isLowROM)
-
-for x in range(headerAddr, (headerAddr + 20) ):
- cartname += chr( readOffset(x,isLowROM) )
-
-ROMmakeup =  readAddr(headerAddr + 21,isLowROM)
-ROMspeed = getUpNibble(ROMmakeup)
-bankSize = getLowNibble(ROMmakeup)
-
-
-ROMtype   =  readAddr(headerAddr + 22,isLowROM)
-ROMsize   =  getROMsize(headerAddr + 23, isLowROM)
-SRAMsize  =  readAddr(headerAddr + 24,isLowROM)
-country   =  readAddr(headerAddr + 25,isLowROM)
-license   =  readAddr(headerAddr + 26,isLowROM)
-version   =  readAddr(headerAddr + 27,isLowROM)
-
-currentAddr = headerAddr + 28
-inverseChecksum  = readAddr(currentAddr,isLowROM)
-inverseChecksum += readAddr(currentAddr+1,isLowROM) * 256
-
-currentAddr = headerAddr + 30
-ROMchecksum  = readAddr(currentAddr,isLowROM)
-ROMchecksum += readAddr(currentAddr+1,isLowROM) * 256
-
-currentAddr = headerAddr + 32
-VBLvector = readAddr(currentAddr,isLowROM)
-VBLvector += readAddr(currentAddr+1,isLowROM) * 256
-
-currentAddr = headerAddr + 34
-resetVector = readAddr(currentAddr,isLowROM)
-resetVector += readAddr(currentAddr+1,isLowROM) * 256
-
-
-
-numberOfPages = getNumberOfPages(ROMsize,isLowROM)
-#numberOfPages = 16
-
-print "Game Title:         " + cartname
-print "ROM Makeup:         " + str(ROMmakeup)
-print " - ROM Speed:       " + str(ROMspeed)
-print " - Bank Size:       " + str(bankSize)
-print "ROM Type:           " + str(ROMtype)
-
-if ROMtype == 243:
- print ""
- print "Capcom CX4 ROM Type detected!"
- CX4setROMsize(ROMsize)
- print ""
-
-
-print "ROM Size:           " + str(ROMsize) + "  MBits"
-
-print "SRAM Size:          " + "Value: " + str(SRAMsize),
-if convertedSRAMsize == 0:
- if SRAMsize <= 12 and SRAMsize > 0:
-  convertedSRAMsize  =  1<<(SRAMsize +3)
-print " | " + str(convertedSRAMsize) +  " KBits"
-
-print "Country:            " + str(country)
-print "License:            " + str(license)
-print "Version:            1." + str(version)
-print "Inverse Checksum:   " + str(hex(inverseChecksum))
-print "ROM Checksum:       " + str(hex(ROMchecksum))
-print " - Checksums xOr'ed:   " + str( hex(inverseChecksum | ROMchecksum) )
-print ""
-print "VBL Vector:         " + str(VBLvector)
-print "Reset Vector:       " + str(resetVector)
-print ""
-print "Number of pages:    " + str( numberOfPages )
-print ""
-
-dump = ""
-dump = returnNULLheader()
-y = 0
-pageChecksum = 0
-totalChecksum = 0
-currentByte = 0
-numberOfRemainPages = 0
-firstNumberOfPages = 0
-
-
-
-if directory != "" :
- if directory[len(directory)-1] != "/":
-  directory += "/"
-
-g = open("/tmp/insertedCart",'w')
-if isValid == 1:
- g.write(cartname)
-
- if readCart == 1:
-  if os.path.exists(directory + cartname + '.smc'):
-   print "Cart has already been ripped, not ripping again!"
-   readCart = 0
- elif readCart == 0:
-  print("Will not rip cart due to OPTs")
-
- if readCart == 1:
-  numberOfRemainPages = 0
-  firstNumberOfPages = numberOfPages
-  timeStart = time.time()
-
-  f = open(directory + cartname + '.smc','w')
-
-
-  if isLowROM == 1:
-   print "Reading " + str(numberOfPages) + " Low ROM pages."
-
-   dump = ripROM(0x00, isLowROM, firstNumberOfPages)
-
-  else:
-   if numberOfPages > 64:
-    numberOfRemainPages = ( numberOfPages - 64 ) # number of pages over 64
-    print "Reading first 64 of " + str(numberOfPages) + " Hi ROM pages."
-    firstNumberOfPages = 64
-   else:
-    print "Reading " + str(numberOfPages) + " Hi ROM pages."
-
-   dump = ripROM(0xC0, isLowROM, firstNumberOfPages)
-
-   if numberOfRemainPages > 0:
-    print "Reading last " + str(numberOfRemainPages) + " of High ROM pages."
-    dump += ripROM(0x40, isLowROM, numberOfRemainPages)
-
-  print ""
-  print "Entire Checksum:             " + str( hex( ripROM.totalChecksum ) )
-  print ""
-  print "Header Checksum:             " + str( hex( ROMchecksum ) )
-
-  ripROM.totalChecksum = ( ripROM.totalChecksum & 0xFFFF )
-
-  print "16-bit Generated Checksum:   " + str( hex( ripROM.totalChecksum ) )
-
-  if ripROM.totalChecksum == ROMchecksum:
-   print "--------------------------   CHECKSUMS MATCH!"
-  else:
-   print "----------WARNING: CHECKSUMS DO NOT MATCH: " +str( hex( ripROM.totalChecksum ) ) + " != " +  str( hex( ROMchecksum ) )
-
-
-  timeEnd = time.time()
-  print ""
-  print "It took " + str(timeEnd - timeStart) + "seconds to read cart"
-
-  f.write(dump)
-  f.close
-
- if readSRAM == 1:
-  f = open(directory + cartname + '.srm','w')
-
-  timeStart = time.time()
-  dump = ripSRAM(convertedSRAMsize,ROMsize,isLowROM)
-  timeEnd = time.time()
-
-  print ""
-  print "It took " + str(timeEnd - timeStart) + "seconds to read SRAM Data"
-  f.write(dump)
-  f.close
-
-else:
- g.write("NULL")
- g.close
-
-
-
-#--- Clean Up & End Script ------------------------------------------------------
-gotoAddr(00,0)
-gotoBank(00)
-
-cart.write_byte_data(_SNESBankAndData,GPPUB,0x00) # Disables Pull-Up Resistors on MCP SNES Data 0-7
-cart.write_byte_data(_SNESBankAndData,DEFVALB,0xFF) # Expect MCP SNES Data 0-7 to default to 0xFF
-cart.write_byte_data(_SNESBankAndData,GPINTENB,0x00) # Sets up all of SNES Data 0-7 to be interrupt disabled
-
-cart.write_byte_data(_SNESAddressPins,IODIRA,0xFF) # Set MCP bank A to outputs (SNES Addr 0-7)
-cart.write_byte_data(_SNESAddressPins,IODIRB,0xFF) # Set MCP bank B to outputs (SNES Addr 8-15)
-
-cart.write_byte_data(_SNESBankAndData,IODIRA,0xFF) # Set MCP bank A to outputs (SNES Bank 0-7)
-cart.write_byte_data(_SNESBankAndData,IODIRB,0xFF) # Set MCP bank B to inputs (SNES Data 0-7)
-
-
-
-
-cart.write_byte_data(_IOControls,IODIRA,0xEF) # Set MCP bank A to inputs; WITH EXCEPTION TO MOSFET
-
-cart.write_byte_data(_IOControls,GPIOA,0x10) #Turn off MOSFET
-#cart.write_byte_data(_IOControls,IODIRA,0xFF) # Set MCP bank A to outputs; WITH EXCEPTION TO IRQ
+def usage():
+    print("Usage: cart_reader.py -d <optional directory> -S (Reads only SRAM) "
+          "-s (Reads ROM and SRAM) -z <SRAM Kbits> -b <i2c bus number> "
+          "-r <JSON timing and bus report> -w (keep running, dump every cart "
+          "put in the slot) -p <banks in flight between reader and writer, "
+          "0 reads, hashes and writes in turn> -f <farm JSON, one worker per "
+          "adapter, see snesflash/farm.py> -i <DAT index from "
+          "snesflash/datindex.py> -k <known dumps file, default in the directory> "
+          "-l <library directory, dumps stored once by SHA-1> "
+          "-R <.srm to write back to the cart's SRAM> -H <save history "
+          "directory, every SRAM read kept as a version> -V <save version from "
+          "the history to write back, -1 newest> -g <GPIO wiring JSON, cart on "
+          "GPIO lines instead of the expanders, - for the default in snesflash/gpio.py> "
+          "-c <gzip|zstd, dumps and saves written compressed>")
+
+def main(argv):
+    directory = ""
+    readSRAM = 0
+    readCart = 1
+    convertedSRAMsize = 0
+    busnum = 1
+    reportFile = None
+    watch = False
+    slots = 4
+    farm = None
+    datFile = None
+    knownFile = None
+    library = None
+    restore = None
+    history = None
+    version = None
+    gpio = None
+    compression = None
+    statusFile = "/tmp/insertedCart"
+
+    try:
+        opts, args = getopt.getopt(argv,"Ssz:d:b:r:wp:f:i:k:l:R:H:V:g:c:",["directory=","bus=","report=","watch","pipeline=","farm=",
+                                                        "dat=","known=","library=","restore=",
+                                                        "history=","version=","gpio=",
+                                                        "compress="])
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt in ("-d","--directory"):
+            directory = arg
+        if opt in ("-b","--bus"):
+            busnum = int(arg)
+        if opt in ("-r","--report"):
+            reportFile = arg
+        if opt in ("-w","--watch"):
+            watch = True
+        if opt in ("-p","--pipeline"):
+            slots = max(0, int(arg))
+        if opt in ("-f","--farm"):
+            farm = arg
+        if opt in ("-i","--dat"):
+            datFile = arg
+        if opt in ("-k","--known"):
+            knownFile = arg
+        if opt in ("-l","--library"):
+            library = arg
+        if opt in ("-R","--restore"):
+            restore = arg
+        if opt in ("-H","--history"):
+            history = arg
+        if opt in ("-V","--version"):
+            version = int(arg)
+        if opt in ("-g","--gpio"):
+            gpio = arg
+        if opt in ("-c","--compress"):
+            compression = arg
+        if opt == "-z":
+            val = int(arg)
+            if val > 256 or val < 0:
+                convertedSRAMsize = 0
+            else:
+                convertedSRAMsize = val
+        elif opt == "-S":
+            readSRAM = 1
+            readCart = 0
+        elif opt == "-s":
+            readSRAM = 1
+            readCart = 1
+
+    if farm:
+        #the farm file describes every adapter, options here only fill gaps
+        config = loadConfig(farm)
+        for key, value in (('directory', directory), ('watch', watch), ('slots', slots),
+                           ('readCart', readCart == 1), ('readSRAM', readSRAM == 1),
+                           ('sramKbits', convertedSRAMsize), ('dat', datFile),
+                           ('known', knownFile), ('library', library),
+                           ('history', history), ('compression', compression)):
+            config.setdefault(key, value)
+        try:
+            Farm(config, reportFile).run()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if datFile and not knownFile:
+        knownFile = os.path.join(library or directory, 'knownDumps.idx')
+    dat, known = openIndexes(datFile, knownFile)
+    if library:
+        library = Library(library)
+    if history:
+        history = SnapshotStore(history, compression=compression)
+    elif version is not None:
+        print("-V needs the save history directory, -H")
+        sys.exit(2)
+    if gpio is not None:
+        bus = GpioBus(loadWiring(gpio if gpio != '-' else None))
+        cart = SnesCart(i2c=bus, board='gpio')
+    else:
+        bus = transport.openSMBus(busnum)
+        cart = SnesCart(address=_SNESAddressPins, bank=_SNESBankAndData,
+                        data=_SNESBankAndData, i2c=bus, board='waterbury',
+                        controls=_IOControls)
+    def dump(cart):
+        dumpCart(cart, directory, statusFile, readCart == 1,
+                 readSRAM == 1, convertedSRAMsize, reportFile, slots, dat, known, library,
+                 history, compression)
+    def removed(cart):
+        with open(statusFile, 'w') as f:
+            f.write("NULL")
+    try:
+        if restore:
+            if not restoreFile(cart, restore):
+                sys.exit(1)
+        elif version is not None:
+            if not restoreVersion(cart, history, version):
+                sys.exit(1)
+        elif watch:
+            #no INT line on this board, the data chip's INTF is polled
+            CartEvents(cart).run(dump, removed)
+        else:
+            dump(cart)
+    finally:
+        #--- Clean Up & End Script: release the bus and turn off the MOSFET
+        cart.shutdown()
+        bus.close()
+        for index in (dat, known):
+            if index is not None:
+                index.close()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])